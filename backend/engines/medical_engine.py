@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Medical Engine
+Report value checker behind /analyze-report: flags lab values against
+reference ranges by analyte, sex and age band
+
+Reference ranges are compiled once into dense NumPy tables indexed by
+(analyte, sex, age band), and unit conversions into (analyte, unit) factor
+and offset tables, so checking any number of reports is one flattening pass
+followed by a few array gathers and comparisons. Ranges are typical adult
+and paediatric teaching values: a flag is a reason to see a doctor, not a
+diagnosis.
+
+Usage:
+    python3 -m backend.engines.medical_engine report.json [--ranges ranges.csv]
+"""
+
+import csv
+import json
+import math
+import re
+import sys
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # the report checker is unavailable without NumPy
+    np = None
+
+# Start of each age band in years: infant, child, adolescent, adult, older adult
+AGE_BANDS = (0, 1, 13, 18, 65)
+ADULT_AGE = 30                 # assumed when a report has no usable age
+MAX_AGE = 200                  # open upper end of a reference row
+SEX_CODES = {'': 0, 'u': 0, 'unknown': 0, 'm': 1, 'male': 1, 'f': 2, 'female': 2}
+SEX_ROWS = {'any': (0, 1, 2), 'M': (1,), 'F': (2,)}
+CONSULT_ADVICE = 'Critical value in this report: please consult a doctor promptly.'
+
+# Flag codes are indexes into FLAGS; np.select in check_arrays picks the first that applies
+(NORMAL, LOW, HIGH, CRITICAL_LOW, CRITICAL_HIGH, NO_RANGE, UNKNOWN_ANALYTE, UNKNOWN_UNIT, INVALID_VALUE,
+ AMBIGUOUS_ANALYTE) = range(10)
+FLAGS = ('normal', 'low', 'high', 'critical_low', 'critical_high',
+         'no_range', 'unknown_analyte', 'unknown_unit', 'invalid_value', 'ambiguous_analyte')
+
+# analyte: (canonical unit, {other unit: factor or (factor, offset) to canonical}, aliases)
+ANALYTES = {
+    'hemoglobin': ('g/dL', {'g/L': 0.1, 'mmol/L': 1.611}, ('hb', 'hgb', 'haemoglobin')),
+    'wbc': ('10^3/uL', {'10^9/L': 1.0, '/uL': 0.001, 'cells/uL': 0.001},
+            ('white blood cells', 'tlc', 'total leucocyte count')),
+    'platelets': ('10^3/uL', {'10^9/L': 1.0, 'lakh/uL': 100.0, '/uL': 0.001}, ('plt', 'platelet count')),
+    'glucose_fasting': ('mg/dL', {'mmol/L': 18.016}, ('fbs', 'fasting glucose', 'fasting blood sugar')),
+    'hba1c': ('%', {'mmol/mol': (0.09148, 2.152)}, ('a1c', 'glycated hemoglobin')),
+    'urea': ('mg/dL', {'mmol/L': 6.006}, ('blood urea',)),
+    'bun': ('mg/dL', {'mmol/L': 2.801}, ('blood urea nitrogen',)),
+    'creatinine': ('mg/dL', {'umol/L': 1 / 88.42}, ('serum creatinine',)),
+    'uric_acid': ('mg/dL', {'umol/L': 1 / 59.48}, ('urate', 'serum uric acid')),
+    'sodium': ('mmol/L', {'mEq/L': 1.0}, ('na', 'serum sodium')),
+    'potassium': ('mmol/L', {'mEq/L': 1.0}, ('k', 'serum potassium')),
+    'chloride': ('mmol/L', {'mEq/L': 1.0}, ('cl', 'serum chloride')),
+    'calcium': ('mg/dL', {'mmol/L': 4.008}, ('ca', 'serum calcium')),
+    'total_cholesterol': ('mg/dL', {'mmol/L': 38.67}, ('cholesterol',)),
+    'ldl': ('mg/dL', {'mmol/L': 38.67}, ('ldl cholesterol', 'ldl-c')),
+    'hdl': ('mg/dL', {'mmol/L': 38.67}, ('hdl cholesterol', 'hdl-c')),
+    'triglycerides': ('mg/dL', {'mmol/L': 88.57}, ('tg',)),
+    'alt': ('U/L', {'IU/L': 1.0}, ('sgpt',)),
+    'ast': ('U/L', {'IU/L': 1.0}, ('sgot',)),
+    'bilirubin_total': ('mg/dL', {'umol/L': 1 / 17.1}, ('bilirubin', 'total bilirubin')),
+    'tsh': ('mIU/L', {'uIU/mL': 1.0}, ('thyroid stimulating hormone',)),
+    'vitamin_d': ('ng/mL', {'nmol/L': 0.4006}, ('25-oh vitamin d', 'vit d')),
+    'vitamin_b12': ('pg/mL', {'pmol/L': 1.355}, ('b12', 'vit b12')),
+    'ferritin': ('ng/mL', {'ug/L': 1.0}, ()),
+}
+
+# Names that could mean more than one analyte: a bare "glucose" may be fasting,
+# post-meal or random, and only the fasting range is known, so these are
+# flagged ambiguous_analyte rather than checked against it
+AMBIGUOUS_ANALYTES = ('glucose', 'blood glucose', 'blood sugar', 'sugar')
+AMBIGUOUS = -2  # analyte code for them
+
+# (analyte, sex, from age, to age, low, high, critical low, critical high) in
+# canonical units; None is an open bound. Ages must be AGE_BANDS edges (or
+# MAX_AGE) and later rows override earlier ones for the bands they cover.
+REFERENCE_RANGES = (
+    ('hemoglobin', 'any', 0, 1, 10.0, 14.0, 7.0, 20.0),
+    ('hemoglobin', 'any', 1, 13, 11.0, 14.5, 7.0, 20.0),
+    ('hemoglobin', 'F', 13, MAX_AGE, 12.0, 15.5, 7.0, 20.0),
+    ('hemoglobin', 'M', 13, 18, 13.0, 16.0, 7.0, 20.0),
+    ('hemoglobin', 'M', 18, MAX_AGE, 13.5, 17.5, 7.0, 20.0),
+    ('wbc', 'any', 0, 1, 6.0, 17.5, 2.0, 30.0),
+    ('wbc', 'any', 1, 13, 5.0, 14.5, 2.0, 30.0),
+    ('wbc', 'any', 13, MAX_AGE, 4.0, 11.0, 2.0, 30.0),
+    ('platelets', 'any', 0, MAX_AGE, 150, 450, 50, 1000),
+    ('glucose_fasting', 'any', 0, MAX_AGE, 70, 99, 40, 400),
+    ('hba1c', 'any', 0, MAX_AGE, 4.0, 5.6, None, None),
+    ('urea', 'any', 0, MAX_AGE, 15, 40, None, 200),
+    ('bun', 'any', 0, MAX_AGE, 7, 20, None, 100),
+    ('creatinine', 'any', 0, 13, 0.3, 0.7, None, 10),
+    ('creatinine', 'F', 13, MAX_AGE, 0.59, 1.04, None, 10),
+    ('creatinine', 'M', 13, MAX_AGE, 0.74, 1.35, None, 10),
+    ('uric_acid', 'any', 0, 13, 2.0, 5.5, None, 13),
+    ('uric_acid', 'F', 13, MAX_AGE, 2.4, 6.0, None, 13),
+    ('uric_acid', 'M', 13, MAX_AGE, 3.4, 7.0, None, 13),
+    ('sodium', 'any', 0, MAX_AGE, 135, 145, 120, 160),
+    ('potassium', 'any', 0, MAX_AGE, 3.5, 5.1, 2.5, 6.5),
+    ('chloride', 'any', 0, MAX_AGE, 98, 107, 80, 120),
+    ('calcium', 'any', 0, MAX_AGE, 8.6, 10.3, 6.0, 13.0),
+    ('total_cholesterol', 'any', 0, MAX_AGE, None, 200, None, None),
+    ('ldl', 'any', 0, MAX_AGE, None, 100, None, None),
+    ('hdl', 'F', 0, MAX_AGE, 50, None, None, None),
+    ('hdl', 'M', 0, MAX_AGE, 40, None, None, None),
+    ('triglycerides', 'any', 0, MAX_AGE, None, 150, None, 1000),
+    ('alt', 'any', 0, MAX_AGE, 7, 56, None, 1000),
+    ('ast', 'any', 0, MAX_AGE, 10, 40, None, 1000),
+    ('bilirubin_total', 'any', 0, MAX_AGE, 0.1, 1.2, None, 15),
+    ('tsh', 'any', 0, MAX_AGE, 0.4, 4.0, None, None),
+    ('vitamin_d', 'any', 0, MAX_AGE, 30, 100, None, 150),
+    ('vitamin_b12', 'any', 0, MAX_AGE, 200, 900, None, None),
+    ('ferritin', 'any', 0, 13, 7, 140, None, None),
+    ('ferritin', 'F', 13, MAX_AGE, 11, 307, None, None),
+    ('ferritin', 'M', 13, MAX_AGE, 24, 336, None, None),
+)
+RANGE_COLUMNS = ('analyte', 'sex', 'age_from', 'age_to', 'low', 'high', 'critical_low', 'critical_high')
+
+RESULT_FIELDS = ('analyte', 'value', 'unit', 'normalized', 'canonical_unit', 'low', 'high', 'flag')
+
+Checked = namedtuple('Checked', 'flags normalized low high')
+
+
+def analyte_key(name):
+    """Lookup form of an analyte name or alias: case and _/space runs don't matter"""
+    return re.sub(r'[\s_]+', ' ', str(name)).strip().lower()
+
+
+def unit_key(unit):
+    """Lookup form of a unit: µ/μ spelled u, no spaces or 'x' before powers of ten, case-folded"""
+    unit = str(unit).replace('µ', 'u').replace('μ', 'u').replace(' ', '').lower()
+    return re.sub(r'^[x×*]?10\^?', '10^', unit)
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _json_numbers(array):
+    """List of floats with open bounds and missing values (inf, NaN) as None"""
+    out = array.astype(object)
+    out[~np.isfinite(array)] = None
+    return out.tolist()
+
+
+def _entries(values):
+    """(name, value, unit) for a report's values: a list of objects, or an object keyed by analyte"""
+    if isinstance(values, dict):
+        return [(name, value.get('value'), value.get('unit')) if isinstance(value, dict) else (name, value, None)
+                for name, value in values.items()]
+    if isinstance(values, list):
+        return [(entry.get('analyte') or entry.get('name'), entry.get('value'), entry.get('unit'))
+                if isinstance(entry, dict) else (None, None, None) for entry in values]
+    raise ValueError('Report values must be a list or an object')
+
+
+def load_ranges(path):
+    """Reference rows from a CSV with RANGE_COLUMNS headers; empty bound cells are open"""
+    rows = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for line_no, record in enumerate(csv.DictReader(f), start=2):
+            try:
+                bounds = [float(record[column]) if (record.get(column) or '').strip() else None
+                          for column in RANGE_COLUMNS[4:]]
+                rows.append((record['analyte'].strip(), (record.get('sex') or 'any').strip(),
+                             float(record['age_from']), float(record['age_to']), *bounds))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f'{path} line {line_no}: {e}') from None
+    return rows
+
+
+class ReferenceTable:
+    """
+    Reference ranges and unit conversions compiled into arrays:
+    `bounds[k, cell]` holds low/high/critical low/critical high (k = 0..3)
+    for cell (analyte * 3 + sex) * bands + band, and `unit_factor`/
+    `unit_offset[analyte, unit]` turn a value into the analyte's canonical
+    unit (NaN factor: unit not accepted for that analyte). Cells with no row
+    are NaN; when only sex-specific rows exist, unknown sex gets the widest
+    of them so nobody is flagged just for a missing field.
+    """
+
+    def __init__(self, analytes=ANALYTES, ranges=REFERENCE_RANGES, age_bands=AGE_BANDS):
+        if np is None:
+            raise RuntimeError('The report checker needs NumPy installed')
+        self.names = list(analytes)
+        self.canonical_units = [analytes[name][0] for name in self.names]
+        self.band_starts = np.asarray(age_bands, dtype=np.float64)
+        self._analyte_codes = {}
+        self._unit_codes = {'': 0}        # unit code 0: none given, value is in the canonical unit
+        for alias in AMBIGUOUS_ANALYTES:
+            self._analyte_codes[analyte_key(alias)] = AMBIGUOUS
+        for code, (name, (canonical, conversions, aliases)) in enumerate(analytes.items()):
+            for alias in (name, *aliases):
+                self._analyte_codes[analyte_key(alias)] = code
+            for unit in (canonical, *conversions):
+                self._unit_codes.setdefault(unit_key(unit), len(self._unit_codes))
+
+        analyte_count, band_count = len(self.names), len(age_bands)
+        self.unit_factor = np.full((analyte_count, len(self._unit_codes)), np.nan)
+        self.unit_offset = np.zeros_like(self.unit_factor)
+        self.unit_factor[:, 0] = 1.0
+        for code, (canonical, conversions, _) in enumerate(analytes.values()):
+            self.unit_factor[code, self._unit_codes[unit_key(canonical)]] = 1.0
+            for unit, conversion in conversions.items():
+                factor, offset = conversion if isinstance(conversion, tuple) else (conversion, 0.0)
+                self.unit_factor[code, self._unit_codes[unit_key(unit)]] = factor
+                self.unit_offset[code, self._unit_codes[unit_key(unit)]] = offset
+
+        bounds = np.full((4, analyte_count, 3, band_count), np.nan)
+        edges = list(age_bands) + [MAX_AGE]
+        for analyte, sex, age_from, age_to, *limits in ranges:
+            code = self._analyte_codes.get(analyte_key(analyte))
+            if code is None or code < 0:
+                raise ValueError(f'Reference range for unknown or ambiguous analyte {analyte!r}')
+            if sex not in SEX_ROWS:
+                raise ValueError(f"Reference range sex must be one of {', '.join(SEX_ROWS)}, not {sex!r}")
+            if age_from not in edges or age_to not in edges or age_from >= age_to:
+                raise ValueError(f'Reference range ages {age_from}-{age_to} for {analyte} '
+                                 f'must be age band edges {edges}')
+            bands = slice(edges.index(age_from), edges.index(age_to))
+            for k, (limit, open_value) in enumerate(zip(limits, (-np.inf, np.inf, -np.inf, np.inf))):
+                for slot in SEX_ROWS[sex]:
+                    bounds[k, code, slot, bands] = open_value if limit is None else limit
+        # Unknown sex without an 'any' row: the widest of the male and female ranges
+        unset = np.isnan(bounds[0, :, 0])
+        for k, widest in enumerate((np.fmin, np.fmax, np.fmin, np.fmax)):
+            bounds[k, :, 0][unset] = widest(bounds[k, :, 1], bounds[k, :, 2])[unset]
+        self.bounds = bounds.reshape(4, -1)
+        self._names = np.array(self.names, dtype=object)
+        self._canonical_units = np.array(self.canonical_units, dtype=object)
+        self._flags = np.array(FLAGS, dtype=object)
+        self._band_count = band_count
+        # Raw spellings seen in reports, so each is normalised once
+        self._analyte_cache = {}
+        self._unit_cache = {}
+
+    def analyte_code(self, name):
+        """Index of an analyte name or alias, -1 if unknown, AMBIGUOUS for AMBIGUOUS_ANALYTES"""
+        if not isinstance(name, str):
+            return -1
+        try:
+            return self._analyte_cache[name]
+        except KeyError:
+            code = self._analyte_codes.get(analyte_key(name), -1)
+            if len(self._analyte_cache) < 10000:
+                self._analyte_cache[name] = code
+            return code
+
+    def unit_code(self, unit):
+        """Index of a unit spelling (0 when none is given), -1 if unknown"""
+        if not isinstance(unit, str):
+            return 0 if unit is None else -1
+        try:
+            return self._unit_cache[unit]
+        except KeyError:
+            code = self._unit_codes.get(unit_key(unit), -1) if unit else 0
+            if len(self._unit_cache) < 10000:
+                self._unit_cache[unit] = code
+            return code
+
+    def check_arrays(self, analytes, units, values, sexes, ages):
+        """
+        Flag parallel arrays of analyte codes, unit codes, values, sex codes
+        and ages (NaN: unknown). Returns Checked(flags, normalized, low, high)
+        with flags as int8 indexes into FLAGS.
+        """
+        analytes = np.asarray(analytes, dtype=np.intp)
+        units = np.asarray(units, dtype=np.intp)
+        values = np.asarray(values, dtype=np.float64)
+        ages = np.asarray(ages, dtype=np.float64)
+        known = analytes >= 0
+        analyte_index = np.where(known, analytes, 0)
+        unit_index = np.where(units >= 0, units, 0)
+        # No analyte, no conversion: an unresolved value is never normalised with another analyte's factor
+        factor = np.where(known & (units >= 0), self.unit_factor[analyte_index, unit_index], np.nan)
+        normalized = values * factor + self.unit_offset[analyte_index, unit_index]
+        ages = np.where(np.isnan(ages), ADULT_AGE, ages)
+        bands = np.clip(np.searchsorted(self.band_starts, ages, side='right') - 1, 0, None)
+        cells = (analyte_index * 3 + np.asarray(sexes, dtype=np.intp)) * self._band_count + bands
+        bounds = self.bounds[:, cells]
+        bounds[:, ~known] = np.nan
+        low, high, critical_low, critical_high = bounds
+        with np.errstate(invalid='ignore'):
+            flags = np.select(
+                [analytes == AMBIGUOUS, ~known, np.isnan(factor), np.isnan(values), np.isnan(low),
+                 normalized < critical_low, normalized > critical_high, normalized < low, normalized > high],
+                [AMBIGUOUS_ANALYTE, UNKNOWN_ANALYTE, UNKNOWN_UNIT, INVALID_VALUE, NO_RANGE,
+                 CRITICAL_LOW, CRITICAL_HIGH, LOW, HIGH],
+                NORMAL,
+            ).astype(np.int8)
+        return Checked(flags, normalized, low, high)
+
+    def check_reports(self, reports):
+        """
+        Flag every value in a list of reports ({"sex", "age", "values"}) in
+        one vectorised pass. Returns one result per report, in order.
+        """
+        names, units, values, sexes, ages, counts = [], [], [], [], [], []
+        for number, report in enumerate(reports, start=1):
+            if not isinstance(report, dict):
+                raise ValueError(f'Report {number} must be an object')
+            try:
+                entries = _entries(report.get('values') or [])
+            except ValueError as e:
+                raise ValueError(f'Report {number}: {e}') from None
+            sex = SEX_CODES.get(str(report.get('sex') or '').strip().lower(), 0)
+            age = _number(report.get('age'))
+            counts.append(len(entries))
+            for name, value, unit in entries:
+                names.append(name if isinstance(name, str) else None)
+                units.append(unit)
+                values.append(value)
+            sexes.extend([sex] * len(entries))
+            ages.extend([age] * len(entries))
+
+        codes = np.fromiter((self.analyte_code(name) for name in names), dtype=np.intp, count=len(names))
+        checked = self.check_arrays(codes, [self.unit_code(unit) for unit in units],
+                                    [_number(value) for value in values], sexes, ages)
+
+        # Output columns are built as whole arrays too; only the dicts are per value
+        known = codes >= 0
+        canonical = np.where(known, self._canonical_units[np.where(known, codes, 0)], None)
+        analytes = np.where(known, self._names[np.where(known, codes, 0)], np.array(names, dtype=object))
+        flags = checked.flags
+        report_index = np.repeat(np.arange(len(counts)), counts)
+        abnormal = np.bincount(report_index, (flags >= LOW) & (flags <= CRITICAL_HIGH), len(counts))
+        critical = np.bincount(report_index, (flags == CRITICAL_LOW) | (flags == CRITICAL_HIGH), len(counts))
+        rows = iter(zip(analytes.tolist(), values, [unit or fallback for unit, fallback in zip(units, canonical)],
+                        _json_numbers(np.round(checked.normalized, 4)), canonical.tolist(),
+                        _json_numbers(checked.low), _json_numbers(checked.high), self._flags[flags].tolist()))
+        results = []
+        for count, abnormal_count, critical_count in zip(counts, abnormal.tolist(), critical.tolist()):
+            result = {
+                'values': [dict(zip(RESULT_FIELDS, row)) for _, row in zip(range(count), rows)],
+                'abnormal': int(abnormal_count),
+                'critical': int(critical_count),
+                'consult_doctor': critical_count > 0,
+            }
+            if critical_count:
+                result['advice'] = CONSULT_ADVICE
+            results.append(result)
+        return results
+
+    def check_report(self, report):
+        return self.check_reports([report])[0]
+
+
+_table = None
+
+
+def get_table():
+    """The built-in reference table, compiled on first use"""
+    global _table
+    if _table is None:
+        _table = ReferenceTable()
+    return _table
+
+
+def check_reports(reports):
+    return get_table().check_reports(reports)
+
+
+def check_report(report):
+    return get_table().check_report(report)
+
+
+def main(argv):
+    if not argv or argv[0].startswith('-'):
+        print(__doc__)
+        return 1
+    table = ReferenceTable(ranges=load_ranges(argv[2])) if argv[1:2] == ['--ranges'] else get_table()
+    with open(argv[0], encoding='utf-8') as f:
+        data = json.load(f)
+    reports = data if isinstance(data, list) else [data]
+    for number, result in enumerate(table.check_reports(reports), start=1):
+        print(f"🩺 Report {number}: {result['abnormal']} abnormal, {result['critical']} critical")
+        for value in result['values']:
+            marker = '✅' if value['flag'] == 'normal' else '🚨' if value['flag'].startswith('critical') else '⚠️'
+            print(f"  {marker} {value['analyte']}: {value['value']} {value['unit'] or ''} "
+                  f"({value['low']}-{value['high']} {value['canonical_unit'] or ''}) {value['flag']}")
+        if result['consult_doctor']:
+            print(f"  {result['advice']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
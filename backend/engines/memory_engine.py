@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Memory Engine
+Append-only chat history in monthly partitions, windowed recall and compaction
+of old months into per-session summaries
+"""
+
+import json
+import re
+from collections import Counter
+from datetime import datetime, timezone
+
+import embeddings
+
+ROLES = ('user', 'assistant', 'system')
+RECENT_TURNS = 10           # default "last N turns" window
+RELEVANT_TURNS = 5          # default number of older turns recalled by similarity
+MAX_TURNS = 200             # cap on any history/recall window
+RECALL_SCAN_LIMIT = 2000    # older turns scored per recall, newest partitions first
+RECALL_MIN_SCORE = 0.2
+COMPACT_AFTER_MONTHS = 3    # months kept verbatim; older partitions are summarised and dropped
+SUMMARY_SENTENCES = 5
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'  # same shape as SQLite CURRENT_TIMESTAMP
+
+# Fixed embedder so stored turn vectors never need re-embedding
+EMBEDDER = embeddings.HashingEmbedder() if embeddings.np is not None else None
+
+SUMMARY_STOPWORDS = frozenset('''
+    a an and are as at be but by can do does for from has have i if in is it its me my
+    of on or so that the this to was we what with you your hai ka ki ko se
+'''.split())
+
+
+def create_schema(cursor):
+    """Session registry, partition registry and compacted summaries; partitions are created on first write"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            session_id TEXT PRIMARY KEY,
+            turn_count INTEGER NOT NULL DEFAULT 0,
+            first_month TEXT NOT NULL,
+            last_month TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions(updated_at)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_partitions (
+            month TEXT PRIMARY KEY,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            first_seq INTEGER NOT NULL,
+            last_seq INTEGER NOT NULL,
+            turn_count INTEGER NOT NULL,
+            started_at DATETIME NOT NULL,
+            ended_at DATETIME NOT NULL,
+            summary TEXT NOT NULL,
+            embedding BLOB
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chat_summaries_session ON chat_summaries(session_id, month)
+    ''')
+
+
+def partition_table(month):
+    return f'chat_history_{month}'
+
+
+def month_of(timestamp):
+    """'2026-10-18 09:30:00' -> '202610'"""
+    return timestamp[:4] + timestamp[5:7]
+
+
+def now_timestamp():
+    return datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def parse_timestamp(value):
+    """Normalise a client timestamp (ISO 8601 or SQLite style) to TIMESTAMP_FORMAT in UTC"""
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime(TIMESTAMP_FORMAT)
+
+
+def ensure_partition(cursor, month):
+    """Create the month's table and its (session, timestamp) index the first time it is written"""
+    cursor.execute('INSERT OR IGNORE INTO chat_partitions (month) VALUES (?)', (month,))
+    if cursor.rowcount:
+        table = partition_table(month)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                metadata TEXT,
+                embedding BLOB,
+                timestamp DATETIME NOT NULL
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_session ON {table}(session_id, timestamp, seq)
+        ''')
+
+
+def session_partitions(cursor, session_id):
+    """Months holding the session's verbatim turns, newest first"""
+    cursor.execute('SELECT first_month, last_month FROM chat_sessions WHERE session_id = ?', (session_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return []
+    cursor.execute('SELECT month FROM chat_partitions WHERE month BETWEEN ? AND ? ORDER BY month DESC',
+                   (row[0], row[1]))
+    return [r[0] for r in cursor.fetchall()]
+
+
+def append_turn(cursor, session_id, role, content, timestamp=None, metadata=None):
+    """
+    Append one turn to its month's partition. The session's turn counter is
+    bumped in the same transaction, which gives every turn a per-session
+    sequence number. Returns (seq, timestamp).
+    """
+    timestamp = parse_timestamp(timestamp) if timestamp else now_timestamp()
+    month = month_of(timestamp)
+    ensure_partition(cursor, month)
+    cursor.execute('''
+        INSERT INTO chat_sessions (session_id, turn_count, first_month, last_month)
+        VALUES (?, 1, ?, ?)
+        ON CONFLICT(session_id) DO UPDATE SET
+            turn_count = turn_count + 1,
+            first_month = MIN(first_month, excluded.first_month),
+            last_month = MAX(last_month, excluded.last_month),
+            updated_at = CURRENT_TIMESTAMP
+    ''', (session_id, month, month))
+    cursor.execute('SELECT turn_count FROM chat_sessions WHERE session_id = ?', (session_id,))
+    seq = cursor.fetchone()[0]
+    blob = embeddings.to_blob(EMBEDDER.embed([content])[0]) if EMBEDDER is not None else None
+    cursor.execute(f'''
+        INSERT INTO {partition_table(month)} (session_id, seq, role, content, metadata, embedding, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (session_id, seq, role, content, json.dumps(metadata) if metadata else None, blob, timestamp))
+    return seq, timestamp
+
+
+def _turn(row):
+    return {
+        'seq': row['seq'],
+        'role': row['role'],
+        'content': row['content'],
+        'metadata': json.loads(row['metadata']) if row['metadata'] else None,
+        'timestamp': row['timestamp'],
+    }
+
+
+def _read_back(cursor, session_id, limit, before=None, columns='seq, role, content, metadata, timestamp'):
+    """
+    Up to `limit` rows before the (timestamp, seq) keyset position, newest
+    first, walking the session's partitions on their (session, timestamp) index
+    """
+    rows = []
+    for month in session_partitions(cursor, session_id):
+        if before is not None and month > month_of(before[0]):
+            continue
+        query = f'SELECT {columns} FROM {partition_table(month)} WHERE session_id = ?'
+        params = [session_id]
+        if before is not None:
+            query += ' AND (timestamp < ? OR (timestamp = ? AND seq < ?))'
+            params += [before[0], before[0], before[1]]
+        query += ' ORDER BY timestamp DESC, seq DESC LIMIT ?'
+        cursor.execute(query, (*params, limit - len(rows)))
+        rows.extend(cursor.fetchall())
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def history(cursor, session_id, limit, before=None):
+    """Up to `limit` turns before the keyset position, oldest first, ready to replay into a prompt"""
+    return [_turn(row) for row in reversed(_read_back(cursor, session_id, limit, before))]
+
+
+def _score(query, texts, blobs):
+    """Cosine similarity of each text to the query; word overlap when NumPy is missing"""
+    if EMBEDDER is not None:
+        query_vector = EMBEDDER.embed([query])[0]
+        matrix = embeddings.np.frombuffer(b''.join(blobs), dtype=embeddings.np.float32)
+        return (matrix.reshape(len(blobs), EMBEDDER.dim) @ query_vector).tolist()
+    query_words = set(re.findall(r'\w+', query.lower()))
+    scores = []
+    for text in texts:
+        words = set(re.findall(r'\w+', text.lower()))
+        scores.append(len(query_words & words) / max(len(query_words | words), 1))
+    return scores
+
+
+def recall(cursor, session_id, query, recent=RECENT_TURNS, relevant=RELEVANT_TURNS):
+    """
+    Context for the next reply: the last `recent` turns verbatim, plus the
+    `relevant` older turns and compacted summaries most similar to the
+    query. Older turns are read newest partition first and capped at
+    RECALL_SCAN_LIMIT, so recall cost does not grow with the session.
+    """
+    window = history(cursor, session_id, recent) if recent else []
+    result = {'recent': window, 'relevant': [], 'summaries': []}
+    if not query or not relevant:
+        return result
+
+    oldest = (window[0]['timestamp'], window[0]['seq']) if window else None
+    candidates = [row for row in _read_back(cursor, session_id, RECALL_SCAN_LIMIT, oldest,
+                                            'seq, role, content, metadata, timestamp, embedding')
+                  if row['embedding'] is not None or EMBEDDER is None]
+    if candidates:
+        scores = _score(query, [row['content'] for row in candidates], [row['embedding'] for row in candidates])
+        ranked = sorted(zip(scores, candidates), key=lambda pair: pair[0], reverse=True)
+        result['relevant'] = [dict(_turn(row), score=round(score, 4))
+                              for score, row in ranked[:relevant] if score >= RECALL_MIN_SCORE]
+        result['relevant'].sort(key=lambda turn: turn['seq'])
+
+    cursor.execute('''
+        SELECT month, first_seq, last_seq, turn_count, started_at, ended_at, summary, embedding
+        FROM chat_summaries WHERE session_id = ? ORDER BY month DESC LIMIT ?
+    ''', (session_id, RECALL_SCAN_LIMIT))
+    summaries = [row for row in cursor.fetchall() if row['embedding'] is not None or EMBEDDER is None]
+    if summaries:
+        scores = _score(query, [row['summary'] for row in summaries], [row['embedding'] for row in summaries])
+        ranked = sorted(zip(scores, summaries), key=lambda pair: pair[0], reverse=True)
+        result['summaries'] = [{
+            'month': row['month'],
+            'first_seq': row['first_seq'],
+            'last_seq': row['last_seq'],
+            'turns': row['turn_count'],
+            'started_at': row['started_at'],
+            'ended_at': row['ended_at'],
+            'summary': row['summary'],
+            'score': round(score, 4),
+        } for score, row in ranked[:relevant] if score >= RECALL_MIN_SCORE]
+    return result
+
+
+def summarise(turns):
+    """
+    Extractive summary: the SUMMARY_SENTENCES sentences whose content words
+    are most frequent across the turns, kept in conversation order
+    """
+    sentences = []
+    for turn in turns:
+        for sentence in re.split(r'(?<=[.!?])\s+', turn['content'].strip()):
+            if sentence:
+                sentences.append((turn['role'], sentence))
+    frequencies = Counter(word for _, sentence in sentences
+                          for word in re.findall(r'\w+', sentence.lower()) if word not in SUMMARY_STOPWORDS)
+
+    def weight(item):
+        words = [w for w in re.findall(r'\w+', item[1][1].lower()) if w not in SUMMARY_STOPWORDS]
+        return sum(frequencies[w] for w in words) / (len(words) + 1)
+
+    picked = sorted(sorted(enumerate(sentences), key=weight, reverse=True)[:SUMMARY_SENTENCES])
+    return ' '.join(f'{role}: {sentence}' for _, (role, sentence) in picked)
+
+
+def _month_before(month, months):
+    index = int(month[:4]) * 12 + int(month[4:]) - 1 - months
+    return f'{index // 12:04d}{index % 12 + 1:02d}'
+
+
+def compact(cursor, keep_months=COMPACT_AFTER_MONTHS, now=None):
+    """
+    Summarise every partition older than the last `keep_months` months into
+    one chat_summaries row per session, then drop the partition table.
+    Dropping a whole month is what keeps compaction cheap: no per-row deletes
+    and no fragmentation left in the live partitions.
+    """
+    cutoff = _month_before(month_of(now or now_timestamp()), keep_months - 1)
+    cursor.execute('SELECT month FROM chat_partitions WHERE month < ? ORDER BY month', (cutoff,))
+    stats = {'partitions': 0, 'sessions': 0, 'turns': 0}
+    for (month,) in cursor.fetchall():
+        table = partition_table(month)
+        cursor.execute(f'SELECT DISTINCT session_id FROM {table}')
+        for (session_id,) in cursor.fetchall():
+            cursor.execute(f'''
+                SELECT seq, role, content, metadata, timestamp FROM {table}
+                WHERE session_id = ? ORDER BY timestamp, seq
+            ''', (session_id,))
+            turns = [_turn(row) for row in cursor.fetchall()]
+            summary = summarise(turns)
+            blob = embeddings.to_blob(EMBEDDER.embed([summary])[0]) if EMBEDDER is not None else None
+            cursor.execute('''
+                INSERT INTO chat_summaries
+                    (session_id, month, first_seq, last_seq, turn_count, started_at, ended_at, summary, embedding)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (session_id, month, min(t['seq'] for t in turns), max(t['seq'] for t in turns), len(turns),
+                  turns[0]['timestamp'], turns[-1]['timestamp'], summary, blob))
+            stats['sessions'] += 1
+            stats['turns'] += len(turns)
+        cursor.execute(f'DROP TABLE {table}')
+        cursor.execute('DELETE FROM chat_partitions WHERE month = ?', (month,))
+        stats['partitions'] += 1
+    return stats
+
+
+def list_sessions(cursor, limit):
+    """Most recently active sessions first"""
+    cursor.execute('''
+        SELECT session_id, turn_count, created_at, updated_at FROM chat_sessions
+        ORDER BY updated_at DESC LIMIT ?
+    ''', (limit,))
+    return [dict(row) for row in cursor.fetchall()]
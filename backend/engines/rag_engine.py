@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki RAG Engine
+Offline book pipeline: extract pages → chunk → embed in batches → memory-mapped
+vector index, with top-k retrieval for /ask-book
+
+Usage:
+    python3 -m backend.engines.rag_engine ingest books/*.pdf
+    python3 -m backend.engines.rag_engine ask "What does the sinoatrial node do?"
+"""
+
+import hashlib
+import re
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+import embeddings
+from memory_db import ConnectionPool
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDFs need pypdf; plain text books still work
+    PdfReader = None
+
+RAG_DIR = Path('rag_library')
+RAG_EMBEDDER = 'hashing:1024'  # book vocabularies are far larger than memory descriptions
+CHUNK_WORDS = 180              # words per chunk
+CHUNK_OVERLAP = 40             # words shared with the previous chunk on the same page
+EMBED_BATCH = 128              # chunks embedded (and committed) together
+TEXT_PAGE_CHARS = 4000         # page size for text files without form feeds
+DEFAULT_TOP_K = 5
+CANDIDATES_PER_HIT = 4         # each retriever proposes k * this many chunks for fusion
+# (dense, lexical) weights on each retriever's score scaled by its best hit;
+# hashing vectors are the weaker signal on rare terms, so raise the dense
+# weight when RAG_EMBEDDER is an 'st:' model
+FUSION_WEIGHTS = (0.5, 1.0)
+
+# Function words carry no topic but dominate long chunks under feature hashing;
+# they are dropped from what gets embedded (stored passages keep them)
+STOPWORDS = frozenset('''
+    a an and are as at be been but by can do does did for from had has have how i if in into is it
+    its of on or so than that the their them then there these they this those to was were what when
+    where which who why will with would you your
+'''.split())
+
+
+def iter_pages(path):
+    """
+    Yield (page_no, text) one page at a time. PDFs are read page by page
+    through pypdf; text files split on form feeds, or every ~TEXT_PAGE_CHARS
+    at a line boundary, without loading the whole file.
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.pdf':
+        if PdfReader is None:
+            raise RuntimeError('Install pypdf to ingest PDF books')
+        reader = PdfReader(str(path))
+        for page_no, page in enumerate(reader.pages, start=1):
+            yield page_no, page.extract_text() or ''
+        return
+
+    page_no, buffer, size = 1, [], 0
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            while '\f' in line:
+                head, line = line.split('\f', 1)
+                buffer.append(head)
+                yield page_no, ''.join(buffer)
+                page_no, buffer, size = page_no + 1, [], 0
+            buffer.append(line)
+            size += len(line)
+            if size >= TEXT_PAGE_CHARS:
+                yield page_no, ''.join(buffer)
+                page_no, buffer, size = page_no + 1, [], 0
+    if buffer and ''.join(buffer).strip():
+        yield page_no, ''.join(buffer)
+
+
+def normalize(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def chunk_page(text):
+    """Overlapping word windows over one page's text"""
+    if not text:
+        return []
+    words = text.split(' ')
+    step = CHUNK_WORDS - CHUNK_OVERLAP
+    return [' '.join(words[start:start + CHUNK_WORDS])
+            for start in range(0, max(len(words) - CHUNK_OVERLAP, 1), step)]
+
+
+def content_words(text):
+    return [word for word in re.findall(r'\w+', text.lower()) if word not in STOPWORDS]
+
+
+def embedding_text(text):
+    return ' '.join(content_words(text))
+
+
+def create_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rag_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL UNIQUE,
+            title TEXT,
+            page_count INTEGER NOT NULL DEFAULT 0,
+            ingested_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rag_pages (
+            document_id INTEGER NOT NULL,
+            page_no INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            PRIMARY KEY (document_id, page_no)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rag_chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL,
+            page_no INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            embedding BLOB NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_rag_chunks_page ON rag_chunks(document_id, page_no)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rag_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+    # FTS5 mirror of chunk text for the lexical half of retrieval; chunks are
+    # only ever inserted or deleted, so two triggers keep it in sync
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'rag_chunks_fts'")
+    fts_existed = cursor.fetchone() is not None
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS rag_chunks_fts USING fts5(
+                text, content='rag_chunks', content_rowid='id'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS rag_chunks_fts_insert AFTER INSERT ON rag_chunks BEGIN
+                INSERT INTO rag_chunks_fts (rowid, text) VALUES (new.id, new.text);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS rag_chunks_fts_delete AFTER DELETE ON rag_chunks BEGIN
+                INSERT INTO rag_chunks_fts (rag_chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END
+        ''')
+        if not fts_existed:
+            cursor.execute("INSERT INTO rag_chunks_fts (rag_chunks_fts) VALUES ('rebuild')")
+        return True
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ FTS5 unavailable, book retrieval is vector-only: {e}")
+        return False
+
+
+class RagEngine:
+    """
+    Book library stored in <root>/library.db (documents, per-page hashes,
+    chunk text and vectors) with a memory-mapped VectorIndex of chunk
+    vectors next to it. Ingestion streams pages and keeps at most one
+    EMBED_BATCH of chunks in memory; unchanged pages are skipped by hash.
+    """
+
+    def __init__(self, root=RAG_DIR, embedder_spec=RAG_EMBEDDER):
+        if embeddings.np is None:
+            raise RuntimeError('The RAG engine needs NumPy installed')
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(str(self.root / 'library.db'))
+        self.embedder = embeddings.load_embedder(embedder_spec)
+        self.index = embeddings.VectorIndex(str(self.root / 'chunks'), self.embedder.dim)
+        self._ingest_lock = threading.Lock()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            self.fts_enabled = create_schema(cursor)
+            self._check_embedder(cursor)
+            conn.commit()
+            self._sync_index(conn)
+
+    def _check_embedder(self, cursor):
+        """A different embedder makes stored vectors useless: forget every page so it is re-ingested"""
+        cursor.execute("SELECT value FROM rag_meta WHERE key = 'embedder'")
+        row = cursor.fetchone()
+        if row is not None and row[0] != self.embedder.name:
+            print(f"⚠️ RAG embedder changed ({row[0]} → {self.embedder.name}), books will be re-embedded")
+            cursor.execute('DELETE FROM rag_chunks')
+            cursor.execute('DELETE FROM rag_pages')
+        cursor.execute("INSERT OR REPLACE INTO rag_meta (key, value) VALUES ('embedder', ?)", (self.embedder.name,))
+
+    def _sync_index(self, conn):
+        """Rebuild the vector files from the table if they drifted (deletes, crashes)"""
+        count = conn.execute('SELECT COUNT(*) FROM rag_chunks').fetchone()[0]
+        if count != len(self.index) or self.index.deleted:
+            self.index.rebuild(conn.execute('SELECT id, embedding FROM rag_chunks ORDER BY id'))
+
+    def _flush(self, cursor, pending, uncommitted):
+        """
+        Embed and store one batch of (document_id, page_no, text) chunks. Their
+        (chunk_id, blob) pairs go to `uncommitted`, for _append_committed once
+        the transaction commits: SQLite reuses a rolled-back row's id, so a
+        vector appended earlier could later score an unrelated passage.
+        """
+        if not pending:
+            return
+        vectors = self.embedder.embed([embedding_text(text) for _, _, text in pending])
+        for (document_id, page_no, text), vector in zip(pending, vectors):
+            blob = embeddings.to_blob(vector)
+            cursor.execute('INSERT INTO rag_chunks (document_id, page_no, text, embedding) VALUES (?, ?, ?, ?)',
+                           (document_id, page_no, text, blob))
+            uncommitted.append((cursor.lastrowid, blob))
+        pending.clear()
+
+    def _append_committed(self, uncommitted):
+        for chunk_id, blob in uncommitted:
+            self.index.append(chunk_id, blob)
+        uncommitted.clear()
+
+    def _drop_pages(self, cursor, document_id, where, params):
+        cursor.execute(f'DELETE FROM rag_chunks WHERE document_id = ? AND {where}', (document_id, *params))
+        for _ in range(cursor.rowcount):
+            self.index.mark_deleted()
+        cursor.execute(f'DELETE FROM rag_pages WHERE document_id = ? AND {where}', (document_id, *params))
+
+    def ingest(self, path, title=None):
+        """Stream one book into the library; returns page and chunk counts"""
+        path = Path(path)
+        key = str(path.resolve())
+        stats = {'document': key, 'pages': 0, 'skipped': 0, 'chunks': 0}
+        with self._ingest_lock, self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('INSERT OR IGNORE INTO rag_documents (path, title) VALUES (?, ?)',
+                           (key, title or path.stem))
+            cursor.execute('SELECT id FROM rag_documents WHERE path = ?', (key,))
+            document_id = cursor.fetchone()[0]
+            cursor.execute('SELECT page_no, sha256 FROM rag_pages WHERE document_id = ?', (document_id,))
+            known = dict(cursor.fetchall())
+
+            pending, uncommitted = [], []
+            last_page = 0
+            for page_no, raw in iter_pages(path):
+                last_page = page_no
+                text = normalize(raw)
+                digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+                stats['pages'] += 1
+                if known.get(page_no) == digest:
+                    stats['skipped'] += 1
+                    continue
+                if page_no in known:
+                    self._drop_pages(cursor, document_id, 'page_no = ?', (page_no,))
+                cursor.execute('INSERT INTO rag_pages (document_id, page_no, sha256) VALUES (?, ?, ?)',
+                               (document_id, page_no, digest))
+                for chunk in chunk_page(text):
+                    pending.append((document_id, page_no, chunk))
+                    stats['chunks'] += 1
+                if len(pending) >= EMBED_BATCH:
+                    self._flush(cursor, pending, uncommitted)
+                    conn.commit()
+                    self._append_committed(uncommitted)
+            self._flush(cursor, pending, uncommitted)
+
+            # The book got shorter: forget pages past its new end
+            self._drop_pages(cursor, document_id, 'page_no > ?', (last_page,))
+            cursor.execute('UPDATE rag_documents SET page_count = ?, ingested_at = CURRENT_TIMESTAMP WHERE id = ?',
+                           (last_page, document_id))
+            conn.commit()
+            self._append_committed(uncommitted)
+        return stats
+
+    def _lexical(self, conn, question, limit):
+        """(chunk_id, relevance) by bm25 for any of the question's content words"""
+        terms = content_words(question)
+        if not self.fts_enabled or not terms:
+            return []
+        rows = conn.execute('''
+            SELECT rowid, -bm25(rag_chunks_fts) FROM rag_chunks_fts WHERE rag_chunks_fts MATCH ?
+            ORDER BY bm25(rag_chunks_fts) LIMIT ?
+        ''', (' OR '.join('"' + term + '"' for term in terms), limit)).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def ask(self, question, k=DEFAULT_TOP_K):
+        """
+        Top-k passages for a question, best first: vector and bm25 candidates
+        merged by weighted score, so rare terms (drug names, anatomy) that
+        hashing embeddings blur still surface their page.
+        """
+        limit = k * CANDIDATES_PER_HIT
+        query = self.embedder.embed([embedding_text(question)])[0]
+        dense = self.index.search(query, limit)
+        with self.pool.connection() as conn:
+            fused = {}
+            for weight, hits in zip(FUSION_WEIGHTS, (dense, self._lexical(conn, question, limit))):
+                best = max((score for _, score in hits), default=0)
+                if best <= 0:
+                    continue
+                for chunk_id, score in hits:
+                    fused[chunk_id] = fused.get(chunk_id, 0.0) + weight * max(score, 0) / best
+            if not fused:
+                return []
+            rows = conn.execute(f'''
+                SELECT c.id, c.page_no, c.text, d.title
+                FROM rag_chunks c JOIN rag_documents d ON d.id = c.document_id
+                WHERE c.id IN ({','.join('?' * len(fused))})
+            ''', list(fused)).fetchall()
+        # Chunks of re-ingested pages are gone from the table and drop out here
+        rows.sort(key=lambda row: fused[row['id']], reverse=True)
+        return [{'book': row['title'], 'page': row['page_no'], 'text': row['text'],
+                 'score': round(fused[row['id']], 5)} for row in rows[:k]]
+
+    def answer(self, question, k=DEFAULT_TOP_K):
+        """Passages plus the single best-matching sentence from them as an extractive answer"""
+        passages = self.ask(question, k)
+        sentences = [(sentence, passage) for passage in passages[:3]
+                     for sentence in re.split(r'(?<=[.!?])\s+', passage['text']) if len(sentence) > 20]
+        answer = None
+        if sentences:
+            vectors = self.embedder.embed([embedding_text(s) for s, _ in sentences])
+            scores = vectors @ self.embedder.embed([embedding_text(question)])[0]
+            best, passage = sentences[int(scores.argmax())]
+            answer = {'text': best, 'book': passage['book'], 'page': passage['page']}
+        return {'answer': answer, 'passages': passages}
+
+    def stats(self):
+        with self.pool.connection() as conn:
+            documents, pages = conn.execute('SELECT COUNT(*), COALESCE(SUM(page_count), 0) FROM rag_documents').fetchone()
+            chunks = conn.execute('SELECT COUNT(*) FROM rag_chunks').fetchone()[0]
+        return {'documents': documents, 'pages': pages, 'chunks': chunks,
+                'embedder': self.embedder.name, 'index_rows': len(self.index)}
+
+
+def main(argv):
+    if len(argv) < 2 or argv[0] not in ('ingest', 'ask'):
+        print(__doc__)
+        return 1
+    engine = RagEngine()
+    if argv[0] == 'ingest':
+        for path in argv[1:]:
+            stats = engine.ingest(path)
+            print(f"📚 {stats['document']}: {stats['pages']} pages, {stats['skipped']} unchanged, "
+                  f"{stats['chunks']} new chunks")
+    else:
+        result = engine.answer(' '.join(argv[1:]))
+        if result['answer']:
+            print(f"💡 {result['answer']['text']} ({result['answer']['book']}, p. {result['answer']['page']})")
+        for passage in result['passages']:
+            print(f"  [{passage['score']:.3f}] {passage['book']} p. {passage['page']}: {passage['text'][:120]}…")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Vision Engine
+Image text extraction (OCR) for uploaded notes and diagrams: a document is
+split into pages, the pages run on a process pool through a pluggable local
+OCR backend, and each page's text streams back as soon as it is done
+
+Results are cached on disk in <root>/ocr_cache.db. A whole upload is keyed
+by its SHA-256, so a repeat upload is answered without touching the pool.
+Each page is keyed by a hash of its decoded pixels, so a re-encoded copy of
+the same page (new JPEG, stripped metadata, the page inside another PDF)
+still skips OCR. The cache is bounded in bytes and drops the least recently
+used pages first.
+
+Backends are specs like embeddings.load_embedder's: 'tesseract' or
+'tesseract:<langs>' (pytesseract plus the tesseract binary), or
+'<module>:<function>' for any callable taking a PIL image and returning text.
+
+Usage:
+    python3 -m backend.engines.vision_engine notes.pdf [--backend tesseract:eng+hin]
+"""
+
+import hashlib
+import importlib
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import request_metrics
+from media_store import file_sha256
+from memory_db import ConnectionPool
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # the vision engine is unavailable without Pillow
+    Image = None
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDFs need pypdf; images still work
+    PdfReader = None
+
+try:
+    import pytesseract
+except ImportError:  # the 'tesseract' backend needs pytesseract; plug in another one
+    pytesseract = None
+
+VISION_DIR = Path('vision_cache')
+OCR_BACKEND = 'tesseract:eng'
+OCR_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+OCR_CACHE_MAX_BYTES = 256 * 1024 * 1024   # page text kept on disk
+OCR_EVICT_SLACK = 0.1                     # evict down to 90% of the limit, not just under it
+MAX_PAGES = 500                           # pages per document
+
+PAGE_SECONDS = request_metrics.register(request_metrics.Histogram(
+    'drchinki_ocr_page_seconds', 'Time to produce one page of text, by where it came from', ('source',)))
+
+# Per worker process: loaded backends, the last PDF opened, a read-only cache connection
+_backends = {}
+_pdf = {}
+_cache_readers = {}
+
+
+def load_backend(spec):
+    """OCR callable for a backend spec: 'tesseract[:<langs>]' or '<module>:<function>'"""
+    name, _, arg = spec.partition(':')
+    if name == 'tesseract':
+        if pytesseract is None:
+            raise RuntimeError('Install pytesseract (and the tesseract binary) for the tesseract OCR backend')
+        langs = arg or 'eng'
+        return lambda image: pytesseract.image_to_string(image, lang=langs)
+    if not arg:
+        raise RuntimeError(f"Unknown OCR backend {spec!r}: use 'tesseract[:<langs>]' or '<module>:<function>'")
+    try:
+        return getattr(importlib.import_module(name), arg)
+    except (ImportError, AttributeError) as e:
+        raise RuntimeError(f'Cannot load OCR backend {spec!r}: {e}') from None
+
+
+def _backend(spec):
+    backend = _backends.get(spec)
+    if backend is None:
+        backend = _backends[spec] = load_backend(spec)
+    return backend
+
+
+def create_schema(cursor):
+    """Page text by pixel hash, and each known upload's page keys in order"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ocr_pages (
+            key TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ocr_pages_last_used ON ocr_pages(last_used)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ocr_documents (
+            key TEXT PRIMARY KEY,
+            page_keys TEXT NOT NULL,
+            last_used REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def document_kind(path):
+    with open(path, 'rb') as f:
+        return 'pdf' if f.read(5) == b'%PDF-' else 'image'
+
+
+def count_pages(path, kind):
+    """Pages in a PDF, or frames in an image (multi-page TIFF, animated GIF)"""
+    if kind == 'pdf':
+        if PdfReader is None:
+            raise ValueError('Install pypdf to extract text from PDFs')
+        return len(PdfReader(path).pages)
+    try:
+        with Image.open(path) as image:
+            return getattr(image, 'n_frames', 1)
+    except OSError:
+        raise ValueError('Upload is not an image or PDF') from None
+
+
+def _open_pdf(path):
+    """One reader per worker process for the PDF it is working through"""
+    key = (path, os.path.getmtime(path))
+    if key not in _pdf:
+        _pdf.clear()
+        _pdf[key] = PdfReader(path)
+    return _pdf[key]
+
+
+def page_content(path, kind, index):
+    """(images, text layer) of one page; a PDF page with a text layer needs no OCR"""
+    if kind == 'pdf':
+        page = _open_pdf(path).pages[index]
+        text = page.extract_text() or ''
+        if text.strip():
+            return [], text
+        return [picture.image for picture in page.images], None
+    with Image.open(path) as image:
+        image.seek(index)
+        frame = ImageOps.exif_transpose(image)
+        return [frame if frame.mode in ('RGB', 'L') else frame.convert('RGB')], None
+
+
+def page_key(spec, images, text):
+    """Cache key of a page: its decoded pixels (or text layer) plus the backend that reads them"""
+    digest = hashlib.sha256(spec.encode())
+    for image in images:
+        digest.update(f'{image.mode}:{image.size}'.encode())
+        digest.update(image.tobytes())
+    if text is not None:
+        digest.update(b'text:' + text.encode())
+    return digest.hexdigest()
+
+
+def _cached_text(cache_path, key):
+    conn = _cache_readers.get(cache_path)
+    if conn is None:
+        conn = _cache_readers[cache_path] = sqlite3.connect(f'file:{cache_path}?mode=ro', uri=True)
+    row = conn.execute('SELECT text FROM ocr_pages WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else None
+
+
+def ocr_page(spec, cache_path, path, kind, index):
+    """Text of one page; runs in a worker process and checks the cache before OCR"""
+    start = time.perf_counter()
+    images, text = page_content(path, kind, index)
+    key = page_key(spec, images, text)
+    source = 'text_layer'
+    if text is None:
+        text = _cached_text(cache_path, key)
+        source = 'cache'
+        if text is None:
+            backend = _backend(spec)
+            text = '\n\n'.join(backend(image).strip() for image in images)
+            source = 'ocr'
+    return {'page': index + 1, 'key': key, 'text': text, 'source': source,
+            'seconds': round(time.perf_counter() - start, 4)}
+
+
+class VisionEngine:
+    """
+    OCR front end: extract() streams a document's pages as they finish, with
+    the whole-upload and per-page caches in front of a process pool of
+    `workers`. Counters for /health and /metrics come from stats().
+    """
+
+    def __init__(self, root=VISION_DIR, backend=OCR_BACKEND, workers=OCR_WORKERS,
+                 max_cache_bytes=OCR_CACHE_MAX_BYTES):
+        if Image is None:
+            raise RuntimeError('The vision engine needs Pillow installed')
+        load_backend(backend)  # fail now, not in every worker
+        self.backend = backend
+        self.workers = workers
+        self.max_cache_bytes = max_cache_bytes
+        self.root = Path(root)
+        self.staging_dir = self.root / '.staging'
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_path = str(self.root / 'ocr_cache.db')
+        self.pool = ConnectionPool(self.cache_path, max_size=2)
+        with self.pool.connection() as conn:
+            create_schema(conn.cursor())
+            conn.commit()
+            self._cache_bytes = conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM ocr_pages').fetchone()[0]
+        self._executor = None
+        self._lock = threading.Lock()
+        self.documents = 0
+        self.document_hits = 0
+        self.page_hits = 0
+        self.page_misses = 0
+        self.text_layer_pages = 0
+        self.errors = 0
+        self.evicted = 0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _submit(self, *args):
+        """Queue one page, replacing the pool once if a crashed worker broke it"""
+        executor = self._pool()
+        try:
+            return executor.submit(ocr_page, self.backend, self.cache_path, *args)
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            print("⚠️ OCR worker pool broke, starting a new one")
+            return self._pool().submit(ocr_page, self.backend, self.cache_path, *args)
+
+    def _document_key(self, sha256):
+        return hashlib.sha256(f'{self.backend}\0{sha256}'.encode()).hexdigest()
+
+    def _cached_document(self, key):
+        """Every page of a known upload in order, or None if it (or any page) is gone"""
+        now = time.time()
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT page_keys FROM ocr_documents WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            page_keys = row[0].split(',')
+            texts = {}
+            for start in range(0, len(page_keys), 500):
+                chunk = page_keys[start:start + 500]
+                texts.update(conn.execute(f'''
+                    SELECT key, text FROM ocr_pages WHERE key IN ({','.join('?' * len(chunk))})
+                ''', chunk).fetchall())
+            if len(texts) < len(set(page_keys)):
+                conn.execute('DELETE FROM ocr_documents WHERE key = ?', (key,))
+                conn.commit()
+                return None
+            conn.execute('UPDATE ocr_documents SET last_used = ? WHERE key = ?', (now, key))
+            conn.executemany('UPDATE ocr_pages SET last_used = ? WHERE key = ?', [(now, k) for k in texts])
+            conn.commit()
+        return [{'page': number, 'text': texts[k], 'source': 'document_cache', 'seconds': 0.0}
+                for number, k in enumerate(page_keys, start=1)]
+
+    def _remember_page(self, result):
+        """Store a finished page's text (or refresh a cache hit) and evict if over budget"""
+        size = len(result['text'].encode())
+        with self.pool.connection() as conn:
+            if result['source'] == 'cache':
+                conn.execute('UPDATE ocr_pages SET last_used = ? WHERE key = ?', (time.time(), result['key']))
+            else:
+                added = conn.execute('''
+                    INSERT OR IGNORE INTO ocr_pages (key, text, bytes, last_used) VALUES (?, ?, ?, ?)
+                ''', (result['key'], result['text'], size, time.time())).rowcount
+                with self._lock:
+                    self._cache_bytes += size * added
+            conn.commit()
+            if self._cache_bytes > self.max_cache_bytes:
+                self._evict(conn)
+
+    def _evict(self, conn):
+        """Drop least recently used pages (and uploads last used before them) down under the budget"""
+        target = self.max_cache_bytes * (1 - OCR_EVICT_SLACK)
+        freed, keys, cutoff = 0, [], None
+        cursor = conn.execute('SELECT key, bytes, last_used FROM ocr_pages ORDER BY last_used')
+        for key, size, last_used in cursor:
+            if self._cache_bytes - freed <= target:
+                break
+            keys.append((key,))
+            freed += size
+            cutoff = last_used
+        cursor.close()
+        conn.executemany('DELETE FROM ocr_pages WHERE key = ?', keys)
+        if cutoff is not None:
+            conn.execute('DELETE FROM ocr_documents WHERE last_used <= ?', (cutoff,))
+        conn.commit()
+        with self._lock:
+            self._cache_bytes -= freed
+            self.evicted += len(keys)
+
+    def extract(self, path, sha256=None):
+        """
+        Stream a document's text: a 'document' record, one 'page' record per
+        page in the order pages finish, then an 'end' record. Raises
+        ValueError before the first record if the file is not a readable
+        image or PDF.
+        """
+        start = time.perf_counter()
+        sha256 = sha256 or file_sha256(path)
+        document_key = self._document_key(sha256)
+        cached = self._cached_document(document_key)
+        if cached is not None:
+            with self._lock:
+                self.documents += 1
+                self.document_hits += 1
+            yield {'kind': 'document', 'sha256': sha256, 'pages': len(cached), 'cached': True}
+            for page in cached:
+                yield dict(page, kind='page')
+            yield {'kind': 'end', 'pages': len(cached), 'errors': 0,
+                   'seconds': round(time.perf_counter() - start, 4)}
+            return
+
+        kind = document_kind(path)
+        count = count_pages(path, kind)
+        if count > MAX_PAGES:
+            raise ValueError(f'Document has {count} pages, the limit is {MAX_PAGES}')
+        with self._lock:
+            self.documents += 1
+        yield {'kind': 'document', 'sha256': sha256, 'pages': count, 'cached': False}
+        futures = {self._submit(path, kind, index): index for index in range(count)}
+        page_keys = [None] * count
+        errors = 0
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors += 1
+                    with self._lock:
+                        self.errors += 1
+                    yield {'kind': 'page', 'page': index + 1, 'error': str(e)}
+                    continue
+                self._remember_page(result)
+                page_keys[index] = result.pop('key')
+                PAGE_SECONDS.observe((result['source'],), result['seconds'])
+                with self._lock:
+                    self.page_hits += result['source'] == 'cache'
+                    self.page_misses += result['source'] == 'ocr'
+                    self.text_layer_pages += result['source'] == 'text_layer'
+                yield dict(result, kind='page')
+        finally:
+            # Client gone: pages not started yet are dropped
+            for future in futures:
+                future.cancel()
+        if not errors:
+            with self.pool.connection() as conn:
+                conn.execute('INSERT OR REPLACE INTO ocr_documents (key, page_keys, last_used) VALUES (?, ?, ?)',
+                             (document_key, ','.join(page_keys), time.time()))
+                conn.commit()
+        yield {'kind': 'end', 'pages': count, 'errors': errors, 'seconds': round(time.perf_counter() - start, 4)}
+
+    def extract_text(self, path):
+        """Whole-document text, pages in order (for callers that don't stream)"""
+        pages = sorted((record for record in self.extract(path) if record['kind'] == 'page'),
+                       key=lambda record: record['page'])
+        return '\n\n'.join(page.get('text', '') for page in pages)
+
+    def stats(self):
+        """Cache and worker counters for /health"""
+        with self._lock:
+            served = self.page_hits + self.page_misses
+            return {
+                'backend': self.backend,
+                'workers': self.workers,
+                'documents': self.documents,
+                'document_hits': self.document_hits,
+                'document_hit_rate': round(self.document_hits / self.documents, 4) if self.documents else 0.0,
+                'page_hits': self.page_hits,
+                'page_misses': self.page_misses,
+                'page_hit_rate': round(self.page_hits / served, 4) if served else 0.0,
+                'text_layer_pages': self.text_layer_pages,
+                'errors': self.errors,
+                'cache_bytes': self._cache_bytes,
+                'max_cache_bytes': self.max_cache_bytes,
+                'evicted_pages': self.evicted,
+            }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+        self.pool.close_all()
+
+
+def main(argv):
+    if not argv or argv[0].startswith('-'):
+        print(__doc__)
+        return 1
+    backend = argv[argv.index('--backend') + 1] if '--backend' in argv else OCR_BACKEND
+    engine = VisionEngine(backend=backend)
+    try:
+        for record in engine.extract(argv[0]):
+            if record['kind'] == 'document':
+                print(f"📄 {record['pages']} pages{' (cached)' if record['cached'] else ''}")
+            elif record['kind'] == 'page' and 'error' in record:
+                print(f"❌ Page {record['page']}: {record['error']}")
+            elif record['kind'] == 'page':
+                print(f"--- page {record['page']} ({record['source']}, {record['seconds']:.2f}s) ---")
+                print(record['text'])
+            else:
+                print(f"✅ Done in {record['seconds']:.2f}s")
+    finally:
+        engine.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Voice Engine
+Phoneme and viseme timelines for the avatar's lip-sync, produced sentence by
+sentence while a reply is still arriving
+
+Text is split at sentence ends as it streams in, each sentence is normalised
+(case, punctuation, digits), and its timeline comes from an in-memory LRU
+keyed by the normalised sentence. Entries pushed out of the LRU spill to
+<root>/timelines.db and are promoted back on their next use, so the tutor's
+stock phrases are only ever converted once. Conversion itself is a word
+lexicon lookup (Hinglish and common English, optionally a CMUdict file)
+with a longest-match grapheme table for everything else.
+
+Visemes are the 15 Oculus/Ready Player Me mouth shapes (sil, PP, FF, TH, DD,
+kk, CH, SS, nn, RR, aa, E, ih, oh, ou); times are integer milliseconds.
+
+Usage:
+    python3 -m backend.engines.voice_engine "Haan meri jaan, heart ek pump hai."
+"""
+
+import json
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+from memory_db import ConnectionPool
+
+VOICE_DIR = Path('voice_cache')
+LEXICON_PATH = None               # optional CMUdict-format file ("WORD  W ER1 D") merged over LEXICON
+SPEAKING_RATE = 1.0               # >1 speaks faster
+TIMELINE_CACHE_ENTRIES = 2048     # sentences kept in memory
+SPILL_MAX_ROWS = 50000            # sentences kept on disk once evicted from memory
+MAX_SENTENCE_CHARS = 240          # a run-on sentence is cut at a comma or space past this
+COMMA_PAUSE_MS = 180
+SENTENCE_PAUSE_MS = 250
+TIMELINE_VERSION = 1              # bump when durations or mappings change; old spilled entries are ignored
+
+PHONEME_VISEMES = {
+    'P': 'PP', 'B': 'PP', 'M': 'PP',
+    'F': 'FF', 'V': 'FF',
+    'TH': 'TH', 'DH': 'TH',
+    'T': 'DD', 'D': 'DD',
+    'K': 'kk', 'G': 'kk', 'NG': 'kk', 'HH': 'kk',
+    'CH': 'CH', 'JH': 'CH', 'SH': 'CH', 'ZH': 'CH',
+    'S': 'SS', 'Z': 'SS',
+    'N': 'nn', 'L': 'nn',
+    'R': 'RR', 'ER': 'RR',
+    'AA': 'aa', 'AH': 'aa', 'AE': 'aa', 'AW': 'aa', 'AY': 'aa',
+    'EH': 'E', 'EY': 'E',
+    'IH': 'ih', 'IY': 'ih', 'Y': 'ih',
+    'AO': 'oh', 'OW': 'oh', 'OY': 'oh',
+    'UH': 'ou', 'UW': 'ou', 'W': 'ou',
+    'sil': 'sil',
+}
+
+# Base duration in ms at SPEAKING_RATE 1.0
+PHONEME_MS = dict(
+    {p: 100 for p in ('AA', 'AH', 'AE', 'AO', 'EH', 'IH', 'IY', 'UH', 'UW')},
+    **{p: 140 for p in ('AW', 'AY', 'EY', 'OW', 'OY')},
+    **{p: 60 for p in ('P', 'B', 'T', 'D', 'K', 'G')},
+    **{p: 80 for p in ('F', 'V', 'TH', 'DH', 'S', 'Z', 'SH', 'ZH', 'HH')},
+    **{p: 90 for p in ('CH', 'JH')},
+    **{p: 65 for p in ('M', 'N', 'NG', 'L', 'R')},
+    **{p: 55 for p in ('W', 'Y')},
+    ER=110,
+)
+
+# Whole words: Hinglish that romanised spelling rules get wrong, and common
+# English (the grapheme table is tuned for Hinglish, so English spellings
+# like "the" or "heart" need entries)
+LEXICON = {
+    # Hinglish
+    'hai': 'HH EY', 'hain': 'HH EY N', 'haan': 'HH AA N', 'han': 'HH AA N', 'nahi': 'N AH HH IY',
+    'nahin': 'N AH HH IY N', 'kya': 'K Y AA', 'meri': 'M EH R IY', 'mera': 'M EH R AA', 'mere': 'M EH R EY',
+    'teri': 'T EH R IY', 'tera': 'T EH R AA', 'tere': 'T EH R EY', 'jaan': 'JH AA N', 'aur': 'AO R',
+    'bhi': 'B IH', 'ek': 'EY K', 'yeh': 'Y EH', 'ye': 'Y EH', 'woh': 'W OW', 'wo': 'W OW',
+    'main': 'M EY N', 'mai': 'M EY', 'mein': 'M EY N', 'hum': 'HH AH M', 'tum': 'T UH M', 'aap': 'AA P',
+    'accha': 'AH CH AA', 'acha': 'AH CH AA', 'theek': 'T IY K', 'thik': 'T IY K', 'samjho': 'S AH M JH OW',
+    'samjha': 'S AH M JH AA', 'dekho': 'D EH K HH OW', 'chalo': 'CH AH L OW', 'bahut': 'B AH HH UH T',
+    'kaise': 'K EY S EY', 'kaam': 'K AA M', 'kar': 'K AH R', 'karo': 'K AH R OW', 'karna': 'K AH R N AA',
+    'hota': 'HH OW T AA', 'hoti': 'HH OW T IY', 'hote': 'HH OW T EY', 'ko': 'K OW', 'ka': 'K AA',
+    'ki': 'K IY', 'ke': 'K EY', 'se': 'S EY', 'par': 'P AH R', 'pe': 'P EY', 'toh': 'T OW', 'ji': 'JH IY',
+    'beta': 'B EY T AA', 'yaar': 'Y AA R', 'dil': 'D IH L', 'boss': 'B AO S', 'kamar': 'K AH M AH R',
+    'alam': 'AA L AH M', 'chinki': 'CH IH NG K IY', 'padhai': 'P AH D AY', 'jaldi': 'JH AH L D IY',
+    # English
+    'the': 'DH AH', 'a': 'AH', 'an': 'AE N', 'is': 'IH Z', 'are': 'AA R', 'was': 'W AA Z', 'and': 'AH N D',
+    'of': 'AH V', 'to': 'T UW', 'in': 'IH N', 'it': 'IH T', 'this': 'DH IH S', 'that': 'DH AE T',
+    'you': 'Y UW', 'your': 'Y AO R', 'i': 'AY', 'my': 'M AY', 'we': 'W IY', 'what': 'W AH T',
+    'how': 'HH AW', 'why': 'W AY', 'where': 'W EH R', 'when': 'W EH N', 'who': 'HH UW', 'with': 'W IH DH',
+    'for': 'F AO R', 'be': 'B IY', 'have': 'HH AE V', 'has': 'HH AE Z', 'can': 'K AE N', 'will': 'W IH L',
+    'so': 'S OW', 'yes': 'Y EH S', 'no': 'N OW', 'ok': 'OW K EY', 'okay': 'OW K EY', 'hello': 'HH AH L OW',
+    'thank': 'TH AE NG K', 'thanks': 'TH AE NG K S', 'good': 'G UH D', 'very': 'V EH R IY',
+    'heart': 'HH AA R T', 'blood': 'B L AH D', 'brain': 'B R EY N', 'cell': 'S EH L', 'body': 'B AA D IY',
+    'organ': 'AO R G AH N', 'pressure': 'P R EH SH ER', 'oxygen': 'AA K S AH JH AH N', 'lungs': 'L AH NG Z',
+    'kidney': 'K IH D N IY', 'liver': 'L IH V ER', 'doctor': 'D AA K T ER', 'student': 'S T UW D AH N T',
+    'exam': 'IH G Z AE M', 'neet': 'N IY T', 'question': 'K W EH S CH AH N', 'answer': 'AE N S ER',
+    'important': 'IH M P AO R T AH N T', 'remember': 'R IH M EH M B ER', 'function': 'F AH NG K SH AH N',
+    'system': 'S IH S T AH M', 'pump': 'P AH M P', 'zero': 'Z IH R OW', 'one': 'W AH N', 'two': 'T UW',
+    'three': 'TH R IY', 'four': 'F AO R', 'five': 'F AY V', 'six': 'S IH K S', 'seven': 'S EH V AH N',
+    'eight': 'EY T', 'nine': 'N AY N',
+}
+DIGITS = ('zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine')
+
+# Romanised spelling → phonemes, matched longest first
+GRAPHEMES = {
+    'chh': 'CH', 'aa': 'AA', 'ee': 'IY', 'ii': 'IY', 'oo': 'UW', 'uu': 'UW', 'ai': 'EY', 'ei': 'EY',
+    'au': 'AO', 'ou': 'AW', 'kh': 'K', 'gh': 'G', 'ch': 'CH', 'jh': 'JH', 'th': 'T', 'dh': 'D',
+    'ph': 'F', 'bh': 'B', 'sh': 'SH', 'ng': 'NG', 'ck': 'K', 'qu': 'K W', 'wh': 'W',
+    'a': 'AH', 'b': 'B', 'c': 'K', 'd': 'D', 'e': 'EH', 'f': 'F', 'g': 'G', 'h': 'HH', 'i': 'IH',
+    'j': 'JH', 'k': 'K', 'l': 'L', 'm': 'M', 'n': 'N', 'o': 'OW', 'p': 'P', 'q': 'K', 'r': 'R',
+    's': 'S', 't': 'T', 'u': 'UH', 'v': 'V', 'w': 'W', 'x': 'K S', 'y': 'Y', 'z': 'Z',
+}
+GRAPHEME_TABLE = {graphemes: tuple(phonemes.split()) for graphemes, phonemes in GRAPHEMES.items()}
+LONGEST_GRAPHEME = max(map(len, GRAPHEME_TABLE))
+
+# Titles before a name ("Dr. Chinki") do not end a sentence
+SENTENCE_END = re.compile(r'(?<!\bDr)(?<!\bMr)(?<!\bMrs)(?<!\bMs)(?<!\bSt)[.!?।]+["\')\]]*\s+|\n+')
+CLAUSE_BREAK = re.compile(r'[,;:]\s+')
+WORD_BREAK = re.compile(r'\s+')
+
+
+def load_lexicon(path):
+    """CMUdict-format entries ("WORD  P1 P2", ';;;' comments, stress digits dropped, (2) variants skipped)"""
+    lexicon = {}
+    with open(path, encoding='latin-1') as f:
+        for line in f:
+            if not line.strip() or line.startswith(';;;'):
+                continue
+            word, _, phonemes = line.strip().partition(' ')
+            if word.endswith(')'):
+                continue
+            lexicon[word.lower()] = re.sub(r'\d', '', phonemes).strip()
+    return lexicon
+
+
+def normalize(sentence):
+    """Cache key form: lower case, digits spelled out, only words and comma pauses left"""
+    text = re.sub(r'\d', lambda m: f' {DIGITS[int(m.group())]} ', sentence.lower().replace('’', "'"))
+    text = re.sub(r"[^\w\s,']|_", ' ', text)
+    text = re.sub(r'\s*,[\s,]*', ' , ', text)
+    return ' '.join(text.split()).strip(' ,')
+
+
+def graphemes_to_phonemes(word):
+    """Longest-match walk over GRAPHEME_TABLE; unknown characters (e.g. Devanagari) are skipped"""
+    phonemes = []
+    i, end = 0, len(word)
+    while i < end:
+        for size in range(min(LONGEST_GRAPHEME, end - i), 0, -1):
+            match = GRAPHEME_TABLE.get(word[i:i + size])
+            if match is not None:
+                # Word-final 'a' is long in romanised Hindi: "kya", "tha", "mera"
+                phonemes.extend(('AA',) if match == ('AH',) and i + size == end and end > 1 else match)
+                i += size
+                break
+        else:
+            i += 1
+    return tuple(phonemes)
+
+
+class TimelineCache:
+    """
+    LRU of normalised sentence → timeline, spilling evicted entries to an
+    SQLite table (itself trimmed to `max_spill_rows`, oldest first) and
+    promoting them back to memory when they are asked for again
+    """
+
+    def __init__(self, spill_path, max_entries=TIMELINE_CACHE_ENTRIES, max_spill_rows=SPILL_MAX_ROWS):
+        self.max_entries = max_entries
+        self.max_spill_rows = max_spill_rows
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.pool = ConnectionPool(str(spill_path), max_size=1)
+        with self.pool.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS voice_timelines (
+                    key TEXT PRIMARY KEY,
+                    timeline TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_voice_timelines_last_used ON voice_timelines(last_used)')
+            conn.commit()
+            self._spilled_rows = conn.execute('SELECT COUNT(*) FROM voice_timelines').fetchone()[0]
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.spilled = 0
+
+    def get(self, key):
+        with self._lock:
+            timeline = self._items.get(key)
+            if timeline is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return timeline
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT timeline FROM voice_timelines WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE voice_timelines SET last_used = ? WHERE key = ?', (time.time(), key))
+                conn.commit()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        timeline = json.loads(row[0])
+        self.put(key, timeline)
+        return timeline
+
+    def put(self, key, timeline):
+        with self._lock:
+            self._items[key] = timeline
+            self._items.move_to_end(key)
+            evicted = []
+            while len(self._items) > self.max_entries:
+                evicted.append(self._items.popitem(last=False))
+        if evicted:
+            self._spill(evicted)
+
+    def _spill(self, entries):
+        now = time.time()
+        with self.pool.connection() as conn:
+            added = 0
+            for key, timeline in entries:
+                inserted = conn.execute(
+                    'INSERT OR IGNORE INTO voice_timelines (key, timeline, last_used) VALUES (?, ?, ?)',
+                    (key, json.dumps(timeline, separators=(',', ':')), now)).rowcount
+                if not inserted:
+                    conn.execute('UPDATE voice_timelines SET last_used = ? WHERE key = ?', (now, key))
+                added += inserted
+            with self._lock:
+                self.spilled += len(entries)
+                self._spilled_rows += added
+                excess = self._spilled_rows - self.max_spill_rows
+            if excess > 0:
+                conn.execute('''
+                    DELETE FROM voice_timelines WHERE key IN (
+                        SELECT key FROM voice_timelines ORDER BY last_used LIMIT ?
+                    )
+                ''', (excess,))
+                with self._lock:
+                    self._spilled_rows -= excess
+            conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._items),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'spilled': self.spilled,
+                'spill_rows': self._spilled_rows,
+            }
+
+
+class TimelineStream:
+    """
+    Incremental splitter for one reply: feed() text as it arrives and get
+    back the records of every sentence it completed; finish() flushes the
+    rest. Offsets accumulate, so records can be scheduled back to back.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.buffer = ''
+        self.index = 0
+        self.offset = 0
+
+    def _emit(self, sentence):
+        timeline, cached = self.engine.timeline(sentence)
+        if timeline is None:
+            return None
+        record = {'kind': 'sentence', 'index': self.index, 'text': sentence.strip(), 'offset': self.offset,
+                  'duration': timeline['duration'], 'cached': cached,
+                  'phonemes': timeline['phonemes'], 'visemes': timeline['visemes']}
+        self.index += 1
+        self.offset += timeline['duration']
+        return record
+
+    def feed(self, text):
+        self.buffer += text
+        records, start = [], 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            records.append(self._emit(self.buffer[start:match.end()]))
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        # A run-on sentence still gets lips moving: cut it at the last clause break
+        while len(self.buffer) > MAX_SENTENCE_CHARS:
+            breaks = ([m.end() for m in CLAUSE_BREAK.finditer(self.buffer, 0, MAX_SENTENCE_CHARS)]
+                      or [m.end() for m in WORD_BREAK.finditer(self.buffer, 0, MAX_SENTENCE_CHARS)])
+            cut = breaks[-1] if breaks else MAX_SENTENCE_CHARS
+            records.append(self._emit(self.buffer[:cut]))
+            self.buffer = self.buffer[cut:]
+        return [record for record in records if record is not None]
+
+    def finish(self):
+        records = [self._emit(self.buffer)] if self.buffer.strip() else []
+        self.buffer = ''
+        records = [record for record in records if record is not None]
+        return records + [{'kind': 'end', 'sentences': self.index, 'duration': self.offset}]
+
+
+class VoiceEngine:
+    """Sentence timelines from the lexicon and grapheme table, behind a TimelineCache"""
+
+    def __init__(self, root=VOICE_DIR, rate=SPEAKING_RATE, lexicon_path=LEXICON_PATH,
+                 cache_entries=TIMELINE_CACHE_ENTRIES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.rate = rate
+        self.lexicon = {word: tuple(phonemes.split()) for word, phonemes in LEXICON.items()}
+        if lexicon_path:
+            self.lexicon.update((word, tuple(phonemes.split()))
+                                for word, phonemes in load_lexicon(lexicon_path).items())
+        self.cache = TimelineCache(self.root / 'timelines.db', cache_entries)
+        # Per-word results are memoised too: replies repeat words far more than sentences
+        self.word_phonemes = lru_cache(maxsize=16384)(self._word_phonemes)
+
+    def _word_phonemes(self, word):
+        phonemes = self.lexicon.get(word)
+        if phonemes is None:
+            phonemes = self.lexicon.get(word.strip("'")) or graphemes_to_phonemes(word.replace("'", ''))
+        return phonemes
+
+    def build_timeline(self, normalized):
+        """Phoneme and merged viseme tracks of a normalised sentence, times in ms from its start"""
+        phonemes, visemes, clock = [], [], 0
+        for word in normalized.split():
+            if word == ',':
+                sequence = (('sil', COMMA_PAUSE_MS),)
+            else:
+                sequence = ((p, PHONEME_MS.get(p, 80)) for p in self.word_phonemes(word))
+            for phoneme, base_ms in sequence:
+                duration = max(1, round(base_ms / self.rate))
+                phonemes.append([phoneme, clock, duration])
+                viseme = PHONEME_VISEMES.get(phoneme, 'sil')
+                if visemes and visemes[-1][0] == viseme:
+                    visemes[-1][2] += duration
+                else:
+                    visemes.append([viseme, clock, duration])
+                clock += duration
+        pause = round(SENTENCE_PAUSE_MS / self.rate)
+        phonemes.append(['sil', clock, pause])
+        visemes.append(['sil', clock, pause])
+        return {'phonemes': phonemes, 'visemes': visemes, 'duration': clock + pause}
+
+    def timeline(self, sentence):
+        """(timeline, cached) of one sentence, or (None, False) if nothing in it is speakable"""
+        normalized = normalize(sentence)
+        if not normalized:
+            return None, False
+        key = f'{TIMELINE_VERSION}:{self.rate}:{normalized}'
+        timeline = self.cache.get(key)
+        if timeline is not None:
+            return timeline, True
+        timeline = self.build_timeline(normalized)
+        self.cache.put(key, timeline)
+        return timeline, False
+
+    def open_stream(self):
+        return TimelineStream(self)
+
+    def stream(self, chunks):
+        """
+        Sentence records as soon as each sentence is complete, then an end
+        record. `chunks` is the reply as a string or as pieces arriving
+        over time (e.g. tokens from the model).
+        """
+        stream = self.open_stream()
+        for chunk in ([chunks] if isinstance(chunks, str) else chunks):
+            yield from stream.feed(chunk)
+        yield from stream.finish()
+
+    def stats(self):
+        return dict(self.cache.stats(), lexicon_words=len(self.lexicon),
+                    word_cache=self.word_phonemes.cache_info().currsize)
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return 1
+    engine = VoiceEngine()
+    for record in engine.stream(' '.join(argv)):
+        if record['kind'] == 'sentence':
+            print(f"🗣️ [{record['offset']} ms +{record['duration']}] {record['text']}")
+            print('   ' + ' '.join(f"{viseme}:{duration}" for viseme, _, duration in record['visemes']))
+        else:
+            print(f"✅ {record['sentences']} sentences, {record['duration']} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,749 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Memory Server (ASGI)
+FastAPI version of memory_server.py's /api/memory, /api/voice and /api/user
+routes with the same request and response shapes. Route bodies are the
+shared handle_* functions from memory_server.py, run on a bounded thread
+pool so SQLite and base64 work never blocks the event loop; uploads are
+written to staging with async file I/O.
+
+Run: python3 -m backend.main --workers 4 --port 5000
+"""
+
+import argparse
+import asyncio
+import codecs
+import contextvars
+import email.utils
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import anyio
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# memory_server.py and its helper modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory_server as core
+import request_metrics
+import tenants
+import thumbnails
+from backend.engines import medical_engine, rag_engine, vision_engine, voice_engine
+from media_store import MAX_UPLOAD_BYTES, UPLOAD_CHUNK, StagedBlob, UploadTooLarge
+
+# Bounded executors: SQLite work (one pooled connection per thread) and media file reads
+DB_WORKERS = 8
+FILE_WORKERS = 4
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='memory-db')
+FILE_EXECUTOR = ThreadPoolExecutor(max_workers=FILE_WORKERS, thread_name_prefix='memory-files')
+MAX_REPORTS_PER_REQUEST = 1000
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await asyncio.get_running_loop().run_in_executor(DB_EXECUTOR, core.init_db)
+    core.THUMBNAILS.start()
+    yield
+
+
+_rag = None
+
+
+def get_rag():
+    """The book library, opened on first use (ingestion happens through the rag_engine CLI)"""
+    global _rag
+    if _rag is None:
+        _rag = rag_engine.RagEngine()
+    return _rag
+
+
+_vision = None
+
+
+def get_vision():
+    """The OCR engine and its process pool, started on first use"""
+    global _vision
+    if _vision is None:
+        _vision = vision_engine.VisionEngine()
+    return _vision
+
+
+_voice = None
+
+
+def get_voice():
+    """Lip-sync timelines with their sentence cache, opened on first use"""
+    global _voice
+    if _voice is None:
+        _voice = voice_engine.VoiceEngine()
+    return _voice
+
+
+app = FastAPI(title='Dr. Chinki Memory Server', lifespan=lifespan)
+
+
+class SelectTenant:
+    """
+    Serve the request from the caller's shard when it names a user (X-User-Id
+    or ?user=). Plain ASGI rather than @app.middleware: the borrow has to
+    last until the response, streamed body included, has been sent or the
+    client has gone, and only a try/finally around the whole app call
+    covers a body that never starts.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not core.TENANTS_ENABLED:
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        try:
+            user_id = tenants.parse_user_id(request.headers.get(tenants.USER_HEADER),
+                                            request.query_params.get(tenants.USER_PARAM))
+        except tenants.InvalidUserId as e:
+            return await error(str(e), 400)(scope, receive, send)
+        if user_id is None:
+            return await self.app(scope, receive, send)
+        router = core.get_router()
+        # Opening a shard may create its schema, so it happens off the loop
+        shard = await asyncio.get_running_loop().run_in_executor(DB_EXECUTOR, router.acquire, user_id)
+        token = tenants.activate(shard)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            tenants.deactivate(token)
+            router.release(shard)
+
+
+app.add_middleware(SelectTenant)
+
+
+@app.middleware('http')
+async def time_request(request: Request, call_next):
+    """Per-route latency and phase metrics, plus the opt-in X-Profile sampler"""
+    if not core.METRICS_ENABLED:
+        return await call_next(request)
+    profile = request_metrics.wants_profile(request.headers.get(request_metrics.PROFILE_HEADER),
+                                            core.PROFILING_ENABLED)
+    timer = request_metrics.begin(None, request.method, request.url.path, profile)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        # The router records the matched route in the shared scope
+        route = request.scope.get('route')
+        timer.route = getattr(route, 'path', None)
+        profiled = request_metrics.stop_profile(timer)
+        request_metrics.finish(timer, status)
+    if profiled:
+        path, samples = profiled
+        response.headers[request_metrics.PROFILE_HEADER] = f'{path}; samples={samples}'
+    return response
+
+
+# Added last so it is outermost and early errors (like a bad user id) carry CORS headers too
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+
+
+def reply(result):
+    """JSON response for a (payload, status) pair from a shared handler"""
+    payload, status = result
+    return Response(core.dump_json(payload), status_code=status, media_type='application/json')
+
+
+async def reply_cached(request, key, handler, *args):
+    """Serve a read through the shared response cache, answering If-None-Match with 304"""
+    body, status, etag = await run_db(core.cached_read, key, handler, *args)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if status == 200 and etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, status_code=status, media_type='application/json', headers=headers)
+
+
+def error(message, status):
+    return JSONResponse({'success': False, 'message': message}, status_code=status)
+
+
+async def run_db(handler, *args):
+    """Run a shared handler on the DB executor with a pooled connection"""
+    def call():
+        with request_metrics.attach_thread(), core.get_pool().connection() as conn:
+            return handler(conn, *args)
+    # Carry the request's context over, so its queries and phases land on its
+    # timer and its shard is the one used
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    shard = tenants.current()
+    if shard is None:
+        return await loop.run_in_executor(DB_EXECUTOR, context.run, call)
+    # One busy user can hold at most SHARD_MAX_CONCURRENT of the executor's threads
+    async with shard.slots:
+        return await loop.run_in_executor(DB_EXECUTOR, context.run, call)
+
+
+def parse_json(body):
+    """Request JSON, or None when it is missing or malformed (like Flask's get_json(silent=True))"""
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+
+async def run_json(handler, request):
+    """Run a handler on the parsed JSON body; large base64 bodies are decoded off the loop too"""
+    body = await request.body()
+    return reply(await run_db(lambda conn: handler(conn, parse_json(body))))
+
+
+async def stage_chunks(store, chunks):
+    """Async twin of MediaStore.stage_stream: hash chunks while writing them to staging"""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=store.staging_dir, suffix='.part')
+    os.close(fd)
+    try:
+        async with await anyio.open_file(tmp_path, 'wb') as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadTooLarge(f'Upload exceeds {MAX_UPLOAD_BYTES} bytes')
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return StagedBlob(tmp_path, digest.hexdigest(), size)
+
+
+async def upload_chunks(upload):
+    while chunk := await upload.read(UPLOAD_CHUNK):
+        yield chunk
+
+
+@app.post('/api/memory/save')
+async def save_memory(request: Request):
+    """Save a new memory to database"""
+    return await run_json(core.handle_save_memory, request)
+
+
+@app.post('/api/memory/save_batch')
+async def save_memory_batch(request: Request):
+    """Save many memories in one transaction"""
+    return await run_json(core.handle_save_batch, request)
+
+
+@app.post('/api/memory/upload')
+async def upload_memory(request: Request):
+    """Save a new memory from a multipart form, streaming image/audio files to disk"""
+    staged = {}
+    try:
+        form = await request.form()
+        memory = core.upload_fields(form)
+        for kind, store in (('image', core.store_for('image')), ('audio', core.store_for('audio'))):
+            upload = form.get(kind)
+            if upload is not None and not isinstance(upload, str):
+                staged[kind] = await stage_chunks(store, upload_chunks(upload))
+        return reply(await run_db(core.handle_upload_memory, memory, staged))
+    except UploadTooLarge as e:
+        return error(str(e), 413)
+    except ValueError as e:
+        return error(f'Invalid form field: {str(e)}', 400)
+    except Exception as e:
+        print(f"❌ Error uploading memory: {e}")
+        return error(f'Error uploading memory: {str(e)}', 500)
+    finally:
+        for blob in staged.values():
+            blob.discard()
+
+
+@app.put('/api/memory/{memory_id}/{kind}')
+async def attach_media(memory_id: int, kind: str, request: Request):
+    """Stream a raw request body to disk as a memory's image or audio"""
+    if kind not in ('image', 'audio'):
+        return error('Not found', 404)
+    staged = None
+    try:
+        if not await run_db(core.memory_exists, memory_id):
+            return error('Memory not found', 404)
+        staged = await stage_chunks(core.store_for(kind), request.stream())
+        return reply(await run_db(core.handle_attach_media, memory_id, kind, staged))
+    except UploadTooLarge as e:
+        return error(str(e), 413)
+    except Exception as e:
+        print(f"❌ Error attaching {kind}: {e}")
+        return error(f'Error attaching {kind}: {str(e)}', 500)
+    finally:
+        if staged:
+            staged.discard()
+
+
+@app.get('/api/user/profile')
+async def get_user_profile(request: Request):
+    """Retrieve the user profile"""
+    return await reply_cached(request, ('profile',), core.handle_get_profile)
+
+
+@app.post('/api/user/profile')
+async def save_user_profile(request: Request):
+    """Save or update the user profile"""
+    return await run_json(core.handle_save_profile, request)
+
+
+@app.get('/api/memory/list')
+async def list_memories(request: Request):
+    """Retrieve memories, newest first, optionally paginated with limit/cursor and fields="""
+    params = request.query_params
+    args = (params.get('fields'), core.parse_int(params.get('limit')), params.get('cursor'),
+            core.parse_flag(params.get('include_archived')))
+    fields = core.parse_fields(args[0])
+    if fields is not None and core.wants_stream(params):
+        return StreamingResponse(stream_list(fields), media_type='application/json')
+    return await reply_cached(request, ('list', *args), core.handle_list_memories, *args)
+
+
+def stream_list(fields):
+    """Hold one pooled connection for the whole streamed list; Starlette iterates this in a worker thread"""
+    with core.get_pool().connection() as conn:
+        yield from core.stream_memory_list(conn, fields)
+
+
+@app.get('/api/memory/export')
+async def export_memories(request: Request):
+    """Stream every memory as NDJSON (media=none|hash|inline) from a single read snapshot"""
+    media, problem = core.export_params(request.query_params)
+    if problem:
+        return reply(problem)
+    return StreamingResponse(stream_export(media), media_type='application/x-ndjson',
+                             headers=core.EXPORT_HEADERS)
+
+
+def stream_export(media):
+    with core.get_pool().connection() as conn:
+        yield from core.memory_transfer.iter_export(conn, core.store_for('image'), core.store_for('audio'),
+                                                  core.media_dir('audio'), media, core.get_archive())
+
+
+@app.get('/api/memory/changes')
+async def memory_changes(request: Request):
+    """Server-sent events for every memory insert, update, delete and archive (resume with since=)"""
+    since, problem = core.changes_since(request.query_params, request.headers)
+    if problem:
+        return reply(problem)
+    loop = asyncio.get_running_loop()
+    # Subscribers wait on the loop; only a resume from behind the in-memory buffer reads the table
+    frames = core.get_change_feed().aiter_frames(
+        since, lambda fn, *args: loop.run_in_executor(DB_EXECUTOR, contextvars.copy_context().run, fn, *args))
+    return StreamingResponse(frames, media_type='text/event-stream', headers=core.CHANGES_HEADERS)
+
+
+@app.get('/api/memory/search')
+async def search_memories(request: Request):
+    """Search memories by text query, ranked with FTS5 bm25 when available"""
+    params = request.query_params
+    args = (params.get('query', ''), core.parse_int(params.get('limit')),
+            core.parse_flag(params.get('include_archived')))
+    return await reply_cached(request, ('search', *args), core.handle_search_memories, *args)
+
+
+def etag_matches(header, etag):
+    """If-None-Match check: '*' or any listed tag equal to ours (weak or strong)"""
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/').strip('"') == etag for tag in tags)
+
+
+def parse_range(header, length):
+    """(start, end) inclusive for a single 'bytes=' range, None to ignore it, or 'invalid' for 416"""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[len('bytes='):].strip().partition('-')
+    try:
+        if start:
+            start, end = int(start), min(int(end) if end else length - 1, length - 1)
+        else:
+            start, end = max(length - int(end), 0), length - 1
+    except ValueError:
+        return None
+    return (start, end) if start <= end < length else 'invalid'
+
+
+async def read_file(path, start=0, length=None):
+    async with await anyio.open_file(path, 'rb') as f:
+        await f.seek(start)
+        return await f.read(-1 if length is None else length)
+
+
+async def file_chunks(path, start, end):
+    async with await anyio.open_file(path, 'rb') as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(UPLOAD_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def serve_media(request, directory, store, filename, size=None):
+    """Serve a media file with a strong ETag, 304s, Range/206 and optional LRU caching"""
+    with request_metrics.phase('file'):
+        located = await asyncio.get_running_loop().run_in_executor(
+            FILE_EXECUTOR, core.locate_media, directory, store, filename, size)
+    if located is None:
+        # Media of archived memories is read out of its segment (always the original size)
+        archived = await run_db(core.locate_archived_media, filename)
+        if archived is None:
+            return error(f'File not found: {filename}', 404)
+        return archived_media_response(request, store, *archived)
+    path, stat, etag, immutable = located
+
+    headers = {
+        'ETag': f'"{etag}"',
+        'Accept-Ranges': 'bytes',
+        'Last-Modified': email.utils.formatdate(stat.st_mtime, usegmt=True),
+        # Content-addressed URLs never change meaning
+        'Cache-Control': f'public, max-age={core.IMMUTABLE_MAX_AGE}, immutable' if immutable else 'no-cache',
+    }
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        # Revalidation hit: skip touching the file at all
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    length = stat.st_size
+    byte_range = None
+    if_range = request.headers.get('if-range')
+    if not if_range or if_range.strip('"') == etag:
+        byte_range = parse_range(request.headers.get('range'), length)
+    if byte_range == 'invalid':
+        return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{length}'})
+
+    data = None
+    if core.MEDIA_CACHE.enabled and length <= core.MEDIA_CACHE.max_item_bytes:
+        data = core.MEDIA_CACHE.get(path)
+        if data is None:
+            with request_metrics.phase('file'):
+                data = await read_file(path)
+            core.MEDIA_CACHE.put(path, data)
+
+    if byte_range:
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{length}'
+        if data is not None:
+            return Response(data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+        headers['Content-Length'] = str(end - start + 1)
+        return StreamingResponse(file_chunks(path, start, end), status_code=206,
+                                 media_type=media_type, headers=headers)
+    if data is not None:
+        return Response(data, media_type=media_type, headers=headers)
+    headers['Content-Length'] = str(length)
+    return StreamingResponse(file_chunks(path, 0, length - 1), media_type=media_type, headers=headers)
+
+
+def archived_media_response(request, store, data, etag):
+    """An archived blob from its mapped segment, with the same validators and Range handling"""
+    headers = {
+        'ETag': f'"{etag}"',
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': f'public, max-age={core.IMMUTABLE_MAX_AGE}, immutable',
+    }
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    media_type = mimetypes.guess_type(f'{etag}{store.extension}')[0] or 'application/octet-stream'
+    length = len(data)
+    byte_range = None
+    if_range = request.headers.get('if-range')
+    if not if_range or if_range.strip('"') == etag:
+        byte_range = parse_range(request.headers.get('range'), length)
+    if byte_range == 'invalid':
+        return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{length}'})
+    if byte_range:
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{length}'
+        return Response(bytes(data[start:end + 1]), status_code=206, media_type=media_type, headers=headers)
+    return Response(bytes(data), media_type=media_type, headers=headers)
+
+
+@app.get('/api/memory/image/{filename:path}')
+async def get_image(filename: str, request: Request):
+    """Serve memory images, or a thumbnail with ?size=128|512"""
+    size = core.parse_int(request.query_params.get('size'))
+    if size is not None and size not in thumbnails.THUMBNAIL_SIZES:
+        return error(f'size must be one of {list(thumbnails.THUMBNAIL_SIZES)}', 400)
+    try:
+        return await serve_media(request, core.media_dir('image'), core.store_for('image'), filename, size)
+    except Exception as e:
+        return error(f'Image not found: {str(e)}', 404)
+
+
+@app.get('/api/memory/audio/{filename}')
+async def serve_audio(filename: str, request: Request):
+    """Serve audio file, with Range support for seeking"""
+    try:
+        return await serve_media(request, core.media_dir('audio'), core.store_for('audio'), filename)
+    except Exception as e:
+        return error(f'Audio not found: {str(e)}', 404)
+
+
+@app.delete('/api/memory/delete/{memory_id}')
+async def delete_memory(memory_id: int):
+    """Delete a memory by ID"""
+    return reply(await run_db(core.handle_delete_memory, memory_id))
+
+
+@app.get('/api/memory/{memory_id:int}')
+async def get_memory(memory_id: int):
+    """One memory by id, hot or archived"""
+    return reply(await run_db(core.handle_get_memory, memory_id))
+
+
+@app.post('/api/memory/archive')
+async def archive_memories(request: Request):
+    """Move old memories into compressed archive segments"""
+    return await run_json(core.handle_archive_memories, request)
+
+
+@app.post('/api/memory/recognize')
+async def recognize_memory(request: Request):
+    """Find matching memory based on description (mode: 'words' or 'embedding')"""
+    return await run_json(core.handle_recognize_memory, request)
+
+
+@app.post('/api/voice/save')
+async def save_voice_profile(request: Request):
+    """Save voice profile with speech patterns"""
+    return await run_json(core.handle_save_voice, request)
+
+
+@app.post('/api/voice/recognize')
+async def recognize_voice(request: Request):
+    """Recognize speaker from speech sample"""
+    return await run_json(core.handle_recognize_voice, request)
+
+
+@app.post('/api/chat/append')
+async def chat_append(request: Request):
+    """Append one turn (or a list of turns) to a chat session"""
+    return await run_json(core.handle_chat_append, request)
+
+
+@app.get('/api/chat/history')
+async def chat_history(request: Request):
+    """Read a session's turns, newest page first, with limit/cursor"""
+    params = request.query_params
+    return reply(await run_db(core.handle_chat_history, params.get('session_id'),
+                              core.parse_int(params.get('limit')), params.get('cursor')))
+
+
+@app.post('/api/chat/recall')
+async def chat_recall(request: Request):
+    """Recall the last N turns plus relevant older turns for a query"""
+    return await run_json(core.handle_chat_recall, request)
+
+
+@app.post('/api/chat/compact')
+async def chat_compact(request: Request):
+    """Summarise and drop old chat partitions"""
+    return await run_json(core.handle_chat_compact, request)
+
+
+@app.get('/api/chat/sessions')
+async def chat_sessions(request: Request):
+    """List chat sessions, most recently active first"""
+    return reply(await run_db(core.handle_chat_sessions, core.parse_int(request.query_params.get('limit'))))
+
+
+@app.post('/ask-book')
+async def ask_book(request: Request):
+    """Answer a question from the ingested books with the top-k passages"""
+    data = parse_json(await request.body()) or {}
+    question = str(data.get('question', '')).strip()
+    if not question:
+        return error('Question is required', 400)
+    try:
+        k = max(1, min(int(data.get('k', rag_engine.DEFAULT_TOP_K)), 50))
+    except (TypeError, ValueError):
+        return error('k must be an integer', 400)
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(DB_EXECUTOR, lambda: get_rag().answer(question, k))
+    return JSONResponse(dict(result, success=True))
+
+
+@app.post('/analyze-report')
+async def analyze_report(request: Request):
+    """Flag lab values in one report ({"sex", "age", "values"}) or a batch ({"reports": [...]})"""
+    data = parse_json(await request.body())
+    if not isinstance(data, dict):
+        return error('A report object is required', 400)
+    reports = data.get('reports')
+    if reports is not None and not isinstance(reports, list):
+        return error('reports must be a list', 400)
+    if reports is not None and len(reports) > MAX_REPORTS_PER_REQUEST:
+        return error(f'At most {MAX_REPORTS_PER_REQUEST} reports per request', 400)
+    loop = asyncio.get_running_loop()
+    try:
+        # One vectorised pass over every value in the batch, off the event loop
+        results = await loop.run_in_executor(DB_EXECUTOR, medical_engine.check_reports,
+                                             [data] if reports is None else reports)
+    except ValueError as e:
+        return error(str(e), 400)
+    if reports is None:
+        return JSONResponse(dict(results[0], success=True))
+    return JSONResponse({'success': True, 'reports': results})
+
+
+@app.post('/vision-analyze')
+async def vision_analyze(request: Request):
+    """
+    Extract text from an uploaded image or PDF (raw body, or multipart field
+    'file'), streamed as NDJSON: a document record, each page as it finishes, an end record
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        engine = await loop.run_in_executor(DB_EXECUTOR, get_vision)
+    except RuntimeError as e:
+        return error(str(e), 503)
+    staged = records = None
+    handed_off = False
+    try:
+        if request.headers.get('content-type', '').startswith('multipart/form-data'):
+            upload = (await request.form()).get('file')
+            if upload is None or isinstance(upload, str):
+                return error('A file is required', 400)
+            staged = await stage_chunks(engine, upload_chunks(upload))
+        else:
+            staged = await stage_chunks(engine, request.stream())
+        if not staged.size:
+            return error('A file is required', 400)
+        records = engine.extract(staged.tmp_path, staged.sha256)
+        # The first record is read before answering, so an unreadable upload is a 400, not a broken stream
+        first = await loop.run_in_executor(DB_EXECUTOR, next, records)
+        response = StreamingResponse(stream_records(first, records, staged), media_type='application/x-ndjson')
+        handed_off = True
+        return response
+    except UploadTooLarge as e:
+        return error(str(e), 413)
+    except ValueError as e:
+        return error(str(e), 400)
+    finally:
+        # Anything short of a started stream (bad input, a pool or disk failure) leaves nothing behind
+        if not handed_off:
+            if records is not None:
+                try:
+                    records.close()
+                except ValueError:
+                    pass  # still running on the executor (the client went away mid-read)
+            if staged:
+                staged.discard()
+
+
+def stream_records(first, records, staged):
+    """NDJSON lines of an OCR run; Starlette iterates this in a worker thread"""
+    try:
+        yield core.dump_json(first) + b'\n'
+        for record in records:
+            yield core.dump_json(record) + b'\n'
+    finally:
+        records.close()
+        staged.discard()
+
+
+@app.post('/lip-sync')
+async def lip_sync(request: Request):
+    """
+    Phoneme and viseme timelines as NDJSON, one record per sentence. A JSON
+    body carries {"text": ...} and is answered sentence by sentence as each
+    timeline is built; a text/plain body may be streamed, and its sentences are
+    built while the rest is still uploading.
+    """
+    engine = await asyncio.get_running_loop().run_in_executor(DB_EXECUTOR, get_voice)
+    if request.headers.get('content-type', '').startswith('application/json'):
+        data = parse_json(await request.body()) or {}
+        text = str(data.get('text') or '').strip()
+        if not text:
+            return error('Text is required', 400)
+        return StreamingResponse(ndjson(engine.stream(text)), media_type='application/x-ndjson')
+    # The http middlewares hold the request body until the response starts, so
+    # the upload is consumed here rather than from inside the streamed response
+    records = await feed_timelines(engine, request)
+    return StreamingResponse(ndjson(records), media_type='application/x-ndjson')
+
+
+def ndjson(records):
+    """NDJSON lines of a record generator; Starlette iterates this in a worker thread"""
+    for record in records:
+        yield core.dump_json(record) + b'\n'
+
+
+async def feed_timelines(engine, request):
+    """Feed the request body to a TimelineStream as it arrives, building each completed sentence"""
+    loop = asyncio.get_running_loop()
+    stream = engine.open_stream()
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    records = []
+    async for chunk in request.stream():
+        records += await loop.run_in_executor(DB_EXECUTOR, stream.feed, decoder.decode(chunk))
+    stream.feed(decoder.decode(b'', final=True))
+    records += await loop.run_in_executor(DB_EXECUTOR, stream.finish)
+    return records
+
+
+def service_stats():
+    """core.health_payload plus the engines this process has started"""
+    payload = core.health_payload()
+    if _vision is not None:
+        payload['ocr'] = _vision.stats()
+    if _voice is not None:
+        payload['lip_sync'] = _voice.stats()
+    return payload
+
+
+@app.get('/health')
+async def health_check():
+    """Health check endpoint"""
+    payload = await asyncio.get_running_loop().run_in_executor(DB_EXECUTOR, service_stats)
+    return JSONResponse(dict(payload, server='asgi'))
+
+
+@app.get('/metrics')
+async def metrics():
+    """Prometheus metrics for this worker process (each uvicorn worker keeps its own)"""
+    stats = await asyncio.get_running_loop().run_in_executor(DB_EXECUTOR, service_stats)
+    return Response(request_metrics.render(stats), media_type=request_metrics.CONTENT_TYPE)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Dr. Chinki Memory Server (ASGI)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes, each with its own connection pool')
+    args = parser.parse_args()
+
+    print("🧠 Dr. Chinki Memory Server (ASGI) Starting...")
+    print("=" * 50)
+    # Create/migrate the schema once before the workers start
+    core.init_db()
+    print(f"📁 Image directory: {os.path.abspath(core.IMAGE_DIR)}")
+    print(f"💾 Database: {os.path.abspath(core.DB_PATH)}")
+    print(f"⚙️ Workers: {args.workers}")
+    print("=" * 50)
+    uvicorn.run('backend.main:app', host=args.host, port=args.port,
+                workers=args.workers, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
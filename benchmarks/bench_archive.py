@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Hot/cold tiering benchmark
+Two years of synthetic memories (Hinglish text, recognition descriptions),
+then everything older than 90 days moved to the archive. Reports database
+size (file, pages in use, after VACUUM) and list, search and recognize
+latency before and after, plus the opt-in archived reads: a list page with
+include_archived and single archived memories (cold and warm block cache).
+
+Usage: python3 benchmarks/bench_archive.py [memories] [keep_days]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ('kal doctor ke paas gaye the heart ka checkup hua blood pressure normal hai '
+         'Boss Jaan ne kaha anatomy padhni hai neet exam ki tayari kidney liver lungs '
+         'brain neuron dil dimag dawai subah shaam khana chai market dost family '
+         'bhai behen mummy papa college hostel library notes chapter revision').split()
+WORDS += [f'shabd{i}' for i in range(3000)]
+FEATURES = ('glasses', 'beard', 'tall', 'short', 'curly', 'hair', 'red', 'blue', 'kurta', 'saree',
+            'smile', 'mole', 'cap', 'watch', 'earrings', 'shirt', 'jacket', 'bindi')
+REQUESTS = 40
+DAYS = 730
+
+
+def populate(ms, count, rng):
+    """Insert through insert_memory so FTS, recognition postings and vectors are all built"""
+    now = datetime.now(timezone.utc)
+    with ms.get_pool().connection() as conn:
+        cursor = conn.cursor()
+        for i in range(count):
+            timestamp = now - timedelta(days=DAYS * (count - i) / count, seconds=rng.randint(0, 3600))
+            ms.insert_memory(cursor, {
+                'text': ' '.join(rng.choices(WORDS, k=60)),
+                'name': f'Dost {i} {rng.choice(WORDS)}',
+                'metadata': {'source': 'bench', 'mood': rng.choice(('khush', 'udaas', 'thaka'))},
+                'recognition_data': {'type': 'person', 'description': ' '.join(rng.sample(FEATURES, 6)),
+                                     'features': rng.sample(FEATURES, 3)},
+                'voice_data': None,
+                'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            })
+            if i % 2000 == 1999:
+                conn.commit()
+        conn.commit()
+
+
+def sizes(ms):
+    import memory_archive
+    with ms.get_pool().connection() as conn:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return memory_archive.database_size(conn)
+
+
+def mean_ms(fn, rounds=REQUESTS):
+    fn(0)
+    times = []
+    for n in range(rounds):
+        start = time.perf_counter()
+        fn(n)
+        times.append(time.perf_counter() - start)
+    return statistics.mean(times) * 1000
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def measure(client, rng, label):
+    queries = [' '.join(rng.sample(WORDS[:60], 2)) for _ in range(REQUESTS + 1)]
+    descriptions = [' '.join(rng.sample(FEATURES, 5)) for _ in range(REQUESTS + 1)]
+    deep = client.get('/api/memory/list', query_string={'limit': 50})
+    for _ in range(20):
+        cursor = deep.get_json()['next_cursor']
+        if not cursor:
+            break
+        deep = client.get('/api/memory/list', query_string={'limit': 50, 'cursor': cursor})
+    results = {
+        'list first page': mean_ms(lambda n: client.get('/api/memory/list', query_string={'limit': 50})),
+        'list page 20': mean_ms(lambda n: client.get('/api/memory/list',
+                                                     query_string={'limit': 50, 'cursor': cursor})),
+        'search': mean_ms(lambda n: client.get('/api/memory/search', query_string={'query': queries[n]})),
+        'recognize': mean_ms(lambda n: client.post('/api/memory/recognize',
+                                                   json={'description': descriptions[n]})),
+    }
+    print(f"  {label}: " + '   '.join(f"{name} {value:7.2f} ms" for name, value in results.items()))
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    keep_days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+    workdir = tempfile.mkdtemp(prefix='bench_archive_')
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.RESPONSE_CACHE.max_entries = 0  # time the queries, not the cache
+    ms.init_db()
+    rng = random.Random(11)
+
+    start = time.perf_counter()
+    populate(ms, count, rng)
+    print(f"🧊 {count} memories over {DAYS} days ({time.perf_counter() - start:.1f}s to build), "
+          f"archiving everything older than {keep_days} days")
+    client = ms.app.test_client()
+
+    before_size = sizes(ms)
+    before = measure(client, random.Random(1), 'before')
+
+    with ms.get_pool().connection() as conn:
+        start = time.perf_counter()
+        result = ms.archive_old_memories(conn, keep_days)
+        archive_seconds = time.perf_counter() - start
+    after_size = sizes(ms)
+    with ms.get_pool().connection() as conn:
+        conn.execute('VACUUM')
+    vacuumed = sizes(ms)
+    after = measure(client, random.Random(1), 'after ')
+
+    with ms.get_pool().connection() as conn:
+        archived_ids = [row[0] for row in conn.execute(
+            'SELECT id FROM archived_memories ORDER BY random() LIMIT ?', (REQUESTS + 1,))]
+    ms.get_archive().close()  # drop mapped segments and cached blocks: first reads are cold
+    cold = statistics.mean(
+        [timed(lambda: client.get(f'/api/memory/{memory_id}')) for memory_id in archived_ids]) * 1000
+    warm = mean_ms(lambda n: client.get(f'/api/memory/{archived_ids[n]}'))
+    mixed = mean_ms(lambda n: client.get('/api/memory/list',
+                                         query_string={'limit': 50, 'include_archived': '1'}))
+    stats = ms.get_archive().stats()
+
+    mb = 1024 * 1024
+    print(f"  archived {result['archived']} memories in {archive_seconds:.1f}s: {result['blocks']} blocks, "
+          f"{stats['segment_bytes'] / mb:.1f} MB of segments")
+    print(f"  database: {before_size['file_bytes'] / mb:.1f} MB → {after_size['file_bytes'] / mb:.1f} MB file "
+          f"({before_size['used_bytes'] / mb:.1f} → {after_size['used_bytes'] / mb:.1f} MB in use), "
+          f"{vacuumed['file_bytes'] / mb:.1f} MB after VACUUM")
+    print(f"  archived reads: get {cold:.2f} ms cold, {warm:.2f} ms warm; "
+          f"list page with include_archived {mixed:.2f} ms")
+    print("Hot tier after archiving: " + ', '.join(f"{name} {before[name] / after[name]:.1f}x"
+                                                  for name in before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Gallery load benchmark
+Fetches every image in a MemoriesPanel-sized gallery repeatedly and reports the
+mean time per gallery load with the media LRU disabled, enabled, and with the
+browser revalidating via If-None-Match (304s).
+
+Usage: python3 benchmarks/bench_gallery.py [images] [loads]
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMAGE_BYTES = 48 * 1024
+
+
+def gallery_load(client, names, etags=None):
+    for name in names:
+        headers = {'If-None-Match': etags[name]} if etags else {}
+        response = client.get(f'/api/memory/image/{name}', headers=headers)
+        assert response.status_code in (200, 304)
+        response.close()
+
+
+def timed(client, names, loads, etags=None):
+    start = time.perf_counter()
+    for _ in range(loads):
+        gallery_load(client, names, etags)
+    return (time.perf_counter() - start) * 1000 / loads
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    loads = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    workdir = tempfile.mkdtemp(prefix='bench_gallery_')
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.app.root_path = workdir
+    ms.init_db()
+    client = ms.app.test_client()
+
+    for i in range(count):
+        image = io.BytesIO(b'\xff\xd8' + os.urandom(IMAGE_BYTES))
+        client.post('/api/memory/upload', data={'name': f'Photo {i}', 'image': (image, 'photo.jpg')},
+                    content_type='multipart/form-data')
+    memories = client.get('/api/memory/list?fields=image_path').get_json()['memories']
+    names = [m['image_path'].split('/')[-1] for m in memories]
+    etags = {name: client.get(f'/api/memory/image/{name}').headers['ETag'] for name in names}
+
+    print(f"🖼️ Gallery of {count} images x {IMAGE_BYTES // 1024} KB, mean of {loads} loads")
+    cache_bytes = ms.MEDIA_CACHE.max_bytes
+    ms.MEDIA_CACHE.max_bytes = 0
+    print(f"  LRU disabled:       {timed(client, names, loads):8.2f} ms")
+    ms.MEDIA_CACHE.max_bytes = cache_bytes
+    gallery_load(client, names)
+    print(f"  LRU enabled:        {timed(client, names, loads):8.2f} ms")
+    print(f"  Revalidated (304):  {timed(client, names, loads, etags):8.2f} ms")
+    print(f"  Cache stats: {ms.MEDIA_CACHE.stats()}")
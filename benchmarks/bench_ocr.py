@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+OCR pipeline benchmark
+Multi-page TIFF "notes" run through the vision engine with a stand-in OCR
+backend that burns a fixed amount of CPU per page (real tesseract is ~0.3-1s
+per page). Measures pages/s and time to the first streamed page for one
+worker against the pool, then a repeat upload of the same files (whole-upload
+cache) and re-encoded copies with the same pixels (per-page cache).
+
+Usage: python3 benchmarks/bench_ocr.py [documents] [pages_per_document] [ocr_ms] [workers]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+OCR_SECONDS = float(os.environ.get('BENCH_OCR_MS', '40')) / 1000
+
+
+def fake_ocr(image):
+    """Stand-in backend: fixed CPU time per page, text derived from the pixels"""
+    deadline = time.process_time() + OCR_SECONDS
+    while time.process_time() < deadline:
+        pass
+    return f'page text {hash(image.tobytes()[:4096]) & 0xffffffff:08x}'
+
+
+def write_documents(directory, count, pages, compression):
+    paths = []
+    for n in range(count):
+        frames = []
+        for page in range(pages):
+            image = Image.new('L', (850, 1100), 255)
+            draw = ImageDraw.Draw(image)
+            for line in range(40):
+                draw.text((60, 40 + line * 25), f'Note {n} page {page} line {line}: cardiac output = HR x SV',
+                          fill=0)
+            frames.append(image)
+        path = os.path.join(directory, f'note{n}.tiff')
+        frames[0].save(path, save_all=True, append_images=frames[1:], compression=compression)
+        paths.append(path)
+    return paths
+
+
+def run(engine, paths, label):
+    start = time.perf_counter()
+    first_pages, latencies, pages = [], [], 0
+    for path in paths:
+        upload_start = time.perf_counter()
+        first = None
+        for record in engine.extract(path):
+            if record['kind'] == 'page':
+                pages += 1
+                latencies.append(record['seconds'])
+                if first is None:
+                    first = time.perf_counter() - upload_start
+        first_pages.append(first)
+    elapsed = time.perf_counter() - start
+    stats = engine.stats()
+    print(f"{label:<32} {pages / elapsed:8.1f} pages/s   first page {statistics.median(first_pages) * 1000:7.1f} ms"
+          f"   page p50 {statistics.median(latencies) * 1000:6.1f} ms"
+          f"   hit rate doc {stats['document_hit_rate']:.2f} page {stats['page_hit_rate']:.2f}")
+    return elapsed
+
+
+def main():
+    global OCR_SECONDS
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    if len(sys.argv) > 3:
+        os.environ['BENCH_OCR_MS'] = sys.argv[3]  # read again by the worker processes
+        OCR_SECONDS = float(sys.argv[3]) / 1000
+    from backend.engines import vision_engine
+
+    workdir = tempfile.mkdtemp(prefix='ocr_bench_')
+    originals = write_documents(workdir, documents, pages, 'tiff_lzw')
+    copies_dir = os.path.join(workdir, 'copies')
+    os.makedirs(copies_dir)
+    copies = write_documents(copies_dir, documents, pages, 'raw')
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    print(f"🔎 {documents} documents x {pages} pages, {OCR_SECONDS * 1000:.0f} ms CPU per page, "
+          f"{os.cpu_count()} CPUs, pool of {workers}")
+
+    spec = 'bench_ocr:fake_ocr'
+    single = vision_engine.VisionEngine(os.path.join(workdir, 'single'), spec, workers=1)
+    serial = run(single, originals, 'cold, 1 worker')
+    single.close()
+
+    engine = vision_engine.VisionEngine(os.path.join(workdir, 'pool'), spec, workers=workers)
+    pooled = run(engine, originals, f'cold, {workers} workers')
+    repeat = run(engine, originals, 'repeat upload (same bytes)')
+    reencoded = run(engine, copies, 're-encoded (same pixels)')
+    engine.close()
+    print(f"Pool: {serial / pooled:.1f}x cold throughput; repeat uploads {serial / repeat:.0f}x, "
+          f"re-encoded copies {serial / reencoded:.1f}x faster than a cold single-worker run")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+RAG engine benchmark
+Ingests a synthetic book (one topic sentence per page buried in filler),
+then measures ingest pages/s, re-ingest of the unchanged book, re-ingest
+with 1% of pages edited, /ask-book query latency and how often the top
+passage comes from the page a question was written for.
+
+Usage: python3 benchmarks/bench_rag.py [pages]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+STOPWORDS = 'the of and a to in is was with for as by on that which are from'.split()
+QUERIES = 200
+
+
+def term(page_no, role):
+    """Made-up medical term unique to a page, like a real book's index entries"""
+    rng = random.Random(page_no * 3 + role)
+    return ''.join(rng.choice(LETTERS) for _ in range(10))
+
+
+def topic(page_no):
+    return f'the {term(page_no, 0)} gland secretes {term(page_no, 1)} which regulates {term(page_no, 2)}'
+
+
+# Body text: stopwords plus a Zipf-ish spread over 3000 made-up content words
+_rng = random.Random(0)
+VOCABULARY = [''.join(_rng.choice(LETTERS) for _ in range(7)) for _ in range(3000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def page_text(rng, page_no, revision=0):
+    words = [rng.choice(STOPWORDS) if rng.random() < 0.4 else rng.choices(VOCABULARY, WEIGHTS)[0]
+             for _ in range(350)]
+    sentences = [' '.join(words[i:i + 14]) + '.' for i in range(0, len(words), 14)]
+    sentences.insert(rng.randrange(len(sentences)), f'{topic(page_no)} (rev {revision}).')
+    return ' '.join(sentences)
+
+
+def write_book(path, pages, edited=(), seed=7):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for page_no in range(1, pages + 1):
+            text = page_text(rng, page_no)
+            if page_no in edited:
+                text = page_text(random.Random(page_no), page_no, revision=1)
+            f.write(text + '\n\f')
+
+
+def timed_ingest(engine, path, label, pages):
+    start = time.perf_counter()
+    stats = engine.ingest(path)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:7.2f} s  {pages / elapsed:9.0f} pages/s  "
+          f"({stats['skipped']} unchanged, {stats['chunks']} new chunks)")
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workdir = tempfile.mkdtemp(prefix='rag_bench_')
+    from backend.engines import rag_engine
+
+    book = os.path.join(workdir, 'physiology.txt')
+    write_book(book, pages)
+    engine = rag_engine.RagEngine(os.path.join(workdir, 'library'))
+
+    print(f"📚 Synthetic book: {pages} pages")
+    timed_ingest(engine, book, 'Fresh ingest', pages)
+    timed_ingest(engine, book, 'Re-ingest, unchanged', pages)
+    edited = set(random.Random(1).sample(range(1, pages + 1), max(1, pages // 100)))
+    write_book(book, pages, edited)
+    timed_ingest(engine, book, f'Re-ingest, {len(edited)} pages edited', pages)
+
+    rng = random.Random(3)
+    latencies, hits = [], 0
+    for _ in range(QUERIES):
+        page_no = rng.randint(1, pages)
+        question = f'what does {term(page_no, 1)} from the {term(page_no, 0)} gland regulate?'
+        start = time.perf_counter()
+        result = engine.answer(question, k=5)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if result['passages'] and result['passages'][0]['page'] == page_no:
+            hits += 1
+    latencies.sort()
+    print(f"Query latency p50 {statistics.median(latencies):.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms over {QUERIES} questions")
+    print(f"Top passage from the right page: {hits / QUERIES:.0%}")
+    print(f"Library: {engine.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Recognition mode benchmark
+Compares 'words' (shared-word overlap) and 'embedding' recognition on recall@1,
+recall@3 and latency, using paraphrased queries: inflections, typos, dropped
+and extra words, as LiveTutor descriptions of the same person tend to differ.
+
+Usage: python3 benchmarks/bench_recognition_modes.py [memories] [queries]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# word -> paraphrase variants the query generator may swap in
+VARIANTS = {
+    'glasses': ['glass', 'eyeglasses'], 'smiling': ['smile', 'smiles'], 'curly': ['curls', 'curled'],
+    'bearded': ['beard'], 'wearing': ['wears', 'wore'], 'shirt': ['shirts', 'tshirt'],
+    'earrings': ['earring'], 'spectacles': ['specs'], 'tall': ['taller'], 'moustache': ['mustache'],
+    'holding': ['holds', 'held'], 'jacket': ['jackets'], 'dupatta': ['duppata'], 'kurta': ['kurtaa'],
+}
+BASE = ('man woman boy girl uncle aunty young old short black brown grey white red blue green '
+        'yellow saree long straight hair round oval face sharp nose big small eyes mole scar '
+        'left right cheek forehead watch ring bag phone bottle book laptop cap bindi').split()
+WORDS = BASE + list(VARIANTS)
+FILLER = 'a the with and has is wala wali jo hai'.split()
+
+
+def describe(rng):
+    return ' '.join(rng.sample(WORDS, rng.randint(7, 11)))
+
+
+def paraphrase(rng, description):
+    words = description.split()
+    rng.shuffle(words)
+    words = words[:max(3, int(len(words) * 0.6))]
+    out = []
+    for word in words:
+        if word in VARIANTS and rng.random() < 0.8:
+            word = rng.choice(VARIANTS[word])
+        elif len(word) > 4 and rng.random() < 0.15:
+            i = rng.randrange(1, len(word) - 1)
+            word = word[:i] + word[i + 1:]  # typo: dropped letter
+        out.append(word)
+    out += rng.sample(FILLER, 2)
+    return ' '.join(out)
+
+
+def evaluate(client, queries, mode):
+    hits1 = hits3 = 0
+    start = time.perf_counter()
+    for query, expected in queries:
+        result = client.post('/api/memory/recognize', json={'description': query, 'mode': mode}).get_json()
+        ids = [m['id'] for m in result.get('all_matches', [])]
+        hits1 += ids[:1] == [expected]
+        hits3 += expected in ids
+    latency = (time.perf_counter() - start) * 1000 / len(queries)
+    return hits1 / len(queries), hits3 / len(queries), latency
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    workdir = tempfile.mkdtemp(prefix='bench_modes_')
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.init_db()
+
+    rng = random.Random(7)
+    descriptions = {}
+    with ms.get_pool().connection() as conn, ms.deferred_vectors() as append_committed_vectors:
+        cursor = conn.cursor()
+        for i in range(size):
+            recognition_data = {'type': 'person', 'description': describe(rng)}
+            cursor.execute('INSERT INTO memories (type, name, metadata, recognition_data) VALUES (?, ?, ?, ?)',
+                           ('image', f'Person {i}', '{}', json.dumps(recognition_data)))
+            ms.index_recognition(cursor, cursor.lastrowid, recognition_data)
+            descriptions[cursor.lastrowid] = recognition_data['description']
+        conn.commit()
+        append_committed_vectors()
+
+    client = ms.app.test_client()
+    targets = rng.sample(sorted(descriptions), count)
+    queries = [(paraphrase(rng, descriptions[t]), t) for t in targets]
+
+    print(f"🧠 Recognition on {size} memories, {count} paraphrased queries")
+    print(f"{'mode':>10} | {'recall@1':>8} | {'recall@3':>8} | latency")
+    for mode in ('words', 'embedding'):
+        r1, r3, latency = evaluate(client, queries, mode)
+        print(f"{mode:>10} | {r1:8.1%} | {r3:8.1%} | {latency:6.2f} ms")
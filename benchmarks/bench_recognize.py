@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Recognize latency benchmark
+Compares the inverted-index /api/memory/recognize against the old full-table scan
+at 1k, 10k and 100k memories.
+
+Usage: python3 benchmarks/bench_recognize.py [sizes...]
+"""
+
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ('tall short young old man woman boy girl glasses beard long hair curly '
+         'straight black brown white red blue green shirt kurta saree jacket cap '
+         'smiling serious round face sharp nose big eyes small mole left right cheek '
+         'wears watch ring earrings bag phone bottle book laptop table chair').split()
+# Names, places and details make real descriptions far more varied than the base words
+WORDS += [f'{prefix}{i}' for prefix in ('naam', 'jagah', 'detail') for i in range(300)]
+QUERIES = 50
+
+
+def random_description(rng):
+    return ' '.join(rng.sample(WORDS, rng.randint(6, 14)))
+
+
+def query_description(rng, descriptions):
+    """A query that paraphrases a stored description, like LiveTutor re-seeing someone"""
+    words = rng.choice(descriptions).split()
+    return ' '.join(rng.sample(words, len(words) // 2) + rng.sample(WORDS, 3))
+
+
+def populate(ms, count, rng):
+    """Insert synthetic recognised people straight into the database"""
+    conn = sqlite3.connect(ms.DB_PATH)
+    cursor = conn.cursor()
+    descriptions = []
+    for i in range(count):
+        recognition_data = {'type': 'person', 'description': random_description(rng)}
+        descriptions.append(recognition_data['description'])
+        cursor.execute('''
+            INSERT INTO memories (type, content, name, metadata, recognition_data)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ('image', '', f'Person {i}', '{}', json.dumps(recognition_data)))
+        ms.index_recognition(cursor, cursor.lastrowid, recognition_data)
+    conn.commit()
+    conn.close()
+    return descriptions
+
+
+def legacy_scan(db_path, description):
+    """The pre-index implementation: decode every row and overlap in Python"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute('''
+        SELECT id, name, recognition_data FROM memories
+        WHERE recognition_data IS NOT NULL
+        ORDER BY timestamp DESC
+    ''').fetchall()
+    conn.close()
+    description_words = set(description.lower().split())
+    matches = []
+    for row in rows:
+        stored_words = set(json.loads(row['recognition_data']).get('description', '').lower().split())
+        common_words = description_words.intersection(stored_words)
+        if len(common_words) >= 2:
+            matches.append((len(common_words) / max(len(description_words), len(stored_words)), row['id']))
+    matches.sort(key=lambda x: x[0], reverse=True)
+    return matches[:3]
+
+
+def run(size):
+    workdir = tempfile.mkdtemp(prefix='bench_recognize_')
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.init_db()
+
+    rng = random.Random(size)
+    descriptions = populate(ms, size, rng)
+    client = ms.app.test_client()
+    queries = [query_description(rng, descriptions) for _ in range(QUERIES)]
+
+    start = time.perf_counter()
+    legacy = [legacy_scan(ms.DB_PATH, q) for q in queries]
+    legacy_ms = (time.perf_counter() - start) * 1000 / QUERIES
+
+    start = time.perf_counter()
+    results = [client.post('/api/memory/recognize', json={'description': q}).get_json() for q in queries]
+    indexed_ms = (time.perf_counter() - start) * 1000 / QUERIES
+
+    # Sanity check: both paths agree on the top-3 similarity scores
+    for old, new in zip(legacy, results):
+        new_scores = [m['similarity'] for m in new.get('all_matches', [])]
+        assert [round(score, 9) for score, _ in old] == [round(score, 9) for score in new_scores]
+
+    print(f"{size:>8} memories | scan {legacy_ms:9.2f} ms | index {indexed_ms:9.2f} ms | "
+          f"speedup {legacy_ms / indexed_ms:6.1f}x")
+
+
+if __name__ == '__main__':
+    sizes = [int(s) for s in sys.argv[1:]] or [1000, 10000, 100000]
+    print("🧠 Recognize latency (mean per query)")
+    for size in sizes:
+        run(size)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Response cache benchmark
+Simulates frontend polling of list, search and profile reads against 10k
+memories, with and without the response cache, with a save every
+WRITE_EVERY reads to exercise invalidation, and reports per-read latency,
+hit rate and how many polls turned into 304s.
+
+Usage: python3 benchmarks/bench_response_cache.py [memories] [reads]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WRITE_EVERY = 50
+POLLS = (
+    '/api/memory/list',
+    '/api/memory/list?limit=50&fields=id,name,timestamp,image_path',
+    '/api/memory/search?query=glasses',
+    '/api/user/profile',
+)
+
+
+def populate(ms, count):
+    rng = random.Random(0)
+    words = 'tall short man woman glasses beard red cap kurta saree smiling'.split()
+    with ms.get_pool().connection() as conn:
+        cursor = conn.cursor()
+        for n in range(count):
+            ms.insert_memory(cursor, {'text': ' '.join(rng.sample(words, 5)), 'name': f'Memory {n}',
+                                      'metadata': {'n': n}, 'voice_data': None,
+                                      'recognition_data': {'description': ' '.join(rng.sample(words, 6))}})
+        conn.commit()
+
+
+def run(ms, client, reads, cached):
+    ms.RESPONSE_CACHE.max_entries = ms.RESPONSE_CACHE_ENTRIES if cached else 0
+    ms.RESPONSE_CACHE.clear()
+    ms.RESPONSE_CACHE.hits = ms.RESPONSE_CACHE.misses = 0
+    etags = {}
+    not_modified = 0
+    start = time.perf_counter()
+    for i in range(reads):
+        if i and i % WRITE_EVERY == 0:
+            client.post('/api/memory/save', json={'text': f'poll write {i}', 'name': 'Poll'})
+        url = POLLS[i % len(POLLS)]
+        headers = {'If-None-Match': etags[url]} if url in etags else {}
+        response = client.get(url, headers=headers)
+        not_modified += response.status_code == 304
+        etags[url] = response.headers.get('ETag')
+    elapsed = (time.perf_counter() - start) * 1000 / reads
+    stats = ms.RESPONSE_CACHE.stats()
+    label = 'cached' if cached else 'uncached'
+    print(f"{label:>9} | {elapsed:7.2f} ms/read | hit rate {stats['hit_rate']:5.1%} | "
+          f"{not_modified / reads:5.1%} 304s")
+    return elapsed
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    reads = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    workdir = tempfile.mkdtemp(prefix='response_cache_')
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.init_db()
+    populate(ms, count)
+    client = ms.app.test_client()
+    client.post('/api/user/profile', json={'name': 'Boss', 'interests': ['anatomy']})
+    print(f"🧠 {reads} polling reads over {count} memories, one save every {WRITE_EVERY} reads")
+    uncached = run(ms, client, reads, cached=False)
+    cached = run(ms, client, reads, cached=True)
+    print(f"Speedup: {uncached / cached:.1f}x")
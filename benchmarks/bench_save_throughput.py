@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Memory save throughput benchmark
+Reports saves per second against a threaded memory_server for:
+sequential single saves, concurrent single saves with and without the
+group-commit writer, and /api/memory/save_batch.
+
+Usage: python3 benchmarks/bench_save_throughput.py [saves] [clients] [batch_size]
+"""
+
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server
+
+
+def memory(n):
+    return {
+        'text': f'Note {n}',
+        'name': f'Memory {n}',
+        'recognition_data': {'description': f'tall man glasses beard smiling {n}'},
+    }
+
+
+def post(base_url, path, payload):
+    req = urllib.request.Request(f'{base_url}{path}', data=json.dumps(payload).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read())
+
+
+def start_server(mode, group_commit):
+    workdir = tempfile.mkdtemp(prefix=f'save_{mode}_')
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.GROUP_COMMIT = group_commit
+    ms.init_db()
+    server = make_server('127.0.0.1', 0, ms.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def run(mode, saves, clients, batch_size):
+    server, base_url = start_server(mode, group_commit=(mode == 'group-commit'))
+    errors = []
+
+    def single(start, count):
+        for n in range(start, start + count):
+            try:
+                post(base_url, '/api/memory/save', memory(n))
+            except Exception as e:
+                errors.append(str(e))
+
+    started = time.perf_counter()
+    if mode == 'sequential':
+        single(0, saves)
+    elif mode == 'batch':
+        for start in range(0, saves, batch_size):
+            post(base_url, '/api/memory/save_batch',
+                 {'memories': [memory(n) for n in range(start, min(start + batch_size, saves))]})
+    else:
+        per_client = saves // clients
+        threads = [threading.Thread(target=single, args=(c * per_client, per_client)) for c in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        saves = per_client * clients
+    elapsed = time.perf_counter() - started
+
+    health = json.loads(urllib.request.urlopen(f'{base_url}/health').read())
+    server.shutdown()
+    extra = ''
+    if mode == 'group-commit':
+        extra = f" | avg group {health['group_commit']['avg_group_size']}"
+    print(f"{mode:>13} | {saves / elapsed:8.1f} saves/s | {len(errors)} errors{extra}")
+
+
+if __name__ == '__main__':
+    saves = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    print(f"🧠 {saves} memory saves ({clients} clients for concurrent runs, batches of {batch_size})")
+    for mode in ('sequential', 'concurrent', 'group-commit', 'batch'):
+        run(mode, saves, clients, batch_size)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Search latency benchmark
+Times /api/memory/search on a synthetic corpus with the LIKE scan and with FTS5.
+
+Usage: python3 benchmarks/bench_search.py [rows]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ('kal doctor ke paas gaye the heart ka checkup hua blood pressure normal hai '
+         'Boss Jaan ne kaha anatomy padhni hai neet exam ki tayari kidney liver lungs '
+         'brain neuron dil dimag dawai subah shaam khana chai market dost family '
+         'bhai behen mummy papa college hostel library notes chapter revision').split()
+WORDS += [f'shabd{i}' for i in range(2000)]
+QUERIES = 30
+
+
+def populate(ms, count, rng):
+    """Insert synthetic memories; the FTS triggers index them as they go in"""
+    rows = []
+    for i in range(count):
+        recognition_data = {'type': 'person', 'description': ' '.join(rng.sample(WORDS, 8))}
+        rows.append(('text', ' '.join(rng.choices(WORDS, k=30)), f'Memory {i} {rng.choice(WORDS)}',
+                     '{}', json.dumps(recognition_data)))
+    with ms.get_pool().connection() as conn:
+        conn.executemany('''
+            INSERT INTO memories (type, content, name, metadata, recognition_data)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+
+
+def time_queries(client, queries):
+    start = time.perf_counter()
+    for q in queries:
+        client.get('/api/memory/search', query_string={'query': q, 'limit': 50})
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    workdir = tempfile.mkdtemp(prefix='bench_search_')
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.init_db()
+
+    rng = random.Random(42)
+    populate(ms, size, rng)
+    client = ms.app.test_client()
+    queries = [' '.join(rng.sample(WORDS, rng.randint(1, 2))) for _ in range(QUERIES)]
+
+    print(f"🔎 Search latency on {size} memories (mean of {QUERIES} queries)")
+    ms.FTS_ENABLED = False
+    like_ms = time_queries(client, queries)
+    print(f"  LIKE scan: {like_ms:9.2f} ms")
+    ms.FTS_ENABLED = True
+    fts_ms = time_queries(client, queries)
+    print(f"  FTS5 bm25: {fts_ms:9.2f} ms")
+    print(f"  Speedup:   {like_ms / fts_ms:9.1f}x")
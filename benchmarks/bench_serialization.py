@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Row serialization benchmark
+Cost of turning 10k memory rows into a /api/memory/list body: the old
+decode-every-JSON-column + jsonify path against the passthrough serializer
+with the standard library encoder, with orjson, and streamed in batches.
+
+Usage: python3 benchmarks/bench_serialization.py [rows]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROUNDS = 5
+
+
+def fake_memory(rng, i):
+    return (
+        'person', f'Met at the clinic on visit {i}, talked about blood pressure and diet',
+        f'memory_images/{i:064x}.jpg', f'Person {i}',
+        json.dumps({'source': 'camera', 'tags': rng.sample(['family', 'doctor', 'friend', 'patient'], 2),
+                    'location': {'lat': rng.uniform(-90, 90), 'lng': rng.uniform(-180, 180)}}),
+        json.dumps({'description': 'tall man with glasses and a grey beard',
+                    'features': {'glasses': True, 'beard': 'grey', 'height_cm': rng.randint(150, 195)},
+                    'keywords': ['tall', 'glasses', 'beard', 'grey']}),
+        json.dumps({'speech_patterns': {'sample_text': 'haan bhai kya haal hai', 'word_count': 5,
+                                        'language_style': 'hinglish'}}) if i % 3 == 0 else None,
+    )
+
+
+def legacy_rows(rows, fields):
+    """The route code before the shared serializer: json.loads every JSON column"""
+    memories = []
+    for row in rows:
+        memory = {}
+        for field in fields:
+            value = row[field]
+            if field == 'metadata':
+                value = json.loads(value) if value else {}
+            elif field in ('recognition_data', 'voice_data'):
+                value = json.loads(value) if value else None
+            memory[field] = value
+        memories.append(memory)
+    return memories
+
+
+def timed(label, fn, count):
+    fn()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        size = fn()
+    per_round = (time.perf_counter() - start) / ROUNDS * 1000
+    print(f"{label:<36} {per_round:8.1f} ms / {count} rows   {size / 1024:8.0f} KB")
+    return per_round
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    os.chdir(tempfile.mkdtemp(prefix='serialize_bench_'))
+    import memory_server as ms
+    import row_serializer
+    ms.DB_PATH = os.path.join(os.getcwd(), 'memories.db')
+    ms.init_db()
+    rng = random.Random(1)
+    with ms.get_pool().connection() as conn:
+        conn.executemany('''
+            INSERT INTO memories (type, content, image_path, name, metadata, recognition_data, voice_data)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [fake_memory(rng, i) for i in range(count)])
+        conn.commit()
+        fields = list(ms.MEMORY_FIELDS)
+        rows = conn.execute(f'SELECT {", ".join(fields)} FROM memories ORDER BY timestamp DESC, id DESC').fetchall()
+
+        def legacy():
+            with ms.app.app_context():
+                payload = {'success': True, 'count': len(rows), 'memories': legacy_rows(rows, fields),
+                           'next_cursor': None}
+                return len(ms.jsonify(payload).get_data())
+
+        def passthrough():
+            payload = {'success': True, 'count': len(rows), 'memories': row_serializer.encode_rows(rows, fields),
+                       'next_cursor': None}
+            return len(row_serializer.encode(payload))
+
+        def streamed():
+            cursor = conn.execute(f'SELECT {", ".join(fields)} FROM memories ORDER BY timestamp DESC, id DESC')
+            return sum(len(chunk) for chunk in
+                       row_serializer.iter_envelope({'success': True}, 'memories', cursor, fields, {'next_cursor': None}))
+
+        print(f"📦 {count} memory rows (fetched once; streaming includes the fetch)")
+        baseline = timed('decode + jsonify (old)', legacy, count)
+        results = {}
+        if row_serializer.orjson is not None:
+            results['passthrough, orjson'] = timed('passthrough, orjson', passthrough, count)
+            results['streamed, orjson'] = timed('streamed, orjson (incl. fetch)', streamed, count)
+        # Same serializer on the standard library encoder, as when orjson is not installed
+        saved_dumps = row_serializer.dumps
+        row_serializer.dumps = lambda value, default=None: json.dumps(
+            value, ensure_ascii=False, separators=(',', ':'), default=default).encode('utf-8')
+        results['passthrough, stdlib json'] = timed('passthrough, stdlib json', passthrough, count)
+        row_serializer.dumps = saved_dumps
+        for label, ms_per_round in results.items():
+            print(f"  {label}: {baseline / ms_per_round:.1f}x faster than the old path")
+
+
+if __name__ == '__main__':
+    main()
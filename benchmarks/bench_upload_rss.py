@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Upload peak-memory benchmark
+Uploads a 50 MB audio file to a fresh memory_server process per scenario and
+reports how much the server's peak RSS (VmHWM) grew:
+
+  legacy  JSON/base64 body, decoded in one piece (the old save_memory path)
+  json    JSON/base64 body, decoded incrementally by write_base64()
+  stream  raw body PUT to /api/memory/<id>/audio, streamed to disk
+
+Usage: python3 benchmarks/bench_upload_rss.py [megabytes]
+"""
+
+import base64
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def serve(mode, port_file):
+    """Run memory_server in this process (used as the benchmark subprocess)"""
+    import logging
+    sys.path.insert(0, ROOT)
+    import memory_server as ms
+    from werkzeug.serving import make_server
+
+    if mode == 'legacy':
+        def stage_base64(store, encoded):
+            data = base64.b64decode(encoded.split(',')[1] if ',' in encoded else encoded)
+            return store._stage([data])
+        ms.MediaStore.stage_base64 = stage_base64
+
+    ms.DB_PATH = 'memories.db'
+    ms.init_db()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, ms.app, threaded=True)
+    with open(port_file, 'w') as f:
+        f.write(str(server.server_port))
+    server.serve_forever()
+
+
+def peak_rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+
+
+def request(port, method, path, body, headers):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    conn.request(method, path, body=body, headers=headers)
+    resp = conn.getresponse()
+    data = json.loads(resp.read())
+    conn.close()
+    return data
+
+
+def run(mode, audio_path, size):
+    workdir = tempfile.mkdtemp(prefix=f'bench_upload_{mode}_')
+    port_file = os.path.join(workdir, 'port')
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, port_file],
+                            cwd=workdir, stdout=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(port_file) or not open(port_file).read():
+            time.sleep(0.05)
+        port = int(open(port_file).read())
+        before = peak_rss_kb(proc.pid)
+
+        start = time.perf_counter()
+        if mode == 'stream':
+            saved = request(port, 'POST', '/api/memory/save', json.dumps({'name': 'Recording'}),
+                            {'Content-Type': 'application/json'})
+            with open(audio_path, 'rb') as f:
+                request(port, 'PUT', f"/api/memory/{saved['memory_id']}/audio", f,
+                        {'Content-Type': 'audio/webm', 'Content-Length': str(size)})
+        else:
+            with open(audio_path, 'rb') as f:
+                encoded = base64.b64encode(f.read()).decode()
+            body = json.dumps({'name': 'Recording', 'audio': 'data:audio/webm;base64,' + encoded})
+            del encoded
+            request(port, 'POST', '/api/memory/save', body, {'Content-Type': 'application/json'})
+        elapsed = time.perf_counter() - start
+
+        growth_mb = (peak_rss_kb(proc.pid) - before) / 1024
+        print(f"{mode:>7} | peak RSS +{growth_mb:7.1f} MB | {elapsed:6.2f} s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    size = megabytes * 1024 * 1024
+    audio_path = os.path.join(tempfile.mkdtemp(prefix='bench_upload_'), 'recording.webm')
+    with open(audio_path, 'wb') as f:
+        f.write(os.urandom(size))
+
+    print(f"🎙️ Peak server RSS while uploading a {megabytes} MB audio file")
+    for mode in ('legacy', 'json', 'stream'):
+        run(mode, audio_path, size)
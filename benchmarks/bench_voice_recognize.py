@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Voice recognize benchmark
+Compares /api/voice/recognize backed by the voice profile matrix against the
+old per-request JSON re-parse and word-set scan, at 100, 1k and 10k speakers,
+and reports how often each picks the right speaker.
+
+Usage: python3 benchmarks/bench_voice_recognize.py [sizes...]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COMMON = ('haan bhai kya haal hai nahi yaar acha theek main tum aap ka ki ko se '
+          'the a is to and you i it what okay so').split()
+# Every speaker also has their own pet phrases, names and topics
+RARE = [f'shabd{i}' for i in range(5000)]
+SAMPLES_PER_SPEAKER = 3
+QUERIES = 50
+
+
+def speaker_vocabulary(rng):
+    return rng.sample(RARE, 12)
+
+
+def utterance(rng, vocabulary):
+    return ' '.join(rng.sample(COMMON, 6) + rng.sample(vocabulary, 4))
+
+
+def legacy_recognize(cursor, speech_sample):
+    """The old route body: re-read and re-parse every voice_data row"""
+    cursor.execute('SELECT id, name, voice_data FROM memories WHERE voice_data IS NOT NULL')
+    sample_words = set(speech_sample.lower().split())
+    matches = []
+    for row in cursor.fetchall():
+        voice_data = json.loads(row['voice_data']) if row['voice_data'] else {}
+        stored_words = set(voice_data.get('speech_patterns', {}).get('sample_text', '').lower().split())
+        common_words = sample_words.intersection(stored_words)
+        if len(common_words) >= 2:
+            matches.append((len(common_words) / max(len(sample_words), len(stored_words)), row['name']))
+    matches.sort(key=lambda m: m[0], reverse=True)
+    return matches[0][1] if matches else None
+
+
+def run(size):
+    workdir = tempfile.mkdtemp(prefix=f'voice_{size}_')
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.init_db()
+    client = ms.app.test_client()
+    rng = random.Random(size)
+
+    vocabularies = [speaker_vocabulary(rng) for _ in range(size)]
+    with ms.get_pool().connection() as conn:
+        cursor = conn.cursor()
+        for n, vocabulary in enumerate(vocabularies):
+            for _ in range(SAMPLES_PER_SPEAKER):
+                text = utterance(rng, vocabulary)
+                profile = ms.voice_profiles.find_profile(cursor, f'Speaker {n}')
+                if profile:
+                    ms.voice_profiles.add_sample(cursor, f'Speaker {n}', text)
+                    # Old behaviour: every sample was its own memories row
+                    cursor.execute('INSERT INTO memories (type, content, name, voice_data) VALUES (?, ?, ?, ?)',
+                                   ('text', 'Voice profile', f'Speaker {n}',
+                                    json.dumps({'speech_patterns': {'sample_text': text}})))
+                else:
+                    ms.insert_memory(cursor, {'text': 'Voice profile', 'name': f'Speaker {n}', 'metadata': {},
+                                              'recognition_data': None,
+                                              'voice_data': {'speech_patterns': {'sample_text': text}}})
+        conn.commit()
+
+    targets = [rng.randrange(size) for _ in range(QUERIES)]
+    queries = [utterance(rng, vocabularies[t]) for t in targets]
+
+    # First call loads the matrix; it is then reused until a profile changes
+    client.post('/api/voice/recognize', json={'speech_sample': queries[0]})
+
+    with ms.get_pool().connection() as conn:
+        cursor = conn.cursor()
+        start = time.perf_counter()
+        legacy_hits = sum(legacy_recognize(cursor, q) == f'Speaker {t}' for q, t in zip(queries, targets))
+        legacy_ms = (time.perf_counter() - start) * 1000 / QUERIES
+
+    start = time.perf_counter()
+    hits = 0
+    for q, t in zip(queries, targets):
+        result = client.post('/api/voice/recognize', json={'speech_sample': q}).get_json()
+        hits += result.get('name') == f'Speaker {t}'
+    new_ms = (time.perf_counter() - start) * 1000 / QUERIES
+
+    print(f"{size:>6} speakers | scan {legacy_ms:8.2f} ms ({legacy_hits / QUERIES:4.0%}) | "
+          f"matrix {new_ms:6.2f} ms ({hits / QUERIES:4.0%}) | {legacy_ms / new_ms:5.1f}x")
+    ms._pool = None
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000]
+    print(f"🧠 Voice recognize: {QUERIES} queries, {SAMPLES_PER_SPEAKER} samples per speaker")
+    for size in sizes:
+        run(size)
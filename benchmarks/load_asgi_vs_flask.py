@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Flask vs ASGI load test
+Runs memory_server.py (threaded Werkzeug, as app.run does) and backend/main.py
+(uvicorn) in child processes over identical seeded databases, drives each with
+concurrent clients sending mixed save/list/search/recognize traffic, and reports
+p50/p99 latency and throughput.
+
+Usage: python3 benchmarks/load_asgi_vs_flask.py [clients] [requests_per_client] [asgi_workers]
+"""
+
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SEED_MEMORIES = 5000
+WORDS = ('tall short young old man woman boy girl glasses beard long hair curly black '
+         'brown white red blue shirt kurta saree jacket cap smiling round face').split()
+
+
+def seed(workdir):
+    """Build the shared starting database once"""
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.init_db()
+    rng = random.Random(0)
+    with ms.get_pool().connection() as conn:
+        cursor = conn.cursor()
+        for n in range(SEED_MEMORIES):
+            ms.insert_memory(cursor, {
+                'text': f'Note {n} ' + ' '.join(rng.sample(WORDS, 5)), 'name': f'Memory {n}', 'metadata': {},
+                'recognition_data': {'description': ' '.join(rng.sample(WORDS, 8))}, 'voice_data': None})
+        conn.commit()
+    ms.get_pool().close_all()
+
+
+def serve(kind, workdir, port, workers):
+    """Child process entry point: run one server against workdir/memories.db"""
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    if kind == 'flask':
+        import logging
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        ms.init_db()
+        make_server('127.0.0.1', port, ms.app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        # Workers re-import the app, so DB_PATH travels via the working directory
+        uvicorn.run('backend.main:app', host='127.0.0.1', port=port, workers=workers,
+                    log_level='error', app_dir=ROOT)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def request(port, method, path, body=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode() if body is not None else b''
+    head = (f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n')
+    writer.write(head.encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def client(port, count, seed_value, latencies, errors):
+    rng = random.Random(seed_value)
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.2:
+            call = ('POST', '/api/memory/save', {'text': f'Load {seed_value}-{i}', 'name': f'Load {seed_value}',
+                                                 'recognition_data': {'description': ' '.join(rng.sample(WORDS, 8))}})
+        elif roll < 0.6:
+            call = ('GET', '/api/memory/list?limit=50', None)
+        elif roll < 0.8:
+            call = ('GET', f'/api/memory/search?query={rng.choice(WORDS)}', None)
+        else:
+            call = ('POST', '/api/memory/recognize', {'description': ' '.join(rng.sample(WORDS, 6))})
+        start = time.perf_counter()
+        try:
+            status = await request(port, *call)
+            if status >= 400:
+                errors.append(status)
+        except OSError as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - start)
+
+
+async def drive(port, clients, per_client):
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, per_client, n, latencies, errors) for n in range(clients)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1) as s:
+                s.sendall(b'GET /health HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+                if s.recv(12).startswith(b'HTTP/1.1 200'):
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def run(kind, seeded, clients, per_client, workers):
+    workdir = tempfile.mkdtemp(prefix=f'load_{kind}_')
+    for name in os.listdir(seeded):
+        if name.startswith('memories.db'):
+            shutil.copy(os.path.join(seeded, name), workdir)
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', kind, workdir,
+                             str(port), str(workers)], stdout=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        time.sleep(1.0)  # let every worker finish starting up
+        latencies, errors, elapsed = asyncio.run(drive(port, clients, per_client))
+    finally:
+        proc.terminate()
+        proc.wait()
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    label = kind if kind == 'flask' else f'asgi x{workers}'
+    print(f"{label:>8} | p50 {p50:8.1f} ms | p99 {p99:8.1f} ms | {len(latencies) / elapsed:7.1f} req/s | "
+          f"{len(errors)} errors")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve(sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5]))
+        sys.exit(0)
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    print(f"🧠 Mixed load: {clients} concurrent clients x {per_client} requests, {SEED_MEMORIES} seeded memories")
+    seeded = tempfile.mkdtemp(prefix='load_seed_')
+    seed(seeded)
+    os.chdir(ROOT)
+    run('flask', seeded, clients, per_client, workers)
+    run('asgi', seeded, clients, per_client, workers)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Change feed load test
+Runs backend/main.py under uvicorn in a child process, opens hundreds of
+concurrent /api/memory/changes subscribers, then saves, updates and deletes
+memories from a separate writer. Checks that every subscriber saw every
+change exactly once and in order, reports delivery latency (save request sent
+to event received) and the poller's query count, which should track the
+number of write batches rather than the number of subscribers. Finally a
+slice of subscribers disconnects, misses a few writes and resumes with
+since=<last seq>.
+
+Usage: python3 benchmarks/load_changes.py [subscribers] [writes]
+"""
+
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_asgi_vs_flask import free_port, request, wait_ready
+
+EVENT = re.compile(rb'id: (\d+)\ndata: (\{.*?\})\n\n')
+WRITE_GAP = 0.02
+RESUMERS = 50
+
+
+def serve(workdir, port):
+    """Child process entry point: uvicorn with one worker, so there is one feed to count"""
+    os.chdir(workdir)
+    import uvicorn
+    uvicorn.run('backend.main:app', host='127.0.0.1', port=port, log_level='error', app_dir=ROOT)
+
+
+async def save(port, text):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps({'text': text, 'name': 'Feed load'}).encode()
+    writer.write(f'POST /api/memory/save HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+                 f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])['memory_id']
+
+
+class Subscriber:
+    def __init__(self, port):
+        self.port = port
+        self.seqs = []
+        self.arrivals = {}  # memory_id of an insert -> when its event arrived
+        self.task = None
+
+    async def run(self, since=None, ready=None):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        query = '' if since is None else f'?since={since}'
+        writer.write(f'GET /api/memory/changes{query} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                     f'Accept: text/event-stream\r\n\r\n'.encode())
+        await writer.drain()
+        buffer = b''
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return
+                buffer += chunk
+                if ready is not None and (b'event: ready' in buffer or b'id: ' in buffer):
+                    ready.set_result(None)
+                    ready = None
+                end = 0
+                for match in EVENT.finditer(buffer):
+                    event = json.loads(match.group(2))
+                    self.seqs.append(int(match.group(1)))
+                    if event['op'] == 'insert':
+                        self.arrivals[event['memory_id']] = time.perf_counter()
+                    end = match.end()
+                buffer = buffer[end:]
+        finally:
+            writer.close()
+
+    def start(self, since=None):
+        ready = asyncio.get_running_loop().create_future()
+        self.task = asyncio.create_task(self.run(since, ready))
+        return ready
+
+    async def stop(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+
+async def health(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /health HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n')
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])['changes']
+
+
+async def writes(port, count, label):
+    """Saves (with an update and a delete mixed in) one after another; returns memory_id -> send time"""
+    sent = {}
+    for n in range(count):
+        start = time.perf_counter()
+        memory_id = await save(port, f'{label} {n} kal ka revision')
+        sent[memory_id] = start
+        if n % 10 == 5:
+            await request(port, 'POST', '/api/voice/save', {'name': f'Feed {label}', 'speech_sample': 'haan ji'})
+        if n % 10 == 9:
+            await request(port, 'DELETE', f'/api/memory/delete/{memory_id}')
+        await asyncio.sleep(WRITE_GAP)
+    return sent
+
+
+def seq_range(subscribers):
+    """Every seq any subscriber saw: the log has no gaps, so this is what each should have"""
+    seen = [seq for s in subscribers for seq in s.seqs]
+    return list(range(min(seen), max(seen) + 1))
+
+
+def check(subscribers, expected):
+    """Subscribers that missed, repeated or reordered a change"""
+    return sum(1 for s in subscribers if s.seqs != expected)
+
+
+async def drive(port, count, write_count):
+    subscribers = [Subscriber(port) for _ in range(count)]
+    start = time.perf_counter()
+    await asyncio.gather(*(s.start() for s in subscribers))
+    connect_seconds = time.perf_counter() - start
+    before = await health(port)
+    print(f"  {before['subscribers']} subscribers connected in {connect_seconds:.2f}s")
+
+    sent = await writes(port, write_count, 'Live')
+    await asyncio.sleep(1.0)
+    after = await health(port)
+    expected = seq_range(subscribers)
+    latencies = sorted(s.arrivals[memory_id] - sent_at
+                       for s in subscribers for memory_id, sent_at in sent.items() if memory_id in s.arrivals)
+    delivered = sum(len(s.seqs) for s in subscribers)
+    print(f"  {len(expected)} changes x {count} subscribers: {delivered} events delivered, "
+          f"{check(subscribers, expected)} subscribers out of order or missing events")
+    print(f"  delivery latency: p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+    polls = after['polls'] - before['polls']
+    print(f"  poller: {polls} queries for {after['events'] - before['events']} events "
+          f"({polls / (after['events'] - before['events']):.2f} per change, for all {count} subscribers together)")
+
+    resumers = subscribers[:RESUMERS]
+    for s in resumers:
+        await s.stop()
+    positions = [s.seqs[-1] for s in resumers]
+    await writes(port, 20, 'Missed')
+    for s, since in zip(resumers, positions):
+        s.seqs = [seq for seq in s.seqs if seq <= since]
+        s.start(since)
+    await asyncio.sleep(1.0)
+    final = await health(port)
+    print(f"  {RESUMERS} subscribers resumed with since=: "
+          f"{check(subscribers, seq_range(subscribers))} subscribers out of order or missing events, "
+          f"{final['catch_ups'] - before['catch_ups']} table reads (0: every resume was served from the buffer)")
+    for s in subscribers:
+        await s.stop()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+    subscribers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    write_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    print(f"📡 Change feed: {subscribers} concurrent subscribers, {write_count} saves")
+    workdir = tempfile.mkdtemp(prefix='load_changes_')
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', workdir, str(port)],
+                            stdout=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        asyncio.run(drive(port, subscribers, write_count))
+    finally:
+        proc.terminate()
+        proc.wait()
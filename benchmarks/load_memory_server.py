@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Memory server load test
+Drives a threaded memory_server with mixed save/list/search traffic and reports
+requests per second, once with connect-per-request (the old behaviour) and once
+with the shared connection pool.
+
+Usage: python3 benchmarks/load_memory_server.py [clients] [requests_per_client]
+"""
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server
+
+
+class ConnectPerRequest:
+    """Pool stand-in reproducing the old sqlite3.connect()/close() per route"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def acquire(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn):
+        conn.close()
+
+    def connection(self):
+        from contextlib import closing
+        return closing(self.acquire())
+
+    def close_all(self):
+        pass
+
+    def stats(self):
+        return {'db_path': self.db_path, 'mode': 'connect-per-request'}
+
+
+def client_loop(base_url, count, seed, errors):
+    rng = random.Random(seed)
+    for i in range(count):
+        roll = rng.random()
+        try:
+            if roll < 0.4:
+                body = json.dumps({
+                    'text': f'Note {seed}-{i}',
+                    'name': f'Memory {seed}-{i}',
+                    'recognition_data': {'description': 'tall man glasses beard smiling'},
+                }).encode()
+                req = urllib.request.Request(f'{base_url}/api/memory/save', data=body,
+                                             headers={'Content-Type': 'application/json'})
+            elif roll < 0.8:
+                req = urllib.request.Request(f'{base_url}/api/memory/list')
+            else:
+                req = urllib.request.Request(f'{base_url}/api/memory/search?query=Note%20{seed}')
+            with urllib.request.urlopen(req) as resp:
+                resp.read()
+        except Exception as e:
+            errors.append(str(e))
+
+
+def run(mode, clients, per_client):
+    workdir = tempfile.mkdtemp(prefix=f'load_{mode}_')
+    os.chdir(workdir)
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    if mode == 'before':
+        ms._pool = ConnectPerRequest(ms.DB_PATH)
+    ms.init_db()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, ms.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    errors = []
+    threads = [threading.Thread(target=client_loop, args=(base_url, per_client, n, errors))
+               for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    total = clients * per_client
+    print(f"{mode:>7} | {total / elapsed:8.1f} req/s | {len(errors)} errors")
+    ms._pool = None
+    return total / elapsed
+
+
+if __name__ == '__main__':
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    print(f"🧠 Mixed save/list/search load: {clients} clients x {per_client} requests")
+    before = run('before', clients, per_client)
+    after = run('after', clients, per_client)
+    print(f"Pool speedup: {after / before:.2f}x")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Multi-tenant load test
+1k active users against a threaded memory_server: every request carries an
+X-User-Id, one heavy user sends a third of the traffic, and the rest is spread
+over the others. Runs with every user in the one shared memories.db, then with
+a shard per user twice: with the default LRU of open shards (sized from the
+file descriptor limit) and with an LRU of 128, where most requests reopen an
+evicted shard. Every user is touched once before timing, so first-time shard
+creation is reported separately. Prints throughput and latency percentiles.
+
+Usage: python3 benchmarks/load_tenants.py [users] [clients] [requests_per_client]
+"""
+
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server
+
+HEAVY_SHARE = 0.33
+
+
+def request_for(base_url, user, rng, i):
+    headers = {'X-User-Id': user}
+    roll = rng.random()
+    if roll < 0.4:
+        body = json.dumps({
+            'text': f'Note {user} {i}',
+            'name': f'Memory {i}',
+            'recognition_data': {'description': 'tall man glasses beard smiling'},
+        }).encode()
+        headers['Content-Type'] = 'application/json'
+        return urllib.request.Request(f'{base_url}/api/memory/save', data=body, headers=headers)
+    if roll < 0.8:
+        return urllib.request.Request(f'{base_url}/api/memory/list?limit=20', headers=headers)
+    return urllib.request.Request(f'{base_url}/api/memory/search?query=Note', headers=headers)
+
+
+def client_loop(base_url, users, count, seed, latencies, errors):
+    rng = random.Random(seed)
+    for i in range(count):
+        heavy = rng.random() < HEAVY_SHARE
+        user = users[0] if heavy else rng.choice(users[1:])
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request_for(base_url, user, rng, i)) as resp:
+                resp.read()
+        except Exception as e:
+            errors.append(str(e))
+        latencies['heavy' if heavy else 'light'].append(time.perf_counter() - start)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+
+def run(mode, users, clients, per_client, max_open=None):
+    workdir = tempfile.mkdtemp(prefix='tenants_')
+    os.chdir(workdir)
+    import memory_server as ms
+    import tenants
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.SHARD_ROOT = os.path.join(workdir, 'tenants')
+    ms.TENANTS_ENABLED = mode != 'single'
+    ms.init_db()
+    router = ms.get_router()
+    router.max_open = max_open or tenants.MAX_OPEN_SHARDS
+    if ms.TENANTS_ENABLED:
+        start = time.perf_counter()
+        for user in users:
+            with router.use(user):
+                pass
+        print(f"  created {len(users)} shards in {time.perf_counter() - start:.1f}s")
+        router.opened = router.evicted = 0
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, ms.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    latencies = {'heavy': [], 'light': []}
+    errors = []
+    threads = [threading.Thread(target=client_loop, args=(base_url, users, per_client, n, latencies, errors))
+               for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    total = clients * per_client
+    light = latencies['light']
+    router = router.stats()
+    print(f"{mode:>14} | {total / elapsed:7.1f} req/s | light p50 {percentile(light, 0.5):6.1f} ms"
+          f" p99 {percentile(light, 0.99):7.1f} ms | heavy p50 {statistics.median(latencies['heavy']) * 1000:6.1f} ms"
+          f" | {len(errors)} errors" + (f" | LRU {router['max_open']}, reopened {router['opened']}"
+                                         if ms.TENANTS_ENABLED else ''))
+    ms.get_router().close_all()
+    ms._pool = None
+    return total / elapsed
+
+
+if __name__ == '__main__':
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    per_client = int(sys.argv[3]) if len(sys.argv) > 3 else 150
+    users = [f'user{n:04d}' for n in range(user_count)]
+    print(f"🧠 {user_count} users, {clients} clients x {per_client} requests "
+          f"(heavy user sends {HEAVY_SHARE:.0%}), mixed save/list/search")
+    single = run('single', users, clients, per_client)
+    sharded = run('sharded', users, clients, per_client)
+    churn = run('sharded, LRU 128', users, clients, per_client, max_open=128)
+    print(f"Sharded throughput: {sharded / single:.2f}x the single database "
+          f"({churn / single:.2f}x when the LRU is smaller than the active users)")
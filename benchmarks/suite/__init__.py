@@ -0,0 +1,10 @@
+"""
+Dr. Chinki benchmark suite
+A repeatable performance check for memory_server.py: a seeded synthetic
+database, per-route micro-benchmarks through the Flask test client, a
+concurrent load run, and a JSON result compared against a stored baseline.
+
+Run from the repository root:
+    python3 -m benchmarks.suite                      # run, write bench_results.json, compare
+    python3 -m benchmarks.suite --save-baseline      # run and make this the new baseline
+"""
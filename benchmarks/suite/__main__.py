@@ -0,0 +1,101 @@
+"""
+Benchmark suite entry point
+Exit status: 0 when every compared metric is within tolerance of the baseline
+(or there is no baseline yet), 1 on a regression or a failed route, 2 when
+the baseline was recorded with a different workload.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from benchmarks.suite import load, results, routes
+from benchmarks.suite.synthetic import SyntheticData, drain_thumbnails, populate
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+RESULTS = os.path.join(ROOT, 'bench_results.json')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python3 -m benchmarks.suite',
+                                     description='Benchmark memory_server.py against a stored baseline')
+    parser.add_argument('--memories', type=int, default=5000, help='memories in the seeded database')
+    parser.add_argument('--rounds', type=int, default=100, help='timed calls per route')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent clients in the load run (0 to skip)')
+    parser.add_argument('--requests', type=int, default=40, help='calls per load client')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--out', default=RESULTS, help='where to write this run (JSON)')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='write this run to --baseline as well')
+    parser.add_argument('--tolerance', type=float, default=results.TOLERANCE,
+                        help='relative slowdown allowed before a metric counts as regressed')
+    return parser.parse_args(argv)
+
+
+def measure(args):
+    """Build the database and run every benchmark; returns {section: {metric: value}}"""
+    workdir = tempfile.mkdtemp(prefix='bench_suite_')
+    os.chdir(workdir)  # media directories are created relative to the working directory on import
+    import memory_server as ms
+    ms.DB_PATH = os.path.join(workdir, 'memories.db')
+    ms.init_db()
+    data = SyntheticData(args.seed)
+
+    start = time.perf_counter()
+    ids = populate(ms, data, args.memories)
+    print(f"🧠 {len(ids)} synthetic memories ({len(data.speakers())} speakers, "
+          f"{len(data.media['image'])} images, {len(data.media['audio'])} audio clips) "
+          f"in {time.perf_counter() - start:.1f}s")
+    drain_thumbnails(ms)
+
+    sections = {}
+    print("⏱️ Routes (Flask test client)")
+    delete_ids = random.Random(args.seed).sample(ids, min(len(ids), args.rounds + 1))
+    sections.update(routes.run(ms, ms.app.test_client(), data, args.rounds, len(ids), delete_ids))
+    if args.clients:
+        print("🚀 Concurrent load (threaded Werkzeug)")
+        sections['load'] = load.run(ms, data, args.clients, args.requests, len(ids) + args.rounds + 1)
+    return sections
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = {key: getattr(args, key) for key in ('memories', 'rounds', 'clients', 'requests', 'seed')}
+    try:
+        current = results.document(config, measure(args))
+    except routes.RouteFailed as e:
+        print(f"❌ Route failed: {e}")
+        return 1
+    results.write(args.out, current)
+    print(f"💾 Results written to {args.out}")
+
+    status = 0
+    if current['metrics'].get('load.errors'):
+        print(f"❌ {current['metrics']['load.errors']} errors under load")
+        status = 1
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        baseline = results.load(args.baseline)
+        differences = results.config_differences(current, baseline)
+        if differences:
+            print(f"⚠️ Baseline was recorded with different settings ({', '.join(differences)}); "
+                  f"rerun with the same ones or save a new baseline")
+            return max(status, 2)
+        print(f"📊 Against baseline from {baseline['meta']['created_at']} ({baseline['meta']['platform']})")
+        if results.report(results.compare(current, baseline, args.tolerance)):
+            status = 1
+    if args.save_baseline:
+        results.write(args.baseline, current)
+        print(f"📌 Baseline saved to {args.baseline}")
+    elif not os.path.exists(args.baseline):
+        print("⚠️ No baseline yet: rerun with --save-baseline to record one")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Concurrent load driver
+Serves the app on a threaded Werkzeug server (as app.run does) on a free
+local port and has `clients` threads send a fixed mix of saves, lists,
+searches, recognitions and voice recognitions for `requests` calls each.
+Reports throughput, p50/p99 latency and errors; any error fails the run.
+"""
+
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from werkzeug.serving import make_server
+
+# Share of calls per route; the rest are lists
+MIX = (('save', 0.15), ('search', 0.2), ('recognize', 0.15), ('voice_recognize', 0.1))
+
+
+def plan(data, clients, requests, first_new):
+    """Every client's calls up front, so generating payloads is not timed"""
+    speakers = data.speakers()
+    calls = []
+    for client in range(clients):
+        mine = []
+        for n in range(requests):
+            roll = data.rng.random()
+            for route, share in MIX:
+                if roll < share:
+                    break
+                roll -= share
+            else:
+                route = 'list'
+            if route == 'save':
+                call = ('POST', '/api/memory/save', data.payload(first_new + client * requests + n))
+            elif route == 'search':
+                call = ('GET', '/api/memory/search?query=' + urllib.request.quote(data.search_query()), None)
+            elif route == 'recognize':
+                call = ('POST', '/api/memory/recognize', {'description': data.description()})
+            elif route == 'voice_recognize':
+                speaker = data.rng.choice(speakers) if speakers else None
+                call = ('POST', '/api/voice/recognize', {'speech_sample': data.speech_sample(speaker)})
+            else:
+                call = ('GET', '/api/memory/list?limit=50', None)
+            mine.append(call)
+        calls.append(mine)
+    return calls
+
+
+def client_loop(base_url, calls, latencies, errors):
+    for method, path, body in calls:
+        payload = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(base_url + path, data=payload, method=method,
+                                     headers={'Content-Type': 'application/json'} if payload else {})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as resp:
+                resp.read()
+        except (urllib.error.URLError, OSError) as e:
+            errors.append(f'{method} {path.split("?")[0]}: {e}')
+        latencies.append(time.perf_counter() - start)
+
+
+def run(ms, data, clients, requests, first_new):
+    calls = plan(data, clients, requests, first_new)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, ms.app, threaded=True)
+    serving = threading.Thread(target=server.serve_forever, daemon=True)
+    serving.start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    latencies, errors = [], []
+    try:
+        threads = [threading.Thread(target=client_loop, args=(base_url, mine, latencies, errors)) for mine in calls]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    latencies.sort()
+    results = {
+        'requests_per_s': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000,
+        'errors': len(errors),
+    }
+    print(f"  {clients} clients x {requests}: {results['requests_per_s']:.1f} req/s, "
+          f"p50 {results['p50_ms']:.1f} ms, p99 {results['p99_ms']:.1f} ms, {len(errors)} errors")
+    for message in errors[:5]:
+        print(f"    ❌ {message}")
+    return results
@@ -0,0 +1,93 @@
+"""
+Benchmark results as JSON, and the comparison against a stored baseline
+A result file holds the run's configuration and environment under "meta" and
+flat metrics ("search.p50_ms", "load.requests_per_s", ...) under "metrics".
+A metric regresses when it is worse than the baseline by more than the
+relative tolerance and, for latencies, by more than an absolute floor too,
+so sub-millisecond jitter on fast routes does not fail a run.
+"""
+
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+
+# Metrics compared against the baseline; others (means, ops/s, the load run's
+# p99, which swings with thread scheduling) are recorded only
+COMPARED = ('p50_ms', 'p95_ms', 'requests_per_s', 'errors')
+HIGHER_IS_BETTER = ('ops_per_s', 'requests_per_s')
+TOLERANCE = 0.25
+MIN_DELTA_MS = 0.5
+
+
+def flatten(sections):
+    """{"search": {"p50_ms": 1.2}} -> {"search.p50_ms": 1.2}"""
+    return {f'{section}.{name}': value for section, values in sections.items() for name, value in values.items()}
+
+
+def document(config, sections):
+    return {
+        'meta': {
+            'config': config,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'created_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        },
+        'metrics': flatten(sections),
+    }
+
+
+def write(path, doc):
+    with open(path, 'w') as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current, baseline, tolerance=TOLERANCE, min_delta_ms=MIN_DELTA_MS):
+    """
+    One row per compared metric present in both: (name, baseline, current,
+    change, regressed). change is the relative difference, positive = worse.
+    """
+    rows = []
+    for name, base in sorted(baseline['metrics'].items()):
+        kind = name.rsplit('.', 1)[1]
+        if kind not in COMPARED or name not in current['metrics']:
+            continue
+        value = current['metrics'][name]
+        if kind == 'errors':
+            rows.append((name, base, value, float(value > base), value > base))
+            continue
+        if kind in HIGHER_IS_BETTER:
+            change = (base - value) / base if base else 0.0
+            regressed = change > tolerance
+        else:
+            change = (value - base) / base if base else 0.0
+            regressed = change > tolerance and value - base > min_delta_ms
+        rows.append((name, base, value, change, regressed))
+    return rows
+
+
+def report(rows, out=sys.stdout):
+    """Print the comparison; returns the regressed metric names"""
+    regressed = [row[0] for row in rows if row[4]]
+    for name, base, value, change, bad in rows:
+        marker = '❌' if bad else ('✅' if change < -TOLERANCE else '  ')
+        print(f"  {marker} {name:<28} {base:10.2f} → {value:10.2f}  {change:+7.1%}", file=out)
+    if regressed:
+        print(f"❌ REGRESSION: {len(regressed)} metric(s) worse than baseline: {', '.join(regressed)}", file=out)
+    else:
+        print("✅ No regressions against baseline", file=out)
+    return regressed
+
+
+def config_differences(current, baseline):
+    """Config keys that differ between the runs (results are only comparable on the same workload)"""
+    mine, theirs = current['meta']['config'], baseline['meta']['config']
+    return sorted(key for key in set(mine) | set(theirs) if mine.get(key) != theirs.get(key))
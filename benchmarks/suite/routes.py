@@ -0,0 +1,78 @@
+"""
+Per-route micro-benchmarks
+Each route is called `rounds` times through the Flask test client against the
+populated database, after one untimed warm-up call; reads run with the
+response cache off so they time the queries (list is also timed with it on).
+Every call is checked for a 2xx, so a broken route fails the run instead of
+looking fast.
+"""
+
+import statistics
+import time
+
+
+class RouteFailed(Exception):
+    """A benchmarked call answered with an error status"""
+
+
+def expect(response, route):
+    if response.status_code >= 300:
+        raise RouteFailed(f'{route}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}')
+    response.close()
+    return response
+
+
+def summarize(times):
+    """Latency summary in milliseconds, plus calls per second"""
+    ordered = sorted(times)
+    return {
+        'mean_ms': statistics.mean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[max(0, int(len(ordered) * 0.95) - 1)] * 1000,
+        'ops_per_s': len(ordered) / sum(ordered),
+    }
+
+
+def timed(route, call, rounds):
+    call(-1)  # warm-up: first-use setup (indexes, matrices, statements) is not what we measure
+    times = []
+    for n in range(rounds):
+        start = time.perf_counter()
+        call(n)
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+
+def run(ms, client, data, rounds, first_new, delete_ids):
+    """
+    Time every route. `first_new` is the generator index for memories saved
+    during the run; `delete_ids` are rounds + 1 existing ids to delete.
+    """
+    speakers = data.speakers()
+    queries = [data.search_query() for _ in range(rounds + 1)]
+    descriptions = [data.description() for _ in range(rounds + 1)]
+    samples = [data.speech_sample(speakers[n % len(speakers)] if speakers else None) for n in range(rounds + 1)]
+    payloads = [data.payload(first_new + n) for n in range(rounds + 1)]
+    cache_entries = ms.RESPONSE_CACHE.max_entries
+
+    calls = {
+        'save': lambda n: expect(client.post('/api/memory/save', json=payloads[n]), 'save'),
+        'list': lambda n: expect(client.get('/api/memory/list', query_string={'limit': 50}), 'list'),
+        'list_cached': lambda n: expect(client.get('/api/memory/list', query_string={'limit': 50}), 'list'),
+        'search': lambda n: expect(client.get('/api/memory/search', query_string={'query': queries[n]}), 'search'),
+        'recognize': lambda n: expect(client.post('/api/memory/recognize', json={'description': descriptions[n]}),
+                                      'recognize'),
+        'voice_recognize': lambda n: expect(client.post('/api/voice/recognize', json={'speech_sample': samples[n]}),
+                                            'voice recognize'),
+        'delete': lambda n: expect(client.delete(f'/api/memory/delete/{delete_ids[n]}'), 'delete'),
+    }
+    results = {}
+    try:
+        for route, call in calls.items():
+            ms.RESPONSE_CACHE.max_entries = cache_entries if route == 'list_cached' else 0
+            results[route] = timed(route, call, rounds)
+            print(f"  {route:<16} p50 {results[route]['p50_ms']:7.2f} ms   p95 {results[route]['p95_ms']:7.2f} ms   "
+                  f"{results[route]['ops_per_s']:8.1f} ops/s")
+    finally:
+        ms.RESPONSE_CACHE.max_entries = cache_entries
+    return results
@@ -0,0 +1,219 @@
+"""
+Synthetic memories for the benchmark suite
+Deterministic for a given seed: Hinglish notes, person/object recognition
+data, voice profiles built the way /api/voice/save builds them, and image and
+audio blobs (a fraction of them repeated, as re-sent photos are). The same
+generator also makes the queries the routes are timed with, so a run is
+repeatable end to end.
+"""
+
+import base64
+import io
+import random
+import time
+from datetime import datetime, timedelta
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+SUBJECTS = ('Aaj', 'Kal', 'Subah', 'Shaam ko', 'Exam se pehle', 'Hostel mein', 'Library mein', 'Ghar pe')
+VERBS = ('padha', 'revise kiya', 'yaad kiya', 'discuss kiya', 'notes banaye', 'test diya', 'samjha')
+TOPICS = ('heart ka anatomy', 'kidney ka nephron', 'liver enzymes', 'brain ke neurons', 'lungs aur alveoli',
+          'blood pressure', 'insulin aur glucose', 'muscle contraction', 'artery aur vein', 'digestive system')
+FILLERS = ('bahut mushkil tha', 'ekdum clear ho gaya', 'thoda confusion hai abhi', 'Boss Jaan ne help ki',
+           'dost ke saath group study', 'chai ke saath', 'kal phir se dekhna hai', 'diagram yaad rakhna')
+MOODS = ('khush', 'thaka', 'udaas', 'excited', 'focused')
+FIRST_NAMES = ('Aarav', 'Priya', 'Rohan', 'Ananya', 'Kabir', 'Isha', 'Vivaan', 'Meera', 'Arjun', 'Sana',
+               'Dev', 'Kavya', 'Aditya', 'Riya', 'Kamar', 'Neha', 'Farhan', 'Pooja', 'Yash', 'Zoya')
+FEATURES = ('glasses', 'beard', 'tall', 'short', 'curly', 'hair', 'red', 'blue', 'kurta', 'saree', 'smile',
+            'mole', 'cap', 'watch', 'earrings', 'shirt', 'jacket', 'bindi', 'moustache', 'dimples', 'young', 'old')
+OBJECTS = ('stethoscope', 'textbook', 'skeleton model', 'water bottle', 'laptop', 'notebook', 'pen', 'bag')
+COMMON_SPEECH = ('haan bhai kya haal hai nahi yaar acha theek main tum aap ka ki ko se '
+                 'matlab bilkul chalo dekho suno').split()
+PET_PHRASES = [f'takiya{i}' for i in range(2000)]  # each speaker's own words, so voices are tellable apart
+
+DUPLICATE_MEDIA = 0.1  # share of media blobs that repeat an earlier one
+DAYS = 365
+
+
+class SyntheticData:
+    """
+    Memory payloads and queries from one seed. `image_every`/`audio_every`
+    put a blob on every n-th memory (0 for none); `voice_every` makes every
+    n-th memory a voice profile.
+    """
+
+    def __init__(self, seed=7, image_every=4, audio_every=8, voice_every=5, image_size=64):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.image_every = image_every
+        self.audio_every = audio_every
+        self.voice_every = voice_every
+        self.image_size = image_size
+        self.people = [f'{name} {n}' for n in range(50) for name in FIRST_NAMES]
+        self.vocabulary = {}  # speaker -> pet phrases
+        self.media = {'image': [], 'audio': []}
+        self.start = datetime(2025, 1, 1)
+
+    # Text
+
+    def note(self):
+        rng = self.rng
+        sentences = [f'{rng.choice(SUBJECTS)} {rng.choice(TOPICS)} {rng.choice(VERBS)}, {rng.choice(FILLERS)}.'
+                     for _ in range(rng.randint(2, 5))]
+        return ' '.join(sentences)
+
+    def speaker_words(self, name):
+        if name not in self.vocabulary:
+            self.vocabulary[name] = self.rng.sample(PET_PHRASES, 10)
+        return self.vocabulary[name]
+
+    def speech_sample(self, name=None):
+        """What someone says: common Hinglish plus, for a known speaker, some of their own phrases"""
+        rng = self.rng
+        words = rng.sample(COMMON_SPEECH, 6)
+        if name is not None:
+            words += rng.sample(self.speaker_words(name), 4)
+        rng.shuffle(words)
+        return ' '.join(words)
+
+    def description(self):
+        return ' '.join(self.rng.sample(FEATURES, 5))
+
+    def search_query(self):
+        return self.rng.choice(TOPICS).split()[0] + ' ' + self.rng.choice(FILLERS).split()[-1]
+
+    # Structured columns
+
+    def recognition_data(self):
+        rng = self.rng
+        if rng.random() < 0.8:
+            features = rng.sample(FEATURES, 6)
+            return {'type': 'person', 'description': ' '.join(features), 'features': features[:3],
+                    'analyzed_at': self.timestamp().isoformat()}
+        item = rng.choice(OBJECTS)
+        return {'type': 'object', 'description': f'{item} {rng.choice(FEATURES)} on the table',
+                'features': [item], 'analyzed_at': self.timestamp().isoformat()}
+
+    def voice_data(self, name):
+        """The same shape handle_save_voice stores"""
+        sample = self.speech_sample(name)
+        return {
+            'speech_patterns': {
+                'sample_text': sample,
+                'word_count': len(sample.split()),
+                'common_words': sorted(set(sample.lower().split()))[:20],
+                'language_style': 'hinglish',
+            },
+            'recorded_at': self.timestamp().isoformat(),
+        }
+
+    def timestamp(self):
+        return self.start + timedelta(seconds=self.rng.randint(0, DAYS * 86400))
+
+    # Media
+
+    def image_bytes(self):
+        rng = self.rng
+        if Image is None:
+            # Not a decodable picture, but the store and routes only see bytes
+            return b'\xff\xd8\xff\xe0' + rng.randbytes(self.image_size * self.image_size // 2) + b'\xff\xd9'
+        picture = Image.new('RGB', (self.image_size, self.image_size), tuple(rng.randrange(256) for _ in range(3)))
+        for _ in range(8):
+            x, y = rng.randrange(self.image_size - 8), rng.randrange(self.image_size - 8)
+            picture.paste(tuple(rng.randrange(256) for _ in range(3)), (x, y, x + 8, y + 8))
+        out = io.BytesIO()
+        picture.save(out, 'JPEG', quality=80)
+        return out.getvalue()
+
+    def audio_bytes(self):
+        # A WebM/EBML header and a couple of seconds' worth of opaque frames
+        return b'\x1aE\xdf\xa3' + self.rng.randbytes(self.rng.randint(8, 24) * 1024)
+
+    def blob(self, kind):
+        seen = self.media[kind]
+        if seen and self.rng.random() < DUPLICATE_MEDIA:
+            return self.rng.choice(seen)
+        data = self.image_bytes() if kind == 'image' else self.audio_bytes()
+        seen.append(data)
+        return data
+
+    # Whole memories
+
+    def memory(self, n):
+        """Memory n as raw fields: text, name, metadata, recognition_data, voice_data, timestamp, image, audio"""
+        voice = self.voice_every and n % self.voice_every == 0
+        name = self.rng.choice(self.people)
+        return {
+            'text': f'Voice profile: {name}' if voice else self.note(),
+            'name': name,
+            'metadata': {'source': 'synthetic', 'mood': self.rng.choice(MOODS), 'n': n},
+            'recognition_data': None if voice else self.recognition_data(),
+            'voice_data': self.voice_data(name) if voice else None,
+            'timestamp': self.timestamp().strftime('%Y-%m-%d %H:%M:%S'),
+            'image': self.blob('image') if self.image_every and n % self.image_every == 0 else None,
+            'audio': self.blob('audio') if self.audio_every and n % self.audio_every == 0 else None,
+        }
+
+    def memories(self, count, first=0):
+        for n in range(first, first + count):
+            yield self.memory(n)
+
+    def payload(self, n):
+        """Memory n as a /api/memory/save JSON body, media as data URLs"""
+        memory = self.memory(n)
+        body = {key: memory[key] for key in ('text', 'name', 'metadata', 'recognition_data', 'voice_data')}
+        if memory['image']:
+            body['image'] = 'data:image/jpeg;base64,' + base64.b64encode(memory['image']).decode()
+        if memory['audio']:
+            body['audio'] = 'data:audio/webm;base64,' + base64.b64encode(memory['audio']).decode()
+        return body
+
+    def speakers(self):
+        """Speakers with a stored voice profile so far"""
+        return list(self.vocabulary)
+
+
+def populate(ms, data, count, commit_every=500):
+    """
+    Insert `count` generated memories straight through insert_memory (so FTS,
+    recognition postings, voice profiles and blob references are all built)
+    without paying for JSON and base64 on every one. Returns the new ids.
+    """
+    ids = []
+    with ms.get_pool().connection() as conn, ms.deferred_vectors() as append_committed_vectors:
+        cursor = conn.cursor()
+        for n, memory in enumerate(data.memories(count)):
+            blobs = {kind: ms.store_for(kind).stage_stream(io.BytesIO(memory[kind]))
+                     for kind in ('image', 'audio') if memory[kind]}
+            try:
+                ids.append(ms.insert_memory(cursor, memory, blobs.get('image'), blobs.get('audio')))
+            finally:
+                for blob in blobs.values():
+                    blob.discard()
+            if n % commit_every == commit_every - 1:
+                conn.commit()
+                append_committed_vectors()
+        conn.commit()
+        append_committed_vectors()
+    return ids
+
+
+def drain_thumbnails(ms, timeout=300):
+    """
+    Render the thumbnails populate() queued before anything is timed, so the
+    backlog is not rendered in the background during the benchmarks
+    """
+    deadline = time.monotonic() + timeout
+    ms.THUMBNAILS.kick()
+    while time.monotonic() < deadline:
+        with ms.get_pool().connection() as conn:
+            waiting = conn.execute(
+                "SELECT COUNT(*) FROM thumbnail_jobs WHERE status IN ('pending', 'running')").fetchone()[0]
+        if not waiting:
+            return
+        ms.THUMBNAILS.kick()
+        time.sleep(0.1)
+    raise TimeoutError(f'{waiting} thumbnails still rendering after {timeout}s')
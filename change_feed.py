@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Change Feed
+Change log of the memories table and a server-sent events fan-out over it
+
+Every write that changes a memory appends (op, memory_id) to memory_changes
+in its own transaction, so the log's seq order is commit order. One
+ChangeFeed per database tails that table: a single poller thread reads new
+rows while anyone is subscribed, encodes each event once as an SSE frame
+and keeps the last CHANGE_BUFFER_EVENTS frames in memory. Subscribers are
+served from that buffer, so a thousand of them cost one query per poll,
+not one each. Only a subscriber resuming from further back than the buffer
+reads the table itself; one resuming from before the log was trimmed is
+told to reset (reload the list and resume from the seq it is given).
+
+Events are SSE messages with `id: <seq>`; data is
+{"seq", "op", "memory_id", "at", "memory"} with op one of insert, update,
+delete, archive, and memory the row as /api/memory/list returns it (null
+once deleted or archived; it is read when the event is, so it may already
+carry later updates). Control events are `event: ready` (the seq a fresh
+subscription starts after) and `event: reset`; both carry an id too, so an
+EventSource that reconnects resumes from them.
+"""
+
+import asyncio
+import threading
+from collections import deque
+
+import row_serializer
+
+OPS = ('insert', 'update', 'delete', 'archive')
+CHANGE_BUFFER_EVENTS = 4096     # encoded events kept in memory for subscribers to catch up from
+CHANGE_LOG_ROWS = 100000        # log rows kept in SQLite; older resumes get a reset
+TRIM_EVERY = 1000               # log appends between trims
+POLL_INTERVAL = 0.05            # seconds between polls while anyone is subscribed
+POLL_BATCH = 500                # log rows read per poll
+HEARTBEAT_SECONDS = 15          # comment line sent to idle subscribers to keep proxies from closing them
+RETRY_MS = 2000                 # EventSource reconnect delay
+
+
+def create_schema(cursor):
+    """The change log; AUTOINCREMENT so a seq is never reused, even after trimming"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS memory_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL,
+            memory_id INTEGER NOT NULL,
+            changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def log_change(cursor, op, memory_ids):
+    """Append one change per memory id, in the caller's write transaction"""
+    cursor.executemany('INSERT INTO memory_changes (op, memory_id) VALUES (?, ?)',
+                       [(op, memory_id) for memory_id in memory_ids])
+    seq = cursor.lastrowid
+    if seq and seq // TRIM_EVERY != (seq - len(memory_ids)) // TRIM_EVERY:
+        cursor.execute('DELETE FROM memory_changes WHERE seq <= ?', (seq - CHANGE_LOG_ROWS,))
+
+
+def parse_since(value, last_event_id=None):
+    """?since= or the Last-Event-ID an EventSource resends; None means "from now on" """
+    for candidate in (value, last_event_id):
+        if candidate not in (None, ''):
+            try:
+                return max(0, int(candidate))
+            except (TypeError, ValueError):
+                raise ValueError('since must be a change sequence number')
+    return None
+
+
+def sse(data, event=None, event_id=None):
+    """One SSE frame from already-encoded JSON"""
+    head = b''
+    if event_id is not None:
+        head += b'id: %d\n' % event_id
+    if event is not None:
+        head += b'event: ' + event.encode() + b'\n'
+    return head + b'data: ' + data + b'\n\n'
+
+
+class Reset(Exception):
+    """The subscriber's position is older than the change log; it must reload and resume from `seq`"""
+
+    def __init__(self, seq):
+        super().__init__(seq)
+        self.seq = seq
+
+
+class ChangeFeed:
+    """
+    Fan-out of one database's change log. `connect` is a context manager
+    factory for a connection; `fields` are the memory columns sent with
+    insert and update events.
+    """
+
+    def __init__(self, connect, fields, buffer_size=CHANGE_BUFFER_EVENTS, poll_interval=POLL_INTERVAL):
+        self.connect = connect
+        self.fields = tuple(fields)
+        self.poll_interval = poll_interval
+        self._buffer = deque(maxlen=buffer_size)  # (seq, frame)
+        self._floor = None      # the buffer holds every event after this seq
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._loops = {}        # event loop -> asyncio.Event released on the next batch
+        self._thread = None
+        self._closed = False
+        self.subscribers = 0
+        self.polls = 0
+        self.events = 0
+        self.catch_ups = 0
+        self.resets = 0
+
+    # Reading the log
+
+    def _fetch(self, conn, after, limit=POLL_BATCH):
+        """(seq, frame) of up to `limit` changes after `after`, with the memory rows they refer to"""
+        columns = ', '.join('m.' + f for f in self.fields)
+        rows = conn.execute(f'''
+            SELECT c.seq, c.op, c.memory_id, c.changed_at, m.id IS NOT NULL AS present, {columns}
+            FROM memory_changes c
+            LEFT JOIN memories m ON m.id = c.memory_id AND c.op IN ('insert', 'update')
+            WHERE c.seq > ?
+            ORDER BY c.seq
+            LIMIT ?
+        ''', (after, limit)).fetchall()
+        frames = []
+        for row in rows:
+            memory = row_serializer.encode_row(row, self.fields) if row['present'] else b'null'
+            head = row_serializer.dumps({'seq': row['seq'], 'op': row['op'], 'memory_id': row['memory_id'],
+                                         'at': row['changed_at']})
+            frames.append((row['seq'], sse(head[:-1] + b',"memory":' + memory + b'}', event_id=row['seq'])))
+        return frames
+
+    def latest(self, conn=None):
+        """The newest seq in the log (0 when empty)"""
+        if conn is None:
+            with self.connect() as conn:
+                return self.latest(conn)
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'memory_changes'").fetchone()
+        return row[0] if row else 0
+
+    def catch_up(self, since):
+        """
+        Changes after `since` read from the table, for a subscriber behind
+        the buffer. Raises Reset if the log no longer reaches back that far.
+        """
+        with self.connect() as conn:
+            oldest = conn.execute('SELECT MIN(seq) FROM memory_changes').fetchone()[0]
+            latest = self.latest(conn)
+            if since < latest and (oldest is None or oldest > since + 1):
+                with self._cond:
+                    self.resets += 1
+                raise Reset(latest)
+            frames = self._fetch(conn, since)
+        with self._cond:
+            self.catch_ups += 1
+        return frames
+
+    def buffered(self, since):
+        """Frames after `since` from the buffer, or None if the buffer no longer reaches back that far"""
+        with self._cond:
+            if self._floor is None or since < self._floor:
+                return None
+            frames = []
+            for seq, frame in reversed(self._buffer):
+                if seq <= since:
+                    break
+                frames.append(frame)
+            frames.reverse()
+            return frames
+
+    def next_frames(self, since):
+        """Frames after `since` from the buffer, falling back to the table"""
+        frames = self.buffered(since)
+        return self.catch_up(since) if frames is None else frames
+
+    # Poller
+
+    def _start(self):
+        with self._cond:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            with self.connect() as conn:
+                floor = self.latest(conn)
+            with self._cond:
+                last = self._buffer[-1][0] if self._buffer else self._floor
+                if last is None or floor - last > self._buffer.maxlen:
+                    # First start, or idle through more changes than the buffer holds: start over from now
+                    self._buffer.clear()
+                    self._floor = floor
+            while True:
+                with self._cond:
+                    if self.subscribers == 0 or self._closed:
+                        self._thread = None
+                        return
+                    after = self._buffer[-1][0] if self._buffer else self._floor
+                try:
+                    with self.connect() as conn:
+                        frames = self._fetch(conn, after)
+                except Exception as e:
+                    print(f"❌ Change feed poll failed: {e}")
+                    frames = []
+                with self._cond:
+                    self.polls += 1
+                    if frames:
+                        for frame in frames:
+                            if len(self._buffer) == self._buffer.maxlen:
+                                self._floor = self._buffer[0][0]
+                            self._buffer.append(frame)
+                        self.events += len(frames)
+                        self._cond.notify_all()
+                        loops = list(self._loops)
+                if frames:
+                    for loop in loops:
+                        loop.call_soon_threadsafe(self._release, loop)
+                if len(frames) < POLL_BATCH:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+        except Exception as e:
+            print(f"❌ Change feed stopped: {e}")
+            with self._cond:
+                self._thread = None
+
+    def _release(self, loop):
+        """On `loop`: wake every coroutine waiting there and arm a fresh event for the next batch"""
+        with self._cond:
+            event = self._loops.get(loop)
+            if event is None:
+                return
+            self._loops[loop] = asyncio.Event()
+        event.set()
+
+    # Subscribers
+
+    def _subscribe(self):
+        with self._cond:
+            self.subscribers += 1
+        self._start()
+
+    def _unsubscribe(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def _position(self, since):
+        """(since, opening frames) for a new subscription"""
+        opening = [b'retry: %d\n\n' % RETRY_MS]
+        if since is None:
+            since = self.latest()
+            opening.append(sse(row_serializer.dumps({'seq': since}), event='ready', event_id=since))
+        return since, opening
+
+    def _wait(self, since, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or (self._buffer and self._buffer[-1][0] > since),
+                                timeout)
+            return not self._closed
+
+    def iter_frames(self, since=None):
+        """SSE byte frames for a blocking (Flask) response, until the client goes away"""
+        self._subscribe()
+        try:
+            since, opening = self._position(since)
+            yield from opening
+            while True:
+                try:
+                    frames = self.next_frames(since)
+                except Reset as reset:
+                    yield sse(row_serializer.dumps({'seq': reset.seq}), event='reset', event_id=reset.seq)
+                    since = reset.seq
+                    continue
+                if frames:
+                    since = int(frames[-1].split(b'\n', 1)[0][4:])
+                    yield b''.join(frames)
+                    continue
+                if not self._wait(since, HEARTBEAT_SECONDS):
+                    return
+                if not self.buffered(since):
+                    yield b': keepalive\n\n'
+        finally:
+            self._unsubscribe()
+
+    async def aiter_frames(self, since=None, run=None):
+        """
+        The same frames for an asyncio (ASGI) response; `run(fn, *args)` runs
+        the occasional table read (a resume from behind the buffer) off the loop
+        """
+        loop = asyncio.get_running_loop()
+        run = run or (lambda fn, *args: loop.run_in_executor(None, fn, *args))
+        self._subscribe()
+        try:
+            if since is None:
+                since, opening = await run(self._position, None)
+            else:
+                since, opening = self._position(since)
+            yield b''.join(opening)
+            while True:
+                with self._cond:
+                    event = self._loops.setdefault(loop, asyncio.Event())
+                frames = self.buffered(since)
+                if frames is None:
+                    try:
+                        frames = await run(self.catch_up, since)
+                    except Reset as reset:
+                        yield sse(row_serializer.dumps({'seq': reset.seq}), event='reset', event_id=reset.seq)
+                        since = reset.seq
+                        continue
+                if frames:
+                    since = int(frames[-1].split(b'\n', 1)[0][4:])
+                    yield b''.join(frames)
+                    continue
+                if self._closed:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b': keepalive\n\n'
+        finally:
+            self._unsubscribe()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'subscribers': self.subscribers,
+                'buffered': len(self._buffer),
+                'buffer_floor': self._floor,
+                'polls': self.polls,
+                'events': self.events,
+                'catch_ups': self.catch_ups,
+                'resets': self.resets,
+                'polling': self._thread is not None,
+            }
+
+    def close(self):
+        """Stop polling and end every subscription (clients reconnect with their last seq)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            loops = list(self._loops)
+        self._wake.set()
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._release, loop)
+            except RuntimeError:
+                pass  # loop already closed
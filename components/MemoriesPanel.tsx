@@ -1,5 +1,9 @@
 import React, { useEffect, useState } from 'react';
-import { getMemories, deleteMemory, Memory } from '../services/memoryService';
+import { getMemories, deleteMemory, subscribeToMemoryChanges, Memory } from '../services/memoryService';
+
+const PAGE_SIZE = 50;
+const CLEAR_PAGE_SIZE = 500;
+const PANEL_FIELDS: (keyof Memory)[] = ['type', 'name', 'content'];
 
 interface MemoriesPanelProps {
   isOpen: boolean;
@@ -11,6 +15,11 @@ const MemoriesPanel: React.FC<MemoriesPanelProps> = ({ isOpen, onClose }) => {
   const [isLoading, setIsLoading] = useState(false);
   const [isClearing, setIsClearing] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [reloadKey, setReloadKey] = useState(0);
+
+  const fetchPage = (cursor?: string | null) =>
+    getMemories({ limit: PAGE_SIZE, cursor, fields: PANEL_FIELDS });
 
   useEffect(() => {
     if (!isOpen) return;
@@ -19,9 +28,10 @@ const MemoriesPanel: React.FC<MemoriesPanelProps> = ({ isOpen, onClose }) => {
       setIsLoading(true);
       setError(null);
       try {
-        const res = await getMemories();
+        const res = await fetchPage();
         if (res.success) {
           setMemories(res.memories || []);
+          setNextCursor(res.next_cursor || null);
         } else {
           setError('Memories load nahi ho paayi Boss Jaan.');
         }
@@ -34,8 +44,38 @@ const MemoriesPanel: React.FC<MemoriesPanelProps> = ({ isOpen, onClose }) => {
     };
 
     load();
+  }, [isOpen, reloadKey]);
+
+  // Live updates while open: new memories on top, edits in place, deletes and archived ones out
+  useEffect(() => {
+    if (!isOpen) return;
+    return subscribeToMemoryChanges(change => {
+      setMemories(prev => {
+        const rest = prev.filter(m => m.id !== change.memory_id);
+        if (!change.memory) return rest;
+        if (change.op === 'insert' && rest.length === prev.length) return [change.memory, ...prev];
+        return prev.map(m => (m.id === change.memory_id ? change.memory! : m));
+      });
+    }, () => setReloadKey(key => key + 1));
   }, [isOpen]);
 
+  const handleLoadMore = async () => {
+    if (!nextCursor) return;
+    setIsLoading(true);
+    try {
+      const res = await fetchPage(nextCursor);
+      if (res.success) {
+        setMemories(prev => [...prev, ...(res.memories || [])]);
+        setNextCursor(res.next_cursor || null);
+      }
+    } catch (e) {
+      console.error(e);
+      setError('Aur memories load nahi ho paayi.');
+    } finally {
+      setIsLoading(false);
+    }
+  };
+
   const handleDelete = async (id: number | undefined) => {
     if (!id) return;
     try {
@@ -55,22 +95,34 @@ const MemoriesPanel: React.FC<MemoriesPanelProps> = ({ isOpen, onClose }) => {
     setIsClearing(true);
     setError(null);
     try {
+      // Sirf loaded pages nahi: pehle har page (archived bhi) ki ids collect karo, phir delete
+      const ids: number[] = [];
+      let cursor: string | null = null;
+      do {
+        const res = await getMemories({ limit: CLEAR_PAGE_SIZE, cursor, fields: ['type'], includeArchived: true });
+        if (!res.success) throw new Error('Memory list failed');
+        for (const mem of res.memories || []) {
+          if (mem.id) ids.push(mem.id);
+        }
+        cursor = res.next_cursor || null;
+      } while (cursor);
+
       // Best-effort clear – errors per item ko ignore karke aage badhenge
-      for (const mem of memories) {
-        if (mem.id) {
-          try {
-            await deleteMemory(mem.id);
-          } catch (e) {
-            console.error('Failed to delete memory', mem.id, e);
-          }
+      let failed = 0;
+      for (const id of ids) {
+        const res = await deleteMemory(id);
+        if (!res.success) {
+          failed += 1;
+          console.error('Failed to delete memory', id, res.message);
         }
       }
-      setMemories([]);
+      if (failed) setError(`${failed} memories delete nahi ho paayi Boss Jaan.`);
     } catch (e) {
       console.error(e);
       setError('Saari memories clear karne me problem aa gayi.');
     } finally {
       setIsClearing(false);
+      setReloadKey(key => key + 1);
     }
   };
 
@@ -107,7 +159,7 @@ const MemoriesPanel: React.FC<MemoriesPanelProps> = ({ isOpen, onClose }) => {
 
         <div className="px-6 py-3 border-b border-slate-800 flex items-center justify-between gap-3">
           <p className="text-[9px] text-slate-500 font-bold uppercase tracking-[0.25em]">
-            {isLoading ? 'Loading memories...' : `Total: ${memories.length}`}
+            {isLoading ? 'Loading memories...' : `Loaded: ${memories.length}${nextCursor ? '+' : ''}`}
           </p>
           <button
             onClick={handleClearAll}
@@ -185,6 +237,16 @@ const MemoriesPanel: React.FC<MemoriesPanelProps> = ({ isOpen, onClose }) => {
               </button>
             </div>
           ))}
+
+          {nextCursor && (
+            <button
+              onClick={handleLoadMore}
+              disabled={isLoading}
+              className="w-full py-2 rounded-2xl bg-slate-900 border border-slate-700 text-[9px] font-black uppercase tracking-[0.3em] text-sky-400 hover:border-sky-400 transition-all disabled:opacity-40"
+            >
+              {isLoading ? 'Loading...' : 'Load more'}
+            </button>
+          )}
         </div>
 
         <div className="px-6 py-3 border-t border-slate-800 text-[8px] text-slate-600 font-black uppercase tracking-[0.35em] text-center">
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Embeddings
+Offline text embedders and a memory-mapped vector index for recognition
+"""
+
+import os
+import re
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process servers only need the thread lock
+    fcntl = None
+
+try:
+    import numpy as np
+except ImportError:  # embedding recognition is unavailable without NumPy
+    np = None
+
+EMBEDDING_DIM = 256
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.5
+
+
+class HashingEmbedder:
+    """
+    Feature-hashing embedder: word unigrams plus character trigrams, signed and
+    L2-normalised. Needs no model files or network, and trigrams let it match
+    inflections and typos ("glasses"/"glass", "smiling"/"smile") that exact
+    word overlap misses.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f'hashing-{dim}'
+
+    def _features(self, text):
+        for word in re.findall(r'\w+', text.lower()):
+            yield word, WORD_WEIGHT
+            padded = f'#{word}#'
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], TRIGRAM_WEIGHT
+
+    def embed(self, texts):
+        """Embed a list of strings into an (n, dim) float32 array of unit vectors"""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text or ''):
+                h = zlib.crc32(feature.encode('utf-8'))
+                vectors[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class SentenceTransformerEmbedder:
+    """Wraps a locally cached sentence-transformers model (optional dependency)"""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f'st-{model_name}'
+
+    def embed(self, texts):
+        return self.model.encode(list(texts), normalize_embeddings=True).astype(np.float32)
+
+
+def load_embedder(spec='hashing'):
+    """Build an embedder from a spec: 'hashing', 'hashing:<dim>' or 'st:<model>'"""
+    kind, _, arg = spec.partition(':')
+    if kind == 'st':
+        try:
+            return SentenceTransformerEmbedder(arg)
+        except Exception as e:
+            print(f"⚠️ Could not load sentence-transformers model {arg!r}, using hashing embedder: {e}")
+            return HashingEmbedder()
+    return HashingEmbedder(int(arg) if arg else EMBEDDING_DIM)
+
+
+def to_blob(vector):
+    """Compact float32 bytes for storage next to a memory"""
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def from_blob(blob):
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+class VectorIndex:
+    """
+    Append-only vector file (<prefix>.f32) with a parallel id file
+    (<prefix>.ids), searched through a read-only memory map. The database
+    column is the source of truth; the files are rebuilt from it when they
+    drift (e.g. after deletes across a restart).
+    """
+
+    def __init__(self, prefix, dim):
+        self.vectors_path = f'{prefix}.f32'
+        self.ids_path = f'{prefix}.ids'
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._mapped_size = -1
+        self._vectors = None
+        self._ids = None
+        self.deleted = 0
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.ids_path) // 8
+        except OSError:
+            return 0
+
+    def rebuild(self, rows):
+        """Rewrite both files from an iterable of (memory_id, vector_blob)"""
+        with self._lock:
+            # Per-process temp names: several server workers may rebuild at startup
+            suffix = f'.{os.getpid()}.tmp'
+            with open(self.vectors_path + suffix, 'wb') as vf, open(self.ids_path + suffix, 'wb') as idf:
+                for memory_id, blob in rows:
+                    vf.write(blob)
+                    idf.write(np.int64(memory_id).tobytes())
+            os.replace(self.vectors_path + suffix, self.vectors_path)
+            os.replace(self.ids_path + suffix, self.ids_path)
+            self.deleted = 0
+            self._mapped_size = -1
+
+    def append(self, memory_id, blob):
+        with self._lock:
+            with open(self.vectors_path, 'ab') as vf, open(self.ids_path, 'ab') as idf:
+                # Other worker processes append to the same pair of files
+                if fcntl is not None:
+                    fcntl.flock(idf, fcntl.LOCK_EX)
+                vf.write(blob)
+                vf.flush()
+                idf.write(np.int64(memory_id).tobytes())
+
+    def mark_deleted(self):
+        """Deleted rows stay in the file until the next rebuild; search over-fetches past them"""
+        with self._lock:
+            self.deleted += 1
+
+    def _mapped(self):
+        size = len(self)
+        with self._lock:
+            if size != self._mapped_size:
+                if size == 0:
+                    self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+                    self._ids = np.zeros(0, dtype=np.int64)
+                else:
+                    self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(size, self.dim))
+                    self._ids = np.memmap(self.ids_path, dtype=np.int64, mode='r', shape=(size,))
+                self._mapped_size = size
+            return self._vectors, self._ids, self.deleted
+
+    def search(self, query_vector, k, live=None, min_score=None):
+        """
+        Top-k (memory_id, cosine) pairs, best first, over-fetching past deleted
+        rows. `deleted` only counts this process's deletes, so with `live` (a
+        callable returning which of a list of ids still exist) the search
+        keeps widening until k live rows scoring at least `min_score` are
+        found, or there are none left to find.
+        """
+        vectors, ids, deleted = self._mapped()
+        if len(ids) == 0:
+            return []
+        scores = vectors @ query_vector
+        fetch = k + deleted
+        while True:
+            fetch = min(fetch, len(ids))
+            top = np.argpartition(-scores, fetch - 1)[:fetch]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            found = [(int(ids[i]), float(scores[i])) for i in top]
+            if live is None:
+                return found
+            exhausted = fetch == len(ids) or (min_score is not None and found[-1][1] < min_score)
+            if min_score is not None:
+                found = [(memory_id, score) for memory_id, score in found if score >= min_score]
+            alive = live([memory_id for memory_id, _ in found])
+            found = [(memory_id, score) for memory_id, score in found if memory_id in alive]
+            if len(found) >= k or exhausted:
+                return found[:k]
+            fetch *= 2
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Media Store
+Content-addressed, reference-counted blob storage for memory images and audio
+"""
+
+import base64
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+UPLOAD_CHUNK = 64 * 1024
+BASE64_CHUNK = 256 * 1024  # characters of base64 decoded at a time
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+
+BLOB_NAME = re.compile(r'^([0-9a-f]{64})(\.\w+)?$')
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+
+
+def _decode_base64_chunks(encoded, start):
+    """
+    Decode encoded[start:] a slice at a time. Like b64decode, characters
+    outside the alphabet (line breaks from MIME-style encoders, spaces) are
+    ignored; since they shift the 4-character groups, each slice's leftover
+    characters are carried into the next one.
+    """
+    carry = ''
+    for offset in range(start, len(encoded), BASE64_CHUNK):
+        text = carry + NOT_BASE64.sub('', encoded[offset:offset + BASE64_CHUNK])
+        whole = len(text) - len(text) % 4
+        carry = text[whole:]
+        if whole:
+            yield base64.b64decode(text[:whole])
+    if carry:
+        yield base64.b64decode(carry)  # raises on truncated input, as decoding it whole would
+
+
+class UploadTooLarge(Exception):
+    """Raised when a streamed upload passes MAX_UPLOAD_BYTES"""
+
+
+class StagedBlob:
+    """A fully written temp file whose SHA-256 is known but not yet stored"""
+
+    def __init__(self, tmp_path, sha256, size):
+        self.tmp_path = tmp_path
+        self.sha256 = sha256
+        self.size = size
+
+    def discard(self):
+        """Remove the temp file if it was never committed"""
+        if self.tmp_path and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.tmp_path = None
+
+
+class MediaStore:
+    """
+    Blobs live at <root>/<aa>/<bb>/<sha256><ext> and are tracked in the
+    media_blobs table under (sha256, kind) with a reference count: the image
+    and audio stores share the table but never a row. Callers stage content first
+    (outside any transaction), then commit/release inside the same SQLite
+    write transaction that changes the memories row. Files whose last
+    reference was released are only unlinked by collect(), after that
+    transaction has committed, so a rollback never loses a blob.
+    """
+
+    def __init__(self, root, extension, kind):
+        self.root = Path(root)
+        self.extension = extension
+        self.kind = kind
+        self.staging_dir = self.root / '.staging'
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self._released = {}  # sha256 -> path, waiting for collect()
+        self._lock = threading.Lock()
+
+    def path_for(self, sha256):
+        """Sharded location of a blob"""
+        return self.root / sha256[:2] / sha256[2:4] / f'{sha256}{self.extension}'
+
+    def resolve(self, filename):
+        """Map a bare '<sha256><ext>' name to its sharded path relative to root, else None"""
+        match = BLOB_NAME.match(filename)
+        if not match:
+            return None
+        sha256 = match.group(1)
+        return f'{sha256[:2]}/{sha256[2:4]}/{sha256}{self.extension}'
+
+    def _stage(self, chunks):
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.staging_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > MAX_UPLOAD_BYTES:
+                        raise UploadTooLarge(f'Upload exceeds {MAX_UPLOAD_BYTES} bytes')
+                    digest.update(chunk)
+                    f.write(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return StagedBlob(tmp_path, digest.hexdigest(), size)
+
+    def stage_stream(self, stream):
+        """Copy an upload stream to a temp file chunk by chunk, hashing as it goes"""
+        return self._stage(iter(lambda: stream.read(UPLOAD_CHUNK), b''))
+
+    def stage_base64(self, encoded):
+        """Decode a base64 (or data URL) string to a temp file in bounded chunks"""
+        # Skip the data URL prefix without copying the payload
+        start = encoded.find(',') + 1
+        return self._stage(_decode_base64_chunks(encoded, start))
+
+    def stage_file(self, path):
+        """Stage a copy of an existing file (used by the migration tool)"""
+        with open(path, 'rb') as f:
+            return self.stage_stream(f)
+
+    def commit(self, cursor, staged):
+        """
+        Take a reference to a staged blob, moving it into place if it is new.
+        If the transaction then rolls back, the moved file is left without a
+        row (verify_database.py --delete-orphans removes it); it is never the
+        other way round.
+        """
+        path = self.path_for(staged.sha256)
+        cursor.execute('''
+            INSERT INTO media_blobs (sha256, kind, path, size, ref_count) VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT(sha256, kind) DO UPDATE SET ref_count = ref_count + 1
+        ''', (staged.sha256, self.kind, str(path), staged.size))
+        if path.exists():
+            staged.discard()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged.tmp_path, path)
+            staged.tmp_path = None
+        return path
+
+    def release(self, cursor, sha256):
+        """
+        Drop one reference. When the last one goes the row is deleted and the
+        file queued for collect(); returns whether that happened.
+        """
+        key = (sha256, self.kind)
+        cursor.execute('UPDATE media_blobs SET ref_count = ref_count - 1 WHERE sha256 = ? AND kind = ?', key)
+        cursor.execute('SELECT ref_count, path FROM media_blobs WHERE sha256 = ? AND kind = ?', key)
+        row = cursor.fetchone()
+        if row is None or row[0] > 0:
+            return False
+        cursor.execute('DELETE FROM media_blobs WHERE sha256 = ? AND kind = ?', key)
+        with self._lock:
+            self._released[sha256] = row[1]
+        return True
+
+    def collect(self, conn, unlinked=None):
+        """
+        Unlink released blobs that are still unreferenced; call with no
+        transaction open, after the releasing one committed. It runs under
+        the write lock, so a release that was rolled back (its row is back)
+        or a save that took a new reference since is seen, and no save can
+        take one while the file goes. `unlinked(sha256)` runs for each file
+        removed. Returns how many were.
+        """
+        if conn.in_transaction:
+            return 0
+        with self._lock:
+            pending, self._released = self._released, {}
+        if not pending:
+            return 0
+        removed = 0
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for sha256, path in pending.items():
+                    if conn.execute('SELECT 1 FROM media_blobs WHERE sha256 = ? AND kind = ?',
+                                    (sha256, self.kind)).fetchone():
+                        continue
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    if unlinked is not None:
+                        unlinked(sha256)
+                    removed += 1
+            finally:
+                conn.rollback()  # nothing was written; this just drops the lock
+        except Exception:
+            # Busy or closed: try again on the next collect (unlinking twice is harmless)
+            with self._lock:
+                self._released.update(pending)
+            raise
+        return removed
+
+
+class BlobCache:
+    """Byte-bounded in-process LRU of small, hot media files (e.g. gallery thumbnails)"""
+
+    def __init__(self, max_bytes, max_item_bytes):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_item_bytes or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._bytes -= len(self._items.pop(key))
+            self._items[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Cache counters for /health"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'items': len(self._items),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def file_sha256(path):
+    """Hash a file in bounded chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+BLOBS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS media_blobs (
+        sha256 TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (sha256, kind)
+    )
+'''
+
+
+def create_schema(cursor, stores):
+    """
+    Blob table shared by the image and audio stores. A table from before
+    kinds (keyed by sha256 alone) is rebuilt, each row's kind read from its
+    file extension; returns True then, since bytes saved as both kinds had
+    one row and one count between them and the caller has to recount.
+    """
+    cursor.execute(BLOBS_TABLE)
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(media_blobs)').fetchall()}
+    if 'kind' in columns:
+        return False
+    cursor.execute('ALTER TABLE media_blobs RENAME TO media_blobs_by_hash')
+    cursor.execute(BLOBS_TABLE)
+    cursor.execute('SELECT sha256, path, size, ref_count FROM media_blobs_by_hash')
+    rows = []
+    for sha256, path, size, ref_count in cursor.fetchall():
+        kind = next((store.kind for store in stores if path.endswith(store.extension)), None)
+        if kind is not None:
+            rows.append((sha256, kind, path, size, ref_count))
+    cursor.executemany('INSERT INTO media_blobs (sha256, kind, path, size, ref_count) VALUES (?, ?, ?, ?, ?)', rows)
+    cursor.execute('DROP TABLE media_blobs_by_hash')
+    return True
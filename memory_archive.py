@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Memory Archive
+Cold tier for old memories: append-only, compressed segment files read back
+through mmap, with a summary row per memory and a sparse block index in SQLite
+
+Archived memories are written in blocks of BLOCK_ROWS rows, each block one
+zlib-compressed JSON array appended to the current segment file
+(<root>/segment-000001.seg, a new one every SEGMENT_MAX_BYTES). The media
+they reference is appended alongside, once per SHA-256, so the blob stores
+can drop it. SQLite keeps:
+
+    archived_memories  one small row per memory (type, name, timestamp,
+                       a text summary, media paths) and the block it is in
+    archive_blocks     one row per block: segment, offset, length and the
+                       id and timestamp range it covers
+    archive_media      segment, offset and size of each archived blob, and
+                       how many archived memories reference it
+
+Bytes are appended and fsynced before the SQLite rows pointing at them are
+committed, so a crash leaves at most some unreferenced bytes at the end of a
+segment. Deleting an archived memory removes its summary row and drops its
+media references; a blob no archived memory references any more loses its
+archive_media row and is no longer served. The bytes stay in the segment.
+
+Run from the directory memory_server.py runs in:
+    python3 memory_archive.py run --older-than-days 180 [--vacuum]
+    python3 memory_archive.py stats
+    python3 memory_archive.py dump [--since 2025-01-01] [--until 2025-06-30]
+
+All take --user <id> to work on one user's shard.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import nullcontext
+from pathlib import Path
+
+from media_store import BLOB_NAME
+
+ARCHIVE_AFTER_DAYS = 180        # default age at which memories move to the cold tier
+ARCHIVE_BATCH = 1024            # memories moved per write transaction
+BLOCK_ROWS = 64                 # memories per compressed block (one sparse index row each)
+SEGMENT_MAX_BYTES = 256 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+BLOCK_CACHE_BLOCKS = 64         # decompressed blocks kept in memory
+SUMMARY_CHARS = 280             # content kept in the summary row, for listing and archived search
+MEDIA_COPY_CHUNK = 1024 * 1024
+
+RECORD_FIELDS = ('id', 'type', 'content', 'image_path', 'name', 'timestamp', 'metadata',
+                 'recognition_data', 'voice_data', 'audio_path', 'image_hash', 'audio_hash')
+# Columns a summary row answers without opening the segment
+SUMMARY_FIELDS = ('id', 'type', 'name', 'timestamp', 'image_path', 'audio_path')
+
+SEGMENT_NAME = re.compile(r'^segment-(\d{6})\.seg$')
+
+
+def create_schema(cursor):
+    """Summary rows, the sparse block index and the archived media locations"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_memories (
+            id INTEGER PRIMARY KEY,
+            type TEXT NOT NULL,
+            name TEXT,
+            timestamp DATETIME,
+            summary TEXT,
+            image_path TEXT,
+            audio_path TEXT,
+            block_id INTEGER NOT NULL,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_archived_timestamp_id ON archived_memories(timestamp, id)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_blocks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            segment INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            first_timestamp DATETIME,
+            last_timestamp DATETIME
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_archive_blocks_id ON archive_blocks(first_id, last_id)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_archive_blocks_timestamp
+        ON archive_blocks(first_timestamp, last_timestamp)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_media (
+            sha256 TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            segment INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    try:
+        cursor.execute('ALTER TABLE archive_media ADD COLUMN ref_count INTEGER NOT NULL DEFAULT 0')
+    except sqlite3.OperationalError:
+        pass
+    else:
+        count_media_references(cursor)
+        print("✅ Added ref_count column to archive_media")
+
+
+def count_media_references(cursor):
+    """
+    Set archive_media ref_counts from the archived memories' media paths (blob
+    store paths end in '<sha256><ext>'), dropping blobs nobody references
+    """
+    counts = {}
+    cursor.execute('SELECT image_path, audio_path FROM archived_memories')
+    for row in cursor.fetchall():
+        for path in row:
+            match = BLOB_NAME.match(os.path.basename(path)) if path else None
+            if match:
+                counts[match.group(1)] = counts.get(match.group(1), 0) + 1
+    cursor.execute('SELECT sha256 FROM archive_media')
+    known = [sha256 for (sha256,) in cursor.fetchall()]
+    cursor.executemany('UPDATE archive_media SET ref_count = ? WHERE sha256 = ?',
+                       [(counts.get(sha256, 0), sha256) for sha256 in known])
+    cursor.execute('DELETE FROM archive_media WHERE ref_count <= 0')
+
+
+def summary_text(record):
+    """Content prefix plus the recognition description: what archived search matches against"""
+    parts = [(record.get('content') or '')[:SUMMARY_CHARS]]
+    try:
+        recognition = json.loads(record['recognition_data']) if record.get('recognition_data') else None
+    except ValueError:
+        recognition = None
+    if isinstance(recognition, dict) and recognition.get('description'):
+        parts.append(str(recognition['description'])[:SUMMARY_CHARS])
+    return ' '.join(part for part in parts if part) or None
+
+
+class Archive:
+    """
+    Segment files under one directory. Writers must hold the database write
+    lock (BEGIN IMMEDIATE) while appending, which is what keeps two server
+    processes from appending to the same segment at once. Reads map each
+    segment once and slice blocks and media straight out of the mapping.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._maps = {}
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self.block_reads = 0
+        self.block_cache_hits = 0
+        self.media_reads = 0
+
+    def segment_path(self, segment):
+        return self.root / f'segment-{segment:06d}.seg'
+
+    def segments(self):
+        """Segment numbers on disk, oldest first"""
+        if not self.root.is_dir():
+            return []
+        return sorted(int(m.group(1)) for m in map(SEGMENT_NAME.match, os.listdir(self.root)) if m)
+
+    # Writing
+
+    def _open_segment(self, incoming):
+        """(segment, file) to append `incoming` bytes to, starting a new segment when the last is full"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        existing = self.segments()
+        segment = existing[-1] if existing else 1
+        path = self.segment_path(segment)
+        if path.exists() and path.stat().st_size and path.stat().st_size + incoming > SEGMENT_MAX_BYTES:
+            segment += 1
+            path = self.segment_path(segment)
+        return segment, open(path, 'ab')
+
+    def append(self, cursor, records, media):
+        """
+        Write `records` (dicts of RECORD_FIELDS, in id order) and any media not
+        archived yet, then add their index and summary rows on `cursor`. The
+        caller commits, in the same transaction that deletes the hot rows.
+        `media` is a list of (sha256, kind, path), one per reference a record
+        makes to a blob.
+        """
+        blocks = [records[i:i + BLOCK_ROWS] for i in range(0, len(records), BLOCK_ROWS)]
+        payloads = [zlib.compress(json.dumps(block, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+                                  COMPRESSION_LEVEL) for block in blocks]
+        references = {}
+        for sha256, _, _ in media:
+            references[sha256] = references.get(sha256, 0) + 1
+        pending_media, seen = [], set()
+        for sha256, kind, path in media:
+            if sha256 in seen:
+                continue
+            seen.add(sha256)
+            cursor.execute('UPDATE archive_media SET ref_count = ref_count + ? WHERE sha256 = ?',
+                           (references[sha256], sha256))
+            if not cursor.rowcount and os.path.isfile(path):
+                pending_media.append((sha256, kind, path, os.path.getsize(path)))
+
+        incoming = sum(map(len, payloads)) + sum(m[3] for m in pending_media)
+        segment, f = self._open_segment(incoming)
+        with f:
+            for sha256, kind, path, size in pending_media:
+                offset = f.tell()
+                with open(path, 'rb') as source:
+                    shutil.copyfileobj(source, f, MEDIA_COPY_CHUNK)
+                cursor.execute('INSERT INTO archive_media (sha256, kind, segment, offset, size, ref_count) '
+                               'VALUES (?, ?, ?, ?, ?, ?)',
+                               (sha256, kind, segment, offset, f.tell() - offset, references[sha256]))
+            placed = []
+            for payload in payloads:
+                placed.append(f.tell())
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+        for block, payload, offset in zip(blocks, payloads, placed):
+            timestamps = [r['timestamp'] for r in block if r['timestamp']]
+            cursor.execute('''
+                INSERT INTO archive_blocks (segment, offset, length, row_count, first_id, last_id,
+                                            first_timestamp, last_timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (segment, offset, len(payload), len(block), block[0]['id'], block[-1]['id'],
+                  min(timestamps, default=None), max(timestamps, default=None)))
+            block_id = cursor.lastrowid
+            cursor.executemany('''
+                INSERT INTO archived_memories (id, type, name, timestamp, summary, image_path, audio_path, block_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(r['id'], r['type'], r['name'], r['timestamp'], summary_text(r), r['image_path'],
+                   r['audio_path'], block_id) for r in block])
+        return {'blocks': len(blocks), 'media': len(pending_media), 'bytes': incoming, 'segment': segment}
+
+    def release(self, cursor, records):
+        """
+        Drop the media references of archived `records` whose summary rows are
+        being deleted; blobs left unreferenced lose their archive_media row
+        """
+        for record in records:
+            for kind in ('image', 'audio'):
+                sha256 = record.get(f'{kind}_hash')
+                if not sha256:
+                    continue
+                cursor.execute('UPDATE archive_media SET ref_count = ref_count - 1 WHERE sha256 = ?', (sha256,))
+                cursor.execute('DELETE FROM archive_media WHERE sha256 = ? AND ref_count <= 0', (sha256,))
+
+    # Reading
+
+    def _view(self, segment, offset, length):
+        """A memoryview of bytes in a segment, remapping it if it has grown since it was mapped"""
+        with self._lock:
+            mapped = self._maps.get(segment)
+            if mapped is None or offset + length > len(mapped):
+                if mapped is not None:
+                    mapped.close()
+                with open(self.segment_path(segment), 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = mapped
+            return memoryview(mapped)[offset:offset + length]
+
+    def read_block(self, block_id, segment, offset, length):
+        """{id: record} of one block, decompressed once and kept in a small LRU"""
+        with self._lock:
+            records = self._blocks.get(block_id)
+            if records is not None:
+                self._blocks.move_to_end(block_id)
+                self.block_cache_hits += 1
+                return records
+        records = {r['id']: r for r in json.loads(zlib.decompress(self._view(segment, offset, length)))}
+        with self._lock:
+            self.block_reads += 1
+            self._blocks[block_id] = records
+            while len(self._blocks) > BLOCK_CACHE_BLOCKS:
+                self._blocks.popitem(last=False)
+        return records
+
+    def get_records(self, cursor, ids):
+        """{id: record} for the archived ids among `ids`; each block is read once"""
+        ids = list(ids)
+        if not ids:
+            return {}
+        cursor.execute(f'''
+            SELECT a.id, b.id AS block_id, b.segment, b.offset, b.length
+            FROM archived_memories a JOIN archive_blocks b ON b.id = a.block_id
+            WHERE a.id IN ({','.join('?' * len(ids))})
+        ''', ids)
+        found, by_block = {}, {}
+        for row in cursor.fetchall():
+            by_block.setdefault(tuple(row)[1:], []).append(row[0])
+        for location, wanted in by_block.items():
+            records = self.read_block(*location)
+            found.update((memory_id, records[memory_id]) for memory_id in wanted if memory_id in records)
+        return found
+
+    def iter_records(self, cursor, since=None, until=None):
+        """
+        Every live archived record, block by block in id order. `since` and
+        `until` bound the timestamps; the sparse index skips blocks that
+        cannot hold a match without decompressing them.
+        """
+        cursor.execute('''
+            SELECT id, segment, offset, length FROM archive_blocks
+            WHERE (? IS NULL OR last_timestamp >= ?) AND (? IS NULL OR first_timestamp <= ?)
+            ORDER BY first_id, id
+        ''', (since, since, until, until))
+        for block in cursor.fetchall():
+            live = {row[0] for row in cursor.execute('SELECT id FROM archived_memories WHERE block_id = ?',
+                                                     (block[0],))}
+            for memory_id, record in sorted(self.read_block(*block).items()):
+                if memory_id not in live:
+                    continue
+                if (since and (record['timestamp'] or '') < since) or (until and (record['timestamp'] or '') > until):
+                    continue
+                yield record
+
+    def read_media(self, cursor, sha256):
+        """The archived bytes of a blob as a memoryview, or None unless an archived memory references it"""
+        cursor.execute('SELECT segment, offset, size FROM archive_media WHERE sha256 = ? AND ref_count > 0',
+                       (sha256,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            self.media_reads += 1
+        return self._view(*row)
+
+    def stats(self):
+        segments = self.segments()
+        with self._lock:
+            return {
+                'segments': len(segments),
+                'segment_bytes': sum(self.segment_path(s).stat().st_size for s in segments),
+                'mapped_segments': len(self._maps),
+                'cached_blocks': len(self._blocks),
+                'block_reads': self.block_reads,
+                'block_cache_hits': self.block_cache_hits,
+                'media_reads': self.media_reads,
+            }
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass  # a view is still being served; the mapping goes with it
+            self._maps.clear()
+            self._blocks.clear()
+
+
+def database_size(conn):
+    """File bytes and the bytes of pages actually in use (the rest is free list left by deletes)"""
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    pages = conn.execute('PRAGMA page_count').fetchone()[0]
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return {'file_bytes': page_size * pages, 'used_bytes': page_size * (pages - free)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move old memories to compressed archive segments')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='archive memories older than a number of days')
+    run.add_argument('--older-than-days', type=float, default=ARCHIVE_AFTER_DAYS)
+    run.add_argument('--vacuum', action='store_true', help='give the freed pages back to the filesystem')
+    stats = commands.add_parser('stats', help='archive and database sizes')
+    dump = commands.add_parser('dump', help='print archived memories as NDJSON')
+    dump.add_argument('--since', help='first timestamp, e.g. 2025-01-01')
+    dump.add_argument('--until', help='last timestamp, e.g. 2025-06-30 23:59:59')
+    for command in (run, stats, dump):
+        command.add_argument('--user', help="a user's shard instead of the default database")
+    args = parser.parse_args()
+
+    import memory_server as ms  # memory_server imports this module for its routes
+
+    with ms.get_router().use(args.user) if args.user else nullcontext():
+        ms.init_db()
+        with ms.get_pool().connection() as conn:
+            if args.command == 'run':
+                before = database_size(conn)
+                result = ms.archive_old_memories(conn, args.older_than_days)
+                if args.vacuum:
+                    conn.execute('VACUUM')
+                after = database_size(conn)
+                print(f"🧊 Archived {result['archived']} memories into {result['blocks']} blocks "
+                      f"({result['media']} media files, {result['bytes']} bytes)")
+                print(f"💾 Database {before['file_bytes']} → {after['file_bytes']} bytes "
+                      f"({before['used_bytes']} → {after['used_bytes']} in use)")
+            elif args.command == 'stats':
+                archived = conn.execute('SELECT COUNT(*) FROM archived_memories').fetchone()[0]
+                hot = conn.execute('SELECT COUNT(*) FROM memories').fetchone()[0]
+                print(json.dumps(dict(ms.get_archive().stats(), hot_memories=hot, archived_memories=archived,
+                                      **database_size(conn)), indent=2))
+            else:
+                for record in ms.get_archive().iter_records(conn.cursor(), args.since, args.until):
+                    sys.stdout.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Memory DB
+Shared SQLite connection pool and group-commit writer for memory_server.py
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+# Connection tuning
+POOL_SIZE = 8              # idle connections kept open for reuse
+BUSY_TIMEOUT = 10.0        # seconds to wait on a locked database instead of failing
+STATEMENT_CACHE = 256      # prepared statements cached per connection
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',       # readers don't block the writer
+    'PRAGMA synchronous=NORMAL',     # safe with WAL, one fsync per checkpoint
+    'PRAGMA cache_size=-16000',      # 16 MB page cache per connection
+    'PRAGMA mmap_size=268435456',    # 256 MB memory-mapped reads
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+class ConnectionPool:
+    """Thread-safe pool of tuned SQLite connections for one database file"""
+
+    def __init__(self, db_path, max_size=POOL_SIZE, factory=sqlite3.Connection):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.factory = factory
+        self._idle = []
+        self._lock = threading.Lock()
+        self._created = 0
+        self._reused = 0
+        self._closed = 0
+        self._in_use = 0
+        self._retired = False
+
+    def _connect(self):
+        """Open a new connection with WAL mode and tuned pragmas"""
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT,
+                               check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE,
+                               factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, or open a new one if none are free"""
+        with self._lock:
+            self._in_use += 1
+            if self._idle:
+                self._reused += 1
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._created -= 1
+            raise
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+            if len(self._idle) < self.max_size and not self._retired:
+                self._idle.append(conn)
+                return
+            self._closed += 1
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._closed += len(idle)
+        for conn in idle:
+            conn.close()
+
+    def retire(self):
+        """Close idle connections now and borrowed ones as they come back"""
+        with self._lock:
+            self._retired = True
+        self.close_all()
+
+    def stats(self):
+        """Pool counters for /health"""
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'max_idle': self.max_size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'created': self._created,
+                'reused': self._reused,
+                'closed': self._closed,
+            }
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread that merges concurrent write jobs into one
+    transaction. A job is a callable taking a cursor; each runs inside its
+    own SAVEPOINT so one failure doesn't roll back its neighbours, and the
+    whole group is committed once after waiting at most `window` seconds
+    for more jobs to arrive.
+    """
+
+    def __init__(self, pool, window=0.005, max_batch=256):
+        self.pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.groups = 0
+        self.jobs = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, job):
+        """Queue a job and return a Future resolved after its group commits"""
+        self.start()
+        future = Future()
+        self._queue.put((job, future))
+        return future
+
+    def close(self):
+        """Stop the writer thread once the jobs already queued have committed"""
+        with self._lock:
+            if self._thread is None:
+                return
+        self._queue.put(None)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Close requested: commit this group, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            results = []
+            try:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('BEGIN IMMEDIATE')
+                    for job, future in batch:
+                        cursor.execute('SAVEPOINT group_job')
+                        try:
+                            results.append((future, job(cursor), None))
+                            cursor.execute('RELEASE group_job')
+                        except Exception as e:
+                            cursor.execute('ROLLBACK TO group_job')
+                            cursor.execute('RELEASE group_job')
+                            results.append((future, None, e))
+                    conn.commit()
+            except Exception as e:
+                # The group itself failed to commit: every job in it failed
+                results = [(future, None, e) for _, future in batch]
+            with self._lock:
+                self.groups += 1
+                self.jobs += len(batch)
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        """Writer counters for /health"""
+        with self._lock:
+            return {
+                'groups': self.groups,
+                'jobs': self.jobs,
+                'avg_group_size': round(self.jobs / self.groups, 2) if self.groups else 0,
+                'queued': self._queue.qsize(),
+            }
@@ -4,14 +4,36 @@ Dr. Chinki Memory Server
 A Flask backend for storing and retrieving memories (text, images, names)
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_file, g, Response, stream_with_context
 from flask_cors import CORS
 import sqlite3
+import threading
 import base64
 import os
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import json
+import re
+import contextvars
+from contextlib import contextmanager
+from memory_db import ConnectionPool, GroupCommitWriter
+import media_store
+import thumbnails
+import embeddings
+import voice_profiles
+import response_cache
+import row_serializer
+import memory_transfer
+import memory_archive
+import change_feed
+import request_metrics
+import tenants
+from backend.engines import memory_engine
+from media_store import MediaStore, BlobCache, UploadTooLarge, file_sha256
+from response_cache import ResponseCache
+from werkzeug.security import safe_join
+import mimetypes
+from functools import lru_cache
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend communication
@@ -21,13 +43,283 @@ DB_PATH = 'memories.db'
 IMAGE_DIR = Path('memory_images')
 AUDIO_DIR = Path('memory_audios')
 
+# Saves: optional group commit merges concurrent single saves into one transaction
+GROUP_COMMIT = False
+GROUP_COMMIT_WINDOW = 0.005  # seconds the writer waits for more saves
+MAX_BATCH_SIZE = 500
+
+# Memory list pagination
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MEMORY_FIELDS = ('id', 'type', 'content', 'image_path', 'name', 'timestamp',
+                 'metadata', 'recognition_data', 'voice_data', 'audio_path')
+
+# Recognition: 'words' (shared-word overlap) or 'embedding' (vector similarity)
+RECOGNITION_MODE = 'words'
+EMBEDDER_SPEC = 'hashing'  # or 'st:<local sentence-transformers model>'
+EMBEDDING_MIN_SIMILARITY = 0.35
+
+# Full-text search (falls back to LIKE if this SQLite build lacks FTS5)
+DEFAULT_SEARCH_LIMIT = 50
+FTS_ENABLED = False
+
 # Create directories if they don't exist
 IMAGE_DIR.mkdir(exist_ok=True)
 AUDIO_DIR.mkdir(exist_ok=True)
 
+# Content-addressed blob stores for memory media
+IMAGE_STORE = MediaStore(IMAGE_DIR, '.jpg', 'image')
+AUDIO_STORE = MediaStore(AUDIO_DIR, '.webm', 'audio')
+
+# In-process LRU for small hot media files (set MEDIA_CACHE_BYTES = 0 to disable)
+MEDIA_CACHE_BYTES = 32 * 1024 * 1024
+MEDIA_CACHE_MAX_ITEM = 256 * 1024
+MEDIA_CACHE = BlobCache(MEDIA_CACHE_BYTES, MEDIA_CACHE_MAX_ITEM)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Serialised list/search/profile responses, dropped whenever a write bumps the
+# data generation (set RESPONSE_CACHE_ENTRIES = 0 to disable)
+RESPONSE_CACHE_ENTRIES = 1024
+RESPONSE_CACHE_BYTES = 16 * 1024 * 1024
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_ENTRIES, RESPONSE_CACHE_BYTES)
+
+# Per-route latency and phase metrics at /metrics (queries slower than
+# request_metrics.SLOW_QUERY_SECONDS are logged); PROFILING_ENABLED lets a
+# request send "X-Profile: 1" to have its stacks sampled into profiles/
+METRICS_ENABLED = True
+PROFILING_ENABLED = False
+
+# Multi-tenant: a request carrying a user id (X-User-Id header or ?user=) is
+# served from that user's own database and media under SHARD_ROOT; requests
+# without one use DB_PATH and the directories above
+TENANTS_ENABLED = True
+SHARD_ROOT = Path('tenants')
+
+_pool = None
+_pool_lock = threading.Lock()
+_embedder = None
+_vector_index = None
+_pending_vectors = contextvars.ContextVar('pending_vectors', default=None)  # see deferred_vectors()
+_voice_index = None
+_writer = None
+_router = None
+_archive = None
+_change_feed = None
+
+def connection_factory():
+    """sqlite3 connection class for new pools: timed when metrics are on"""
+    return request_metrics.TimedConnection if METRICS_ENABLED else sqlite3.Connection
+
+def get_pool():
+    """The current user's shard pool, else the shared pool (reopened if DB_PATH changed)"""
+    shard = tenants.current()
+    if shard is not None:
+        return shard.pool
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.db_path != DB_PATH:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(DB_PATH, factory=connection_factory())
+        return _pool
+
+def get_router():
+    """The per-user shard router, reopened if SHARD_ROOT changed"""
+    global _router
+    with _pool_lock:
+        if _router is None or _router.root != Path(SHARD_ROOT):
+            if _router is not None:
+                _router.close_all()
+            _router = tenants.ShardRouter(SHARD_ROOT, create_shard_schema, factory=connection_factory(),
+                                          on_open=attach_shard_thumbnails, on_close=detach_shard_thumbnails)
+        return _router
+
+def store_for(kind):
+    """The image or audio blob store of the current user's shard, or the default one"""
+    shard = tenants.current()
+    if shard is None:
+        return IMAGE_STORE if kind == 'image' else AUDIO_STORE
+    return shard.image_store if kind == 'image' else shard.audio_store
+
+def media_dir(kind):
+    """The image or audio directory of the current user's shard, or the default one"""
+    shard = tenants.current()
+    if shard is None:
+        return IMAGE_DIR if kind == 'image' else AUDIO_DIR
+    return shard.image_dir if kind == 'image' else shard.audio_dir
+
+def kick_thumbnails():
+    """Wake the thumbnail worker for the database that just queued jobs"""
+    shard = tenants.current()
+    THUMBNAILS.kick(shard.user_id if shard is not None else None)
+
+# Renders thumbnails for new image blobs off the request threads
+THUMBNAILS = thumbnails.ThumbnailWorker(IMAGE_DIR, lambda: get_pool().connection())
+
+def get_writer():
+    """The group-commit writer bound to the current pool"""
+    global _writer
+    shard = tenants.current()
+    if shard is not None:
+        with shard.lock:
+            if shard.writer is None:
+                shard.writer = GroupCommitWriter(shard.pool, window=GROUP_COMMIT_WINDOW)
+            return shard.writer
+    pool = get_pool()
+    with _pool_lock:
+        if _writer is None or _writer.pool is not pool:
+            _writer = GroupCommitWriter(pool, window=GROUP_COMMIT_WINDOW)
+        return _writer
+
+def get_archive():
+    """Cold-tier segments stored next to the current database file"""
+    shard = tenants.current()
+    if shard is not None:
+        with shard.lock:
+            if shard.archive is None:
+                shard.archive = memory_archive.Archive(f'{shard.db_path}.archive')
+            return shard.archive
+    global _archive
+    with _pool_lock:
+        root = Path(f'{DB_PATH}.archive')
+        if _archive is None or _archive.root != root:
+            if _archive is not None:
+                _archive.close()
+            _archive = memory_archive.Archive(root)
+        return _archive
+
+def get_change_feed():
+    """The change-log fan-out for the current database, shared by every subscriber to it"""
+    shard = tenants.current()
+    if shard is not None:
+        with shard.lock:
+            if shard.change_feed is None:
+                shard.change_feed = change_feed.ChangeFeed(shard.pool.connection, MEMORY_FIELDS)
+            return shard.change_feed
+    global _change_feed
+    pool = get_pool()
+    with _pool_lock:
+        if _change_feed is None or _change_feed.connect != pool.connection:
+            if _change_feed is not None:
+                _change_feed.close()
+            _change_feed = change_feed.ChangeFeed(pool.connection, MEMORY_FIELDS)
+        return _change_feed
+
+def get_db():
+    """Borrow a pooled connection for the current request"""
+    if 'db' not in g:
+        g.db_pool = get_pool()
+        g.db = g.db_pool.acquire()
+    return g.db
+
+@app.before_request
+def select_tenant():
+    """Serve the request from the caller's shard when it names a user"""
+    if not TENANTS_ENABLED:
+        return None
+    try:
+        user_id = tenants.parse_user_id(request.headers.get(tenants.USER_HEADER),
+                                        request.args.get(tenants.USER_PARAM))
+    except tenants.InvalidUserId as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if user_id is not None:
+        g.shard = get_router().acquire(user_id)
+        g.shard_token = tenants.activate(g.shard)
+    return None
+
+@app.teardown_request
+def release_tenant(exc):
+    """Give the request's shard back to the router"""
+    shard = g.pop('shard', None)
+    if shard is not None:
+        tenants.deactivate(g.pop('shard_token'))
+        get_router().release(shard)
+
+@app.teardown_appcontext
+def release_db(exc):
+    """Hand the request's connection back to the pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        g.pop('db_pool').release(conn)
+
+@app.before_request
+def start_request_timer():
+    """Start the phase clock for this request"""
+    if METRICS_ENABLED:
+        profile = request_metrics.wants_profile(request.headers.get(request_metrics.PROFILE_HEADER),
+                                                PROFILING_ENABLED)
+        route = request.url_rule.rule if request.url_rule else None
+        g.request_timer = request_metrics.begin(route, request.method, request.path, profile)
+
+@app.after_request
+def report_request_profile(response):
+    """Note the status for the metrics, and where a requested profile was saved"""
+    timer = g.get('request_timer')
+    if timer is not None:
+        g.request_status = response.status_code
+        profile = request_metrics.stop_profile(timer)
+        if profile:
+            path, samples = profile
+            response.headers[request_metrics.PROFILE_HEADER] = f'{path}; samples={samples}'
+            print(f"🔬 Profiled {request.path}: {samples} samples in {path}")
+    return response
+
+@app.teardown_request
+def finish_request_timer(exc):
+    """Record the request; runs after streamed bodies finish, and on unhandled errors"""
+    timer = g.pop('request_timer', None)
+    if timer is not None:
+        request_metrics.finish(timer, g.pop('request_status', 500))
+
 def init_db():
     """Initialize SQLite database with memories table"""
-    conn = sqlite3.connect(DB_PATH)
+    with get_pool().connection() as conn:
+        _create_schema(conn, (store_for('image'), store_for('audio')))
+    print("✅ Database initialized successfully")
+
+def create_shard_schema(shard):
+    """Create a shard's schema the first time this process opens it"""
+    with shard.pool.connection() as conn:
+        _create_schema(conn, (shard.image_store, shard.audio_store))
+
+def attach_shard_thumbnails(shard):
+    """Hand an opened (or reopened) shard's thumbnail jobs to the worker"""
+    with shard.pool.connection() as conn:
+        pending = conn.execute("SELECT 1 FROM thumbnail_jobs WHERE status = 'pending' LIMIT 1").fetchone()
+    THUMBNAILS.add_source(shard.user_id, shard.image_dir,
+                          lambda user_id=shard.user_id: get_router().connection(user_id))
+    if pending:
+        THUMBNAILS.kick(shard.user_id)
+
+def detach_shard_thumbnails(shard):
+    """Stop tracking an evicted shard; jobs it still has are picked up when it reopens"""
+    THUMBNAILS.remove_source(shard.user_id)
+
+def recount_blobs(cursor, stores):
+    """
+    Set media_blobs ref_counts from the hashes memories reference, per kind,
+    adding the row for a file whose bytes another kind's row already claimed.
+    Blobs nobody uses are left at 0, as verify_database.py --fix leaves them.
+    """
+    cursor.execute('UPDATE media_blobs SET ref_count = 0')
+    for store in stores:
+        cursor.execute(f'''
+            SELECT {store.kind}_hash, COUNT(*) FROM memories
+            WHERE {store.kind}_hash IS NOT NULL GROUP BY {store.kind}_hash
+        ''')
+        for sha256, count in cursor.fetchall():
+            path = store.path_for(sha256)
+            try:
+                size = path.stat().st_size
+            except OSError:
+                continue  # verify_database.py reports the missing file
+            cursor.execute('''
+                INSERT INTO media_blobs (sha256, kind, path, size, ref_count) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(sha256, kind) DO UPDATE SET ref_count = excluded.ref_count
+            ''', (sha256, store.kind, str(path), size, count))
+
+def _create_schema(conn, stores):
+    """Create tables, migrate columns and build indexes (stores: the database's image and audio MediaStores)"""
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -41,7 +333,10 @@ def init_db():
             metadata TEXT,
             recognition_data TEXT,
             voice_data TEXT,
-            audio_path TEXT
+            audio_path TEXT,
+            image_hash TEXT,
+            audio_hash TEXT,
+            recognition_embedding BLOB
         )
     ''')
     
@@ -80,138 +375,712 @@ def init_db():
     except sqlite3.OperationalError:
         pass
     
+    # Content hashes of the media blobs a memory references, and the
+    # float32 embedding of its recognition description
+    for column, column_type in (('image_hash', 'TEXT'), ('audio_hash', 'TEXT'), ('recognition_embedding', 'BLOB')):
+        try:
+            cursor.execute(f'ALTER TABLE memories ADD COLUMN {column} {column_type}')
+            print(f"✅ Added {column} column to existing table")
+        except sqlite3.OperationalError:
+            pass
+    if media_store.create_schema(cursor, stores):
+        recount_blobs(cursor, stores)
+        print("✅ Keyed media_blobs by content hash and kind")
+    thumbnails.create_schema(cursor)
+    response_cache.create_schema(cursor)
+    memory_engine.create_schema(cursor)
+    memory_archive.create_schema(cursor)
+    change_feed.create_schema(cursor)
+    
+    # Speaker profiles for voice recognition, backfilled once from voice_data rows
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'voice_profiles'")
+    voice_existed = cursor.fetchone() is not None
+    voice_profiles.create_schema(cursor)
+    if not voice_existed:
+        cursor.execute('SELECT id, name, voice_data FROM memories WHERE voice_data IS NOT NULL ORDER BY id')
+        backfill = cursor.fetchall()
+        for memory_id, name, voice_json in backfill:
+            index_voice(cursor, memory_id, name, json.loads(voice_json))
+        if backfill:
+            print(f"✅ Built voice profiles from {len(backfill)} existing samples")
+    
     # Create index for faster searches
     cursor.execute('''
         CREATE INDEX IF NOT EXISTS idx_name ON memories(name)
     ''')
+    # Composite (timestamp, id) index so each list page is an index range scan
+    cursor.execute('DROP INDEX IF EXISTS idx_timestamp')
     cursor.execute('''
-        CREATE INDEX IF NOT EXISTS idx_timestamp ON memories(timestamp)
+        CREATE INDEX IF NOT EXISTS idx_timestamp_id ON memories(timestamp, id)
     ''')
     
+    # FTS5 mirror of name/content/recognition_data, kept in sync by triggers
+    global FTS_ENABLED
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'memories_fts'")
+    fts_existed = cursor.fetchone() is not None
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+                name, content, recognition_data,
+                content='memories', content_rowid='id'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS memories_fts_insert AFTER INSERT ON memories BEGIN
+                INSERT INTO memories_fts (rowid, name, content, recognition_data)
+                VALUES (new.id, new.name, new.content, new.recognition_data);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS memories_fts_delete AFTER DELETE ON memories BEGIN
+                INSERT INTO memories_fts (memories_fts, rowid, name, content, recognition_data)
+                VALUES ('delete', old.id, old.name, old.content, old.recognition_data);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS memories_fts_update
+            AFTER UPDATE OF name, content, recognition_data ON memories BEGIN
+                INSERT INTO memories_fts (memories_fts, rowid, name, content, recognition_data)
+                VALUES ('delete', old.id, old.name, old.content, old.recognition_data);
+                INSERT INTO memories_fts (rowid, name, content, recognition_data)
+                VALUES (new.id, new.name, new.content, new.recognition_data);
+            END
+        ''')
+        if not fts_existed:
+            # One-shot migration: index every memory saved before FTS existed
+            cursor.execute("INSERT INTO memories_fts (memories_fts) VALUES ('rebuild')")
+            print("✅ Built full-text search index")
+        FTS_ENABLED = True
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ FTS5 unavailable, search falls back to LIKE: {e}")
+        FTS_ENABLED = False
+    
+    # Inverted index for recognition: token -> memory_id postings
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recognition_index (
+            token TEXT NOT NULL,
+            memory_id INTEGER NOT NULL,
+            PRIMARY KEY (token, memory_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_recognition_memory ON recognition_index(memory_id)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recognition_terms (
+            memory_id INTEGER PRIMARY KEY,
+            term_count INTEGER NOT NULL
+        )
+    ''')
+    
+    # Backfill postings for memories saved before the index existed
+    cursor.execute('''
+        SELECT id, recognition_data FROM memories
+        WHERE recognition_data IS NOT NULL
+        AND id NOT IN (SELECT memory_id FROM recognition_terms)
+    ''')
+    backfill = cursor.fetchall()
+    for memory_id, recognition_json in backfill:
+        index_recognition(cursor, memory_id, json.loads(recognition_json))
+    if backfill:
+        print(f"✅ Indexed recognition data for {len(backfill)} existing memories")
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS index_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
     conn.commit()
-    conn.close()
-    print("✅ Database initialized successfully")
+    sync_recognition_embeddings(conn)
 
-def save_image(image_base64, memory_id):
-    """Save base64 image to filesystem"""
+def recognition_tokens(description):
+    """Split a recognition description into the word set used for matching"""
+    return set(description.lower().split())
+
+def recognition_text(recognition_data):
+    """Description plus listed features: the text embedded for recognition"""
+    if not isinstance(recognition_data, dict):
+        return ''
+    features = recognition_data.get('features') or []
+    return ' '.join([recognition_data.get('description', '') or ''] + [str(f) for f in features])
+
+def index_recognition(cursor, memory_id, recognition_data):
+    """Add a memory's recognition description to the inverted index and vector index"""
+    description = ''
+    if isinstance(recognition_data, dict):
+        description = recognition_data.get('description', '') or ''
+    tokens = recognition_tokens(description)
+    
+    cursor.execute('INSERT OR REPLACE INTO recognition_terms (memory_id, term_count) VALUES (?, ?)',
+                   (memory_id, len(tokens)))
+    cursor.executemany('INSERT OR IGNORE INTO recognition_index (token, memory_id) VALUES (?, ?)',
+                       [(token, memory_id) for token in tokens])
+    
+    if embeddings.np is not None:
+        blob = embeddings.to_blob(get_embedder().embed([recognition_text(recognition_data)])[0])
+        cursor.execute('UPDATE memories SET recognition_embedding = ? WHERE id = ?', (blob, memory_id))
+        pending = _pending_vectors.get()
+        if pending is not None:
+            pending.append((get_vector_index(), memory_id, blob))
+        # Outside deferred_vectors() nothing is appended; the startup sync
+        # rebuilds the vector file from the column
+
+@contextmanager
+def deferred_vectors():
+    """
+    Hold back the vector-file appends of memories indexed in the block; call
+    the yielded function once their transaction has committed. SQLite hands
+    a rolled-back row's id out again, so a vector appended before the commit
+    could end up pointing at someone else's memory.
+    """
+    pending = []
+    token = _pending_vectors.set(pending)
     try:
-        # Remove data URL prefix if present
-        if ',' in image_base64:
-            image_base64 = image_base64.split(',')[1]
-        
-        # Decode base64 to bytes
-        image_data = base64.b64decode(image_base64)
-        
-        # Generate filename
-        filename = f"memory_{memory_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-        filepath = os.path.join(IMAGE_DIR, filename)
+        yield lambda: append_vectors(pending)
+    finally:
+        _pending_vectors.reset(token)
+
+def append_vectors(pending):
+    for index, memory_id, blob in pending:
+        index.append(memory_id, blob)
+    pending.clear()
+
+def index_voice(cursor, memory_id, name, voice_data):
+    """Fold a memory's speech sample into its speaker's voice profile"""
+    if not name or not isinstance(voice_data, dict):
+        return
+    # Client-supplied JSON: anything but {'speech_patterns': {'sample_text': str}} carries no sample
+    patterns = voice_data.get('speech_patterns')
+    sample = patterns.get('sample_text') if isinstance(patterns, dict) else None
+    if isinstance(sample, str) and sample:
+        voice_profiles.add_sample(cursor, name, sample, memory_id)
+
+def get_voice_index():
+    """The in-memory voice profile matrix for the current database"""
+    shard = tenants.current()
+    if shard is not None:
+        with shard.lock:
+            if shard.voice_index is None:
+                shard.voice_index = voice_profiles.VoiceIndex()
+            return shard.voice_index
+    global _voice_index
+    with _pool_lock:
+        if _voice_index is None or _voice_index.db_path != DB_PATH:
+            _voice_index = voice_profiles.VoiceIndex()
+            _voice_index.db_path = DB_PATH
+        return _voice_index
+
+def unindex_recognition(cursor, memory_id):
+    """Remove a memory's postings from the inverted index"""
+    cursor.execute('DELETE FROM recognition_index WHERE memory_id = ?', (memory_id,))
+    cursor.execute('DELETE FROM recognition_terms WHERE memory_id = ?', (memory_id,))
+    if cursor.rowcount and embeddings.np is not None:
+        get_vector_index().mark_deleted()
+
+def get_embedder():
+    """The process-wide recognition embedder"""
+    global _embedder
+    if _embedder is None:
+        _embedder = embeddings.load_embedder(EMBEDDER_SPEC)
+    return _embedder
+
+def get_vector_index():
+    """Memory-mapped recognition vectors stored next to the current database file"""
+    shard = tenants.current()
+    if shard is not None:
+        with shard.lock:
+            if shard.vector_index is None:
+                shard.vector_index = embeddings.VectorIndex(f'{shard.db_path}.recognition', get_embedder().dim)
+            return shard.vector_index
+    global _vector_index
+    with _pool_lock:
+        prefix = f'{DB_PATH}.recognition'
+        if _vector_index is None or _vector_index.vectors_path != f'{prefix}.f32':
+            _vector_index = embeddings.VectorIndex(prefix, get_embedder().dim)
+        return _vector_index
+
+def sync_recognition_embeddings(conn):
+    """Embed memories that have no vector yet and rebuild the vector file if it drifted"""
+    if embeddings.np is None:
+        print("⚠️ NumPy not installed, embedding recognition disabled")
+        return
+    cursor = conn.cursor()
+    embedder = get_embedder()
+    
+    # A different embedder means every stored vector is stale
+    cursor.execute("SELECT value FROM index_meta WHERE key = 'recognition_embedder'")
+    row = cursor.fetchone()
+    if row is None or row[0] != embedder.name:
+        cursor.execute('UPDATE memories SET recognition_embedding = NULL')
+        cursor.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('recognition_embedder', ?)",
+                       (embedder.name,))
+    
+    embedded = 0
+    while True:
+        cursor.execute('''
+            SELECT id, recognition_data FROM memories
+            WHERE recognition_data IS NOT NULL AND recognition_embedding IS NULL
+            LIMIT 512
+        ''')
+        batch = cursor.fetchall()
+        if not batch:
+            break
+        vectors = embedder.embed([recognition_text(json.loads(r['recognition_data'])) for r in batch])
+        cursor.executemany('UPDATE memories SET recognition_embedding = ? WHERE id = ?',
+                           [(embeddings.to_blob(v), r['id']) for v, r in zip(vectors, batch)])
+        embedded += len(batch)
+    conn.commit()
+    if embedded:
+        print(f"✅ Embedded recognition data for {embedded} memories")
+    
+    cursor.execute('SELECT COUNT(*) FROM memories WHERE recognition_embedding IS NOT NULL')
+    index = get_vector_index()
+    if embedded or cursor.fetchone()[0] != len(index):
+        index.rebuild(conn.execute('''
+            SELECT id, recognition_embedding FROM memories
+            WHERE recognition_embedding IS NOT NULL ORDER BY id
+        '''))
+
+def parse_fields(fields_param):
+    """Resolve a fields= projection; id and timestamp are always included for paging"""
+    if not fields_param:
+        return list(MEMORY_FIELDS)
+    requested = [f.strip() for f in fields_param.split(',') if f.strip()]
+    if any(f not in MEMORY_FIELDS for f in requested):
+        return None
+    return [f for f in MEMORY_FIELDS if f in requested or f in ('id', 'timestamp')]
+
+def encode_cursor(timestamp, memory_id):
+    """Opaque next-page token for keyset pagination on (timestamp, id)"""
+    raw = json.dumps([timestamp, memory_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; raises ValueError on a malformed token"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        timestamp, memory_id = json.loads(raw)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(memory_id, int):
+        raise ValueError('Invalid cursor')
+    return timestamp, memory_id
+
+def build_fts_query(query):
+    """Turn free user text into a safe FTS5 expression: every word as a quoted prefix term"""
+    terms = re.findall(r'\w+', query.lower())
+    return ' '.join('"' + term + '"*' for term in terms)
+
+def stage_base64(store, encoded, kind):
+    """Decode a base64 image/audio into the store's staging area, or None on failure"""
+    try:
+        with request_metrics.phase('decode'):
+            return store.stage_base64(encoded)
+    except Exception as e:
+        print(f"❌ Error saving {kind}: {e}")
+        return None
+
+def attach_blob(cursor, memory_id, kind, staged):
+    """Point a memory at a staged blob, releasing the blob or file it used before"""
+    store = store_for(kind)
+    cursor.execute(f'SELECT {kind}_path, {kind}_hash FROM memories WHERE id = ?', (memory_id,))
+    previous = cursor.fetchone()
+    
+    with request_metrics.phase('file'):
+        path = store.commit(cursor, staged)
+    # Images keep the directory prefix, audio stores just the filename (as before)
+    stored_path = str(path) if kind == 'image' else path.name
+    cursor.execute(f'UPDATE memories SET {kind}_path = ?, {kind}_hash = ? WHERE id = ?',
+                   (stored_path, staged.sha256, memory_id))
+    if kind == 'image':
+        thumbnails.queue_job(cursor, staged.sha256)
+    
+    if previous and previous[1] != staged.sha256:
+        release_media(cursor, kind, previous[0], previous[1])
+    return stored_path
+
+def release_media(cursor, kind, stored_path, sha256):
+    """Drop a memory's reference to its image/audio; call collect_media() after committing"""
+    if sha256:
+        if store_for(kind).release(cursor, sha256) and kind == 'image':
+            thumbnails.delete_job(cursor, sha256)
+    elif stored_path:
+        # Files saved before the blob store are owned by a single memory
+        try:
+            os.remove(stored_path if kind == 'image' else os.path.join(media_dir('audio'), stored_path))
+        except OSError:
+            pass
+
+def collect_media(conn):
+    """Unlink blobs (and their thumbnails) whose last reference went in a committed transaction"""
+    image_dir = media_dir('image')
+    try:
+        store_for('image').collect(conn, lambda sha256: thumbnails.remove_thumbnails(image_dir, sha256))
+        store_for('audio').collect(conn)
+    except sqlite3.Error as e:
+        # The write itself committed; the files stay queued for the next collect
+        print(f"⚠️ Could not unlink released media yet: {e}")
+
+def parse_memory(data):
+    """Pull the save fields out of one JSON memory payload"""
+    return {
+        'text': data.get('text', ''),
+        'image': data.get('image', ''),
+        'audio': data.get('audio', ''),
+        'name': data.get('name', 'Unnamed Memory'),
+        'metadata': data.get('metadata', {}),
+        'recognition_data': data.get('recognition_data', None),
+        'voice_data': data.get('voice_data', None),
+    }
+
+def insert_memory(cursor, memory, image_blob=None, audio_blob=None):
+    """Insert one memory with its final media paths in a single statement"""
+    image_path = audio_path = None
+    if image_blob:
+        image_path = str(store_for('image').commit(cursor, image_blob))
+        thumbnails.queue_job(cursor, image_blob.sha256)
+    if audio_blob:
+        # Audio rows keep just the filename (as before)
+        audio_path = store_for('audio').commit(cursor, audio_blob).name
+    
+    # Imports carry the original type and timestamp; new saves get derived ones
+    memory_type = memory.get('type') or memory_type_for(memory['text'], bool(image_blob), bool(audio_blob))
+    recognition_data = memory['recognition_data']
+    voice_data = memory['voice_data']
+    cursor.execute('''
+        INSERT INTO memories (type, timestamp, content, name, metadata, recognition_data, voice_data,
+                              image_path, image_hash, audio_path, audio_hash)
+        VALUES (?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (memory_type, memory.get('timestamp'), memory['text'], memory['name'], json.dumps(memory['metadata']),
+          json.dumps(recognition_data) if recognition_data else None,
+          json.dumps(voice_data) if voice_data else None,
+          image_path, image_blob.sha256 if image_blob else None,
+          audio_path, audio_blob.sha256 if audio_blob else None))
+    
+    memory_id = cursor.lastrowid
+    if recognition_data:
+        index_recognition(cursor, memory_id, recognition_data)
+    if voice_data:
+        index_voice(cursor, memory_id, memory['name'], voice_data)
+    change_feed.log_change(cursor, 'insert', [memory_id])
+    response_cache.bump_generation(cursor)
+    return memory_id
+
+def memory_type_for(text, has_image, has_audio):
+    """Classify a memory by the content it carries"""
+    if has_image and text:
+        return 'mixed'
+    elif has_image:
+        return 'image'
+    elif has_audio:
+        return 'audio'
+    return 'text'
+
+# Route bodies are plain functions shared with the ASGI server (backend/main.py):
+# each takes a pooled connection plus already-parsed request values and
+# returns (payload, status), so both servers answer with the same shapes.
+
+def respond(result):
+    """Flask response for a (payload, status) pair"""
+    payload, status = result
+    return Response(dump_json(payload), status=status, mimetype='application/json')
+
+def dump_json(payload):
+    """Compact UTF-8 JSON body (orjson when installed), with RawJSON columns spliced in undecoded"""
+    with request_metrics.phase('serialize'):
+        return row_serializer.encode(payload)
+
+def cached_read(conn, key, handler, *args):
+    """
+    (body, status, etag) for a read handler, served from RESPONSE_CACHE while
+    the data generation is unchanged. The generation is read before the
+    data, so an entry can only ever be newer than its generation, never staler.
+    Keys are per shard, since each user's database has its own generation.
+    """
+    shard = tenants.current()
+    key = (shard.user_id if shard is not None else None, *key)
+    generation = response_cache.read_generation(conn)
+    cached = RESPONSE_CACHE.get(key, generation)
+    if cached is not None:
+        return cached
+    payload, status = handler(conn, *args)
+    body = dump_json(payload)
+    etag = response_cache.body_etag(body)
+    if status == 200:
+        RESPONSE_CACHE.put(key, generation, body, status, etag)
+    return body, status, etag
+
+def respond_cached(entry):
+    """Flask response for a cached_read entry, answering If-None-Match with 304"""
+    body, status, etag = entry
+    if status == 200 and request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, status=status, mimetype='application/json')
+    response.set_etag(etag)
+    # Always revalidate: the ETag makes an unchanged list a cheap 304
+    response.cache_control.no_cache = True
+    return response
+
+def parse_int(value, default=None):
+    """Integer query parameter, or default when missing or malformed"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def handle_save_memory(conn, data):
+    """Save a new memory from a JSON payload"""
+    image_blob = audio_blob = None
+    try:
+        memory = parse_memory(data)
+        
+        # Decode media before taking the write lock
+        image_blob = stage_base64(store_for('image'), memory['image'], 'image') if memory['image'] else None
+        audio_blob = stage_base64(store_for('audio'), memory['audio'], 'audio') if memory['audio'] else None
+        
+        with deferred_vectors() as append_committed_vectors:
+            if GROUP_COMMIT:
+                # Shares one transaction with whatever other saves arrive in the window;
+                # the job runs in this request's context so it sees the same shard (and
+                # queues its vector here, appended once the group has committed)
+                context = contextvars.copy_context()
+                memory_id = get_writer().submit(
+                    lambda cursor: context.run(insert_memory, cursor, memory, image_blob, audio_blob)).result()
+            else:
+                cursor = conn.cursor()
+                memory_id = insert_memory(cursor, memory, image_blob, audio_blob)
+                conn.commit()
+            append_committed_vectors()
         
-        # Save image
-        with open(filepath, 'wb') as f:
-            f.write(image_data)
+        if image_blob:
+            kick_thumbnails()
+        if audio_blob:
+            print(f"✅ Audio saved: {audio_blob.sha256}.webm")
         
-        return filepath
+        return {
+            'success': True,
+            'message': 'Memory saved successfully, Boss Jaan! 💚',
+            'memory_id': memory_id,
+            'name': memory['name']
+        }, 201
+    
     except Exception as e:
-        print(f"❌ Error saving image: {e}")
-        return None
+        print(f"❌ Error saving memory: {e}")
+        return {
+            'success': False,
+            'message': f'Error saving memory: {str(e)}'
+        }, 500
+    finally:
+        for blob in (image_blob, audio_blob):
+            if blob:
+                blob.discard()
 
-@app.route('/api/memory/save', methods=['POST'])
-def save_memory():
-    """Save a new memory to database"""
+def handle_save_batch(conn, data):
+    """Save many memories in one transaction"""
+    staged = []
     try:
-        data = request.json
-        
-        text = data.get('text', '')
-        image_base64 = data.get('image', '')
-        audio_base64 = data.get('audio', '')
-        name = data.get('name', 'Unnamed Memory')
-        metadata = data.get('metadata', {})
-        recognition_data = data.get('recognition_data', None)
-        voice_data = data.get('voice_data', None)
-        
-        # Determine memory type
-        if image_base64 and text:
-            memory_type = 'mixed'
-        elif image_base64:
-            memory_type = 'image'
-        elif audio_base64:
-            memory_type = 'audio'
-        else:
-            memory_type = 'text'
+        items = (data or {}).get('memories', [])
+        if not isinstance(items, list) or not items:
+            return {
+                'success': False,
+                'message': 'memories must be a non-empty list'
+            }, 400
+        if len(items) > MAX_BATCH_SIZE:
+            return {
+                'success': False,
+                'message': f'At most {MAX_BATCH_SIZE} memories per batch'
+            }, 413
+        
+        # Decode every memory's media before taking the write lock
+        batch = []
+        for item in items:
+            memory = parse_memory(item)
+            image_blob = stage_base64(store_for('image'), memory['image'], 'image') if memory['image'] else None
+            audio_blob = stage_base64(store_for('audio'), memory['audio'], 'audio') if memory['audio'] else None
+            staged += [blob for blob in (image_blob, audio_blob) if blob]
+            batch.append((memory, image_blob, audio_blob))
         
-        # Insert into database
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
+        with deferred_vectors() as append_committed_vectors:
+            memory_ids = [insert_memory(cursor, memory, image_blob, audio_blob)
+                          for memory, image_blob, audio_blob in batch]
+            conn.commit()
+            append_committed_vectors()
         
-        cursor.execute('''
-            INSERT INTO memories (type, content, name, metadata, recognition_data, voice_data, audio_path)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (memory_type, text, name, json.dumps(metadata), json.dumps(recognition_data) if recognition_data else None, json.dumps(voice_data) if voice_data else None, None))
+        if any(image_blob for _, image_blob, _ in batch):
+            kick_thumbnails()
         
-        memory_id = cursor.lastrowid
+        return {
+            'success': True,
+            'message': f'{len(memory_ids)} memories saved successfully, Boss Jaan! 💚',
+            'count': len(memory_ids),
+            'memory_ids': memory_ids
+        }, 201
+    
+    except Exception as e:
+        print(f"❌ Error saving memory batch: {e}")
+        return {
+            'success': False,
+            'message': f'Error saving memory batch: {str(e)}'
+        }, 500
+    finally:
+        for blob in staged:
+            blob.discard()
+
+def upload_fields(form):
+    """Memory fields from a multipart form; raises ValueError on bad JSON fields"""
+    return {
+        'text': form.get('text', ''),
+        'name': form.get('name', 'Unnamed Memory'),
+        'metadata': json.loads(form.get('metadata') or '{}'),
+        'recognition_data': json.loads(form['recognition_data']) if form.get('recognition_data') else None,
+        'voice_data': json.loads(form['voice_data']) if form.get('voice_data') else None,
+    }
+
+def handle_upload_memory(conn, memory, staged):
+    """Insert a memory whose image/audio files were already streamed into staging"""
+    cursor = conn.cursor()
+    with deferred_vectors() as append_committed_vectors:
+        memory_id = insert_memory(cursor, memory, staged.get('image'), staged.get('audio'))
         conn.commit()
+        append_committed_vectors()
+    
+    response = {'memory_id': memory_id, 'name': memory['name']}
+    for kind, blob in staged.items():
+        response[f'{kind}_sha256'] = blob.sha256
+        response[f'{kind}_size'] = blob.size
+    if 'image' in staged:
+        kick_thumbnails()
+    
+    return {
+        'success': True,
+        'message': 'Memory saved successfully, Boss Jaan! 💚',
+        **response
+    }, 201
+
+def memory_exists(conn, memory_id):
+    """Cheap existence check before streaming a body to disk"""
+    return conn.execute('SELECT 1 FROM memories WHERE id = ?', (memory_id,)).fetchone() is not None
+
+def handle_attach_media(conn, memory_id, kind, staged):
+    """Point an existing memory at a staged image or audio blob"""
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT content, image_path, audio_path FROM memories WHERE id = ?', (memory_id,))
+    row = cursor.fetchone()
+    if not row:
+        return {
+            'success': False,
+            'message': 'Memory not found'
+        }, 404
+    
+    if kind == 'image':
+        memory_type = memory_type_for(row['content'], True, bool(row['audio_path']))
+    else:
+        memory_type = memory_type_for(row['content'], bool(row['image_path']), True)
+    attach_blob(cursor, memory_id, kind, staged)
+    cursor.execute('UPDATE memories SET type = ? WHERE id = ?', (memory_type, memory_id))
+    change_feed.log_change(cursor, 'update', [memory_id])
+    response_cache.bump_generation(cursor)
+    conn.commit()
+    collect_media(conn)
+    if kind == 'image':
+        kick_thumbnails()
+    
+    return {
+        'success': True,
+        'memory_id': memory_id,
+        'kind': kind,
+        'sha256': staged.sha256,
+        'size': staged.size
+    }, 200
+
+@app.route('/api/memory/save', methods=['POST'])
+def save_memory():
+    """Save a new memory to database"""
+    return respond(handle_save_memory(get_db(), request.get_json(silent=True)))
+
+@app.route('/api/memory/save_batch', methods=['POST'])
+def save_memory_batch():
+    """Save many memories in one transaction"""
+    return respond(handle_save_batch(get_db(), request.get_json(silent=True)))
+
+@app.route('/api/memory/upload', methods=['POST'])
+def upload_memory():
+    """Save a new memory from a multipart form, streaming image/audio files to disk"""
+    staged = {}
+    try:
+        memory = upload_fields(request.form)
+        image_file = request.files.get('image')
+        audio_file = request.files.get('audio')
         
-        # Save image if provided
-        image_filename = None
-        if image_base64:
-            image_filename = save_image(image_base64, memory_id)
-            if image_filename:
-                cursor.execute('UPDATE memories SET image_path = ? WHERE id = ?', (image_filename, memory_id))
-                conn.commit()
-        
-        # Save audio if provided
-        audio_filename = None
-        if audio_base64:
-            try:
-                # Decode base64 audio
-                if ',' in audio_base64:
-                    audio_data = base64.b64decode(audio_base64.split(',')[1])
-                else:
-                    audio_data = base64.b64decode(audio_base64)
-                
-                # Generate filename
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                audio_filename = f'audio_{memory_id}_{timestamp}.webm'
-                audio_path = AUDIO_DIR / audio_filename
-                
-                # Save audio file
-                with open(audio_path, 'wb') as f:
-                    f.write(audio_data)
-                
-                # Update database
-                cursor.execute('UPDATE memories SET audio_path = ? WHERE id = ?', (audio_filename, memory_id))
-                conn.commit()
-                print(f"✅ Audio saved: {audio_filename}")
-            except Exception as e:
-                print(f"❌ Error saving audio: {e}")
-        
-        conn.close()
+        # Stream files into staging before taking the write lock
+        if image_file:
+            staged['image'] = store_for('image').stage_stream(image_file.stream)
+        if audio_file:
+            staged['audio'] = store_for('audio').stage_stream(audio_file.stream)
         
+        return respond(handle_upload_memory(get_db(), memory, staged))
+    
+    except UploadTooLarge as e:
         return jsonify({
-            'success': True,
-            'message': 'Memory saved successfully, Boss Jaan! 💚',
-            'memory_id': memory_id,
-            'name': name
-        }), 201
+            'success': False,
+            'message': str(e)
+        }), 413
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid form field: {str(e)}'
+        }), 400
+    except Exception as e:
+        print(f"❌ Error uploading memory: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Error uploading memory: {str(e)}'
+        }), 500
+    finally:
+        for blob in staged.values():
+            blob.discard()
+
+@app.route('/api/memory/<int:memory_id>/<any(image, audio):kind>', methods=['PUT'])
+def attach_media(memory_id, kind):
+    """Stream a raw request body to disk as a memory's image or audio"""
+    staged = None
+    try:
+        if not memory_exists(get_db(), memory_id):
+            return jsonify({
+                'success': False,
+                'message': 'Memory not found'
+            }), 404
         
+        store = store_for(kind)
+        staged = store.stage_stream(request.stream)
+        return respond(handle_attach_media(get_db(), memory_id, kind, staged))
+    
+    except UploadTooLarge as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 413
     except Exception as e:
-        print(f"❌ Error saving memory: {e}")
+        print(f"❌ Error attaching {kind}: {e}")
         return jsonify({
             'success': False,
-            'message': f'Error saving memory: {str(e)}'
+            'message': f'Error attaching {kind}: {str(e)}'
         }), 500
+    finally:
+        if staged:
+            staged.discard()
 
-@app.route('/api/user/profile', methods=['GET'])
-def get_user_profile():
+def handle_get_profile(conn):
     """Retrieve the user profile"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         cursor.execute('SELECT * FROM user_profile ORDER BY last_updated DESC LIMIT 1')
         row = cursor.fetchone()
-        conn.close()
         
         if row:
             profile = {
@@ -223,19 +1092,17 @@ def get_user_profile():
                 'preferred_language': row['preferred_language'],
                 'personality_type': row['personality_type']
             }
-            return jsonify({'success': True, 'profile': profile}), 200
+            return {'success': True, 'profile': profile}, 200
         else:
-            return jsonify({'success': True, 'profile': None}), 200
-            
+            return {'success': True, 'profile': None}, 200
+    
     except Exception as e:
         print(f"❌ Error retrieving profile: {e}")
-        return jsonify({'success': False, 'message': str(e)}), 500
+        return {'success': False, 'message': str(e)}, 500
 
-@app.route('/api/user/profile', methods=['POST'])
-def save_user_profile():
+def handle_save_profile(conn, data):
     """Save or update the user profile"""
     try:
-        data = request.json
         name = data.get('name')
         interests = data.get('interests', [])
         goals = data.get('goals', [])
@@ -244,7 +1111,6 @@ def save_user_profile():
         preferred_language = data.get('preferred_language')
         personality_type = data.get('personality_type')
         
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         
         # We only keep one main profile for now
@@ -254,124 +1120,375 @@ def save_user_profile():
             INSERT INTO user_profile (name, interests, goals, skill_level, business_type, preferred_language, personality_type)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (name, json.dumps(interests), json.dumps(goals), skill_level, business_type, preferred_language, personality_type))
+        response_cache.bump_generation(cursor)
         
         conn.commit()
-        conn.close()
-        
-        return jsonify({'success': True, 'message': 'Profile updated successfully!'}), 200
         
+        return {'success': True, 'message': 'Profile updated successfully!'}, 200
+    
     except Exception as e:
         print(f"❌ Error saving profile: {e}")
-        return jsonify({'success': False, 'message': str(e)}), 500
+        return {'success': False, 'message': str(e)}, 500
 
-@app.route('/api/memory/list', methods=['GET'])
-def list_memories():
-    """Retrieve all memories"""
+@app.route('/api/user/profile', methods=['GET'])
+def get_user_profile():
+    """Retrieve the user profile"""
+    return respond_cached(cached_read(get_db(), ('profile',), handle_get_profile))
+
+@app.route('/api/user/profile', methods=['POST'])
+def save_user_profile():
+    """Save or update the user profile"""
+    return respond(handle_save_profile(get_db(), request.get_json(silent=True)))
+
+def archived_columns(fields):
+    """SELECT list for archived_memories matching `fields`: columns a summary row lacks come back NULL"""
+    return [f if f in memory_archive.SUMMARY_FIELDS else f'NULL AS {f}' for f in fields]
+
+def hydrate_archived(cursor, rows, fields):
+    """Rows of a hot + archived query as dicts, the archived ones filled in from their segments"""
+    needed = [f for f in fields if f in memory_archive.RECORD_FIELDS and f not in memory_archive.SUMMARY_FIELDS]
+    ids = [row['id'] for row in rows if row['archived']] if needed else []
+    records = get_archive().get_records(cursor, ids)
+    hydrated = []
+    for row in rows:
+        item = dict(row)
+        record = records.get(item['id'])
+        if record is not None:
+            item.update((f, record[f]) for f in needed)
+        item['archived'] = bool(item['archived'])
+        hydrated.append(item)
+    return hydrated
+
+def handle_list_memories(conn, fields_param, limit, cursor_token, include_archived=False):
+    """
+    Memories newest first, optionally paginated with limit/cursor and a
+    fields= projection. Only the hot tier unless include_archived is set.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-        cursor = conn.cursor()
+        fields = parse_fields(fields_param)
+        if fields is None:
+            return {
+                'success': False,
+                'message': f'fields must be a comma-separated subset of: {", ".join(MEMORY_FIELDS)}'
+            }, 400
         
-        cursor.execute('''
-            SELECT id, type, content, image_path, name, timestamp, metadata, recognition_data, voice_data, audio_path
-            FROM memories
-            ORDER BY timestamp DESC
-        ''')
+        if cursor_token and not limit:
+            limit = DEFAULT_PAGE_SIZE
+        if limit is not None:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+        
+        where = ''
+        params = []
+        if cursor_token:
+            try:
+                cursor_timestamp, cursor_id = decode_cursor(cursor_token)
+            except ValueError:
+                return {
+                    'success': False,
+                    'message': 'Invalid cursor'
+                }, 400
+            where = 'WHERE (timestamp, id) < (?, ?)'
+            params = [cursor_timestamp, cursor_id]
+        
+        if include_archived:
+            sql = f'''
+                SELECT {', '.join(fields)}, 0 AS archived FROM memories {where}
+                UNION ALL
+                SELECT {', '.join(archived_columns(fields))}, 1 AS archived FROM archived_memories {where}
+                ORDER BY timestamp DESC, id DESC
+            '''
+            params = params * 2
+        else:
+            sql = f'''
+                SELECT {', '.join(fields)}
+                FROM memories
+                {where}
+                ORDER BY timestamp DESC, id DESC
+            '''
+        if limit is not None:
+            # Fetch one extra row to know whether another page exists
+            sql += ' LIMIT ?'
+            params.append(limit + 1)
         
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
         rows = cursor.fetchall()
-        conn.close()
         
-        memories = []
-        for row in rows:
-            memory = {
-                'id': row['id'],
-                'type': row['type'],
-                'content': row['content'],
-                'image_path': row['image_path'],
-                'name': row['name'],
-                'timestamp': row['timestamp'],
-                'metadata': json.loads(row['metadata']) if row['metadata'] else {},
-                'recognition_data': json.loads(row['recognition_data']) if row['recognition_data'] else None,
-                'voice_data': json.loads(row['voice_data']) if row['voice_data'] else None,
-                'audio_path': row['audio_path']
-            }
-            memories.append(memory)
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['timestamp'], rows[-1]['id'])
+        if include_archived:
+            rows = hydrate_archived(cursor, rows, fields)
+            fields = fields + ['archived']
         
-        return jsonify({
+        return {
             'success': True,
-            'count': len(memories),
-            'memories': memories
-        }), 200
-        
+            'count': len(rows),
+            'memories': row_serializer.encode_rows(rows, fields),
+            'next_cursor': next_cursor
+        }, 200
+    
     except Exception as e:
         print(f"❌ Error retrieving memories: {e}")
-        return jsonify({
+        return {
             'success': False,
             'message': f'Error retrieving memories: {str(e)}'
-        }), 500
+        }, 500
 
-@app.route('/api/memory/search', methods=['GET'])
-def search_memories():
-    """Search memories by text query"""
+def stream_memory_list(conn, fields):
+    """
+    The whole list as JSON chunks read straight off the cursor, for ?stream=1
+    exports: memory stays flat however many memories there are, at the cost
+    of skipping the response cache
+    """
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT {", ".join(fields)} FROM memories ORDER BY timestamp DESC, id DESC')
+    return row_serializer.iter_envelope({'success': True}, 'memories', cursor, fields, {'next_cursor': None})
+
+def parse_flag(value):
+    """Boolean query parameter: 1 or true"""
+    return value in ('1', 'true')
+
+def wants_stream(args):
+    """?stream=1 on an unpaginated hot-tier list"""
+    return (parse_flag(args.get('stream')) and not args.get('limit') and not args.get('cursor')
+            and not parse_flag(args.get('include_archived')))
+
+@app.route('/api/memory/list', methods=['GET'])
+def list_memories():
+    """Retrieve memories, newest first, optionally paginated with limit/cursor and fields="""
+    args = (request.args.get('fields'), request.args.get('limit', type=int), request.args.get('cursor'),
+            parse_flag(request.args.get('include_archived')))
+    fields = parse_fields(args[0])
+    if fields is not None and wants_stream(request.args):
+        return Response(stream_with_context(stream_memory_list(get_db(), fields)), mimetype='application/json')
+    return respond_cached(cached_read(get_db(), ('list', *args), handle_list_memories, *args))
+
+def export_params(args):
+    """Validated media mode for an export, or a 400 (payload, status)"""
+    media = args.get('media', 'hash')
+    if media not in memory_transfer.MEDIA_MODES:
+        return None, ({
+            'success': False,
+            'message': f'media must be one of: {", ".join(memory_transfer.MEDIA_MODES)}'
+        }, 400)
+    return media, None
+
+EXPORT_HEADERS = {'Content-Disposition': 'attachment; filename="memories.ndjson"'}
+
+@app.route('/api/memory/export', methods=['GET'])
+def export_memories():
+    """Stream every memory as NDJSON (media=none|hash|inline) from a single read snapshot"""
+    media, problem = export_params(request.args)
+    if problem:
+        return respond(problem)
+    stream = memory_transfer.iter_export(get_db(), store_for('image'), store_for('audio'), media_dir('audio'), media,
+                                         get_archive())
+    return Response(stream_with_context(stream), mimetype='application/x-ndjson', headers=EXPORT_HEADERS)
+
+# Proxies must pass events through as they are written
+CHANGES_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+def changes_since(args, headers):
+    """Resume position from ?since= or Last-Event-ID, or a 400 (payload, status)"""
+    try:
+        return change_feed.parse_since(args.get('since'), headers.get('Last-Event-ID')), None
+    except ValueError as e:
+        return None, ({'success': False, 'message': str(e)}, 400)
+
+@app.route('/api/memory/changes', methods=['GET'])
+def memory_changes():
+    """Server-sent events for every memory insert, update, delete and archive (resume with since=)"""
+    since, problem = changes_since(request.args, request.headers)
+    if problem:
+        return respond(problem)
+    # No request context in the stream: it holds no pooled connection while it waits
+    shard = tenants.current()
+    frames = change_frames(shard.user_id, since) if shard is not None else get_change_feed().iter_frames(since)
+    return Response(frames, mimetype='text/event-stream', headers=CHANGES_HEADERS)
+
+def change_frames(user_id, since):
+    """
+    A shard's change stream, borrowing the shard for as long as the client
+    listens: the request's own borrow ends before the first frame, and an
+    evicted shard would close the feed under its subscribers.
+    """
+    with get_router().use(user_id):
+        yield from get_change_feed().iter_frames(since)
+
+def handle_search_memories(conn, query, limit, include_archived=False):
+    """
+    Search memories by text query, ranked with FTS5 bm25 when available.
+    With include_archived, archived names and summaries matching the text
+    fill the rest of the page after the hot results.
+    """
     try:
-        query = request.args.get('query', '')
-        
         if not query:
-            return jsonify({
+            return {
                 'success': False,
                 'message': 'Query parameter is required'
-            }), 400
+            }, 400
+        
+        limit = max(1, min(limit or DEFAULT_SEARCH_LIMIT, MAX_PAGE_SIZE))
         
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # Search in name, content, and recognition_data
-        cursor.execute('''
-            SELECT id, type, content, image_path, name, timestamp, metadata, recognition_data, voice_data, audio_path
-            FROM memories
-            WHERE name LIKE ? OR content LIKE ? OR recognition_data LIKE ?
-            ORDER BY timestamp DESC
-        ''', (f'%{query}%', f'%{query}%', f'%{query}%'))
+        fts_query = build_fts_query(query)
+        if FTS_ENABLED and fts_query:
+            # Name hits weigh most, then recognition descriptions, then free text
+            cursor.execute(f'''
+                SELECT {', '.join('m.' + f for f in MEMORY_FIELDS)},
+                       snippet(memories_fts, -1, '<mark>', '</mark>', '…', 12) AS snippet,
+                       bm25(memories_fts, 10.0, 1.0, 2.0) AS score
+                FROM memories_fts
+                JOIN memories m ON m.id = memories_fts.rowid
+                WHERE memories_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+            ''', (fts_query, limit))
+        else:
+            # Search in name, content, and recognition_data
+            cursor.execute(f'''
+                SELECT {', '.join(MEMORY_FIELDS)}, NULL AS snippet, NULL AS score
+                FROM memories
+                WHERE name LIKE ? OR content LIKE ? OR recognition_data LIKE ?
+                ORDER BY timestamp DESC
+                LIMIT ?
+            ''', (f'%{query}%', f'%{query}%', f'%{query}%', limit))
         
         rows = cursor.fetchall()
-        conn.close()
-        
-        memories = []
-        for row in rows:
-            memory = {
-                'id': row['id'],
-                'type': row['type'],
-                'content': row['content'],
-                'image_path': row['image_path'],
-                'name': row['name'],
-                'timestamp': row['timestamp'],
-                'metadata': json.loads(row['metadata']) if row['metadata'] else {},
-                'recognition_data': json.loads(row['recognition_data']) if row['recognition_data'] else None,
-                'voice_data': json.loads(row['voice_data']) if row['voice_data'] else None,
-                'audio_path': row['audio_path']
-            }
-            memories.append(memory)
-        
-        return jsonify({
+        fields = MEMORY_FIELDS + ('snippet', 'score')
+        
+        if include_archived:
+            rows = [dict(row, archived=0) for row in rows]
+            if len(rows) < limit:
+                cursor.execute(f'''
+                    SELECT {', '.join(archived_columns(MEMORY_FIELDS))}, NULL AS snippet, NULL AS score,
+                           1 AS archived
+                    FROM archived_memories
+                    WHERE name LIKE ? OR summary LIKE ?
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT ?
+                ''', (f'%{query}%', f'%{query}%', limit - len(rows)))
+                rows += cursor.fetchall()
+            rows = hydrate_archived(cursor, rows, fields)
+            fields += ('archived',)
+        
+        return {
             'success': True,
-            'count': len(memories),
+            'count': len(rows),
             'query': query,
-            'memories': memories
-        }), 200
-        
+            'memories': row_serializer.encode_rows(rows, fields)
+        }, 200
+    
     except Exception as e:
         print(f"❌ Error searching memories: {e}")
-        return jsonify({
+        return {
             'success': False,
             'message': f'Error searching memories: {str(e)}'
-        }), 500
+        }, 500
+
+@app.route('/api/memory/search', methods=['GET'])
+def search_memories():
+    """Search memories by text query, ranked with FTS5 bm25 when available"""
+    args = (request.args.get('query', ''), request.args.get('limit', type=int),
+            parse_flag(request.args.get('include_archived')))
+    return respond_cached(cached_read(get_db(), ('search', *args), handle_search_memories, *args))
+
+@lru_cache(maxsize=4096)
+def legacy_etag(path, mtime_ns, size):
+    """Content hash of a pre-blob-store file, recomputed only when it changes"""
+    return file_sha256(path)
+
+def locate_media(directory, store, filename, size=None):
+    """Resolve a media request to (path, stat, etag, immutable), or None if there is no such file"""
+    blob_path = store.resolve(filename)
+    path = safe_join(os.path.join(app.root_path, directory), blob_path or filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    
+    stat = os.stat(path)
+    # Blob names are their own SHA-256; older files are hashed once per change
+    etag = os.path.basename(path).split('.')[0] if blob_path else legacy_etag(path, stat.st_mtime_ns, stat.st_size)
+    immutable = bool(blob_path)
+    
+    if size:
+        thumb = thumbnails.thumbnail_path(os.path.join(app.root_path, directory), etag, size) if blob_path else None
+        if thumb and thumb.is_file():
+            path, stat, etag = str(thumb), thumb.stat(), f'{etag}-{size}'
+        else:
+            # Not rendered (yet): serve the original, but let the URL change later
+            immutable = False
+    return path, stat, etag, immutable
+
+def locate_archived_media(conn, filename):
+    """(bytes, sha256) of an archived blob by its '<sha256><ext>' name, or None"""
+    match = media_store.BLOB_NAME.match(os.path.basename(filename))
+    if not match:
+        return None
+    data = get_archive().read_media(conn.cursor(), match.group(1))
+    return (data, match.group(1)) if data is not None else None
+
+def serve_media(directory, store, filename, size=None):
+    """Serve a media file with a strong ETag, 304s, Range/206 and optional LRU caching"""
+    with request_metrics.phase('file'):
+        located = locate_media(directory, store, filename, size)
+    if located is None:
+        # Media of archived memories is read out of its segment (always the original size)
+        with request_metrics.phase('file'):
+            archived = locate_archived_media(get_db(), filename)
+        if archived is None:
+            return jsonify({
+                'success': False,
+                'message': f'File not found: {filename}'
+            }), 404
+        data, etag = archived
+        response = Response(bytes(data), mimetype=mimetypes.guess_type(f'{etag}{store.extension}')[0])
+        response.set_etag(etag)
+        response = response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+        return media_cache_control(response, True)
+    path, stat, etag, immutable = located
+    
+    if request.if_none_match.contains(etag):
+        # Revalidation hit: skip touching the file at all
+        response = Response(status=304)
+        response.set_etag(etag)
+    elif MEDIA_CACHE.enabled and stat.st_size <= MEDIA_CACHE.max_item_bytes:
+        data = MEDIA_CACHE.get(path)
+        if data is None:
+            with request_metrics.phase('file'), open(path, 'rb') as f:
+                data = f.read()
+            MEDIA_CACHE.put(path, data)
+        response = Response(data, mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response = response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    else:
+        response = send_file(path, etag=etag, conditional=True)
+    return media_cache_control(response, immutable)
+
+def media_cache_control(response, immutable):
+    if immutable:
+        # Content-addressed URLs never change meaning
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
 
 @app.route('/api/memory/image/<path:filename>', methods=['GET'])
 def get_image(filename):
-    """Serve memory images"""
+    """Serve memory images, or a thumbnail with ?size=128|512"""
     try:
-        return send_from_directory(IMAGE_DIR, filename)
+        size = request.args.get('size', type=int)
+        if size is not None and size not in thumbnails.THUMBNAIL_SIZES:
+            return jsonify({
+                'success': False,
+                'message': f'size must be one of {list(thumbnails.THUMBNAIL_SIZES)}'
+            }), 400
+        return serve_media(media_dir('image'), store_for('image'), filename, size)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -380,141 +1497,303 @@ def get_image(filename):
 
 @app.route('/api/memory/audio/<filename>')
 def serve_audio(filename):
-    """Serve audio file"""
+    """Serve audio file, with Range support for seeking"""
     try:
-        return send_from_directory(AUDIO_DIR, filename)
+        return serve_media(media_dir('audio'), store_for('audio'), filename)
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Audio not found: {str(e)}'
         }), 404
 
-@app.route('/api/memory/delete/<int:memory_id>', methods=['DELETE'])
-def delete_memory(memory_id):
+def handle_delete_memory(conn, memory_id):
     """Delete a memory by ID"""
     try:
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         
-        # Get image path before deleting
-        cursor.execute('SELECT image_path FROM memories WHERE id = ?', (memory_id,))
+        # Get media references before deleting
+        cursor.execute('SELECT image_path, image_hash, audio_path, audio_hash FROM memories WHERE id = ?', (memory_id,))
         row = cursor.fetchone()
         
-        if row and row[0]:
-            # Delete image file
-            try:
-                os.remove(row[0])
-            except:
-                pass
-        
-        # Delete from database
+        # Delete from database (an archived memory only has its summary row left here)
         cursor.execute('DELETE FROM memories WHERE id = ?', (memory_id,))
+        existed = row is not None
+        if not row:
+            archived = get_archive().get_records(cursor, [memory_id])
+            cursor.execute('DELETE FROM archived_memories WHERE id = ?', (memory_id,))
+            existed = cursor.rowcount > 0
+            get_archive().release(cursor, archived.values())
+            # Files saved before the blob store stayed on disk when archived
+            for record in archived.values():
+                for kind in ('image', 'audio'):
+                    if not record.get(f'{kind}_hash'):
+                        release_media(cursor, kind, record.get(f'{kind}_path'), None)
+        unindex_recognition(cursor, memory_id)
+        voice_profiles.delete_for_memory(cursor, memory_id)
+        
+        # Release image and audio blobs; unlinked after commit once no other memory references them
+        if row:
+            release_media(cursor, 'image', row['image_path'], row['image_hash'])
+            release_media(cursor, 'audio', row['audio_path'], row['audio_hash'])
+        if existed:
+            change_feed.log_change(cursor, 'delete', [memory_id])
+        response_cache.bump_generation(cursor)
         conn.commit()
-        conn.close()
+        collect_media(conn)
         
-        return jsonify({
+        return {
             'success': True,
             'message': 'Memory deleted successfully'
-        }), 200
-        
+        }, 200
+    
     except Exception as e:
         print(f"❌ Error deleting memory: {e}")
-        return jsonify({
+        return {
             'success': False,
             'message': f'Error deleting memory: {str(e)}'
-        }), 500
+        }, 500
 
-@app.route('/api/memory/recognize', methods=['POST'])
-def recognize_memory():
-    """Find matching memory based on description"""
+@app.route('/api/memory/delete/<int:memory_id>', methods=['DELETE'])
+def delete_memory(memory_id):
+    """Delete a memory by ID"""
+    return respond(handle_delete_memory(get_db(), memory_id))
+
+def handle_get_memory(conn, memory_id):
+    """One memory by id, read from its archive segment if it has been archived"""
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {", ".join(MEMORY_FIELDS)} FROM memories WHERE id = ?', (memory_id,))
+        row = cursor.fetchone()
+        archived = row is None
+        if archived:
+            row = get_archive().get_records(cursor, [memory_id]).get(memory_id)
+        if row is None:
+            return {
+                'success': False,
+                'message': 'Memory not found'
+            }, 404
+        return {
+            'success': True,
+            'archived': archived,
+            'memory': row_serializer.RawJSON(row_serializer.encode_row(row, MEMORY_FIELDS))
+        }, 200
+    
+    except Exception as e:
+        print(f"❌ Error retrieving memory: {e}")
+        return {
+            'success': False,
+            'message': f'Error retrieving memory: {str(e)}'
+        }, 500
+
+@app.route('/api/memory/<int:memory_id>', methods=['GET'])
+def get_memory(memory_id):
+    """One memory by id, hot or archived"""
+    return respond(handle_get_memory(get_db(), memory_id))
+
+def archive_old_memories(conn, older_than_days, batch_size=memory_archive.ARCHIVE_BATCH):
+    """
+    Move memories older than `older_than_days` to the archive, one write
+    transaction per batch: their records and media are appended to the
+    segment first, then the summary rows go in while the hot rows, their
+    recognition postings and their blob references come out. Recognition
+    and the default list and search only see the hot tier afterwards.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).strftime(memory_engine.TIMESTAMP_FORMAT)
+    archive = get_archive()
+    cursor = conn.cursor()
+    stats = {'archived': 0, 'blocks': 0, 'media': 0, 'bytes': 0, 'cutoff': cutoff}
+    while True:
+        # Taken up front: the write lock is what serialises appends to the segment
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute(f'''
+                SELECT {', '.join(memory_archive.RECORD_FIELDS)} FROM memories
+                WHERE timestamp < ? ORDER BY id LIMIT ?
+            ''', (cutoff, batch_size))
+            records = [dict(row) for row in cursor.fetchall()]
+            if not records:
+                conn.rollback()
+                break
+            media = [(record[f'{kind}_hash'], kind, str(store_for(kind).path_for(record[f'{kind}_hash'])))
+                     for record in records for kind in ('image', 'audio') if record[f'{kind}_hash']]
+            written = archive.append(cursor, records, media)
+            for record in records:
+                cursor.execute('DELETE FROM memories WHERE id = ?', (record['id'],))
+                unindex_recognition(cursor, record['id'])
+                voice_profiles.delete_for_memory(cursor, record['id'])
+                # Files saved before the blob store stay where they are
+                for kind in ('image', 'audio'):
+                    if record[f'{kind}_hash']:
+                        release_media(cursor, kind, record[f'{kind}_path'], record[f'{kind}_hash'])
+            change_feed.log_change(cursor, 'archive', [record['id'] for record in records])
+            response_cache.bump_generation(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        collect_media(conn)
+        stats['archived'] += len(records)
+        for key in ('blocks', 'media', 'bytes'):
+            stats[key] += written[key]
+        print(f"🧊 Archived {stats['archived']} memories older than {cutoff}")
+    return stats
+
+def handle_archive_memories(conn, data):
+    """Move memories older than older_than_days (default ARCHIVE_AFTER_DAYS) to the archive"""
+    try:
+        days = (data or {}).get('older_than_days', memory_archive.ARCHIVE_AFTER_DAYS)
+        if isinstance(days, bool) or not isinstance(days, (int, float)) or days < 0:
+            raise ValueError('older_than_days must be a non-negative number')
+        return {'success': True, **archive_old_memories(conn, days)}, 200
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}, 400
+    except Exception as e:
+        print(f"❌ Error archiving memories: {e}")
+        return {'success': False, 'message': f'Error archiving memories: {str(e)}'}, 500
+
+@app.route('/api/memory/archive', methods=['POST'])
+def archive_memories():
+    """Move old memories into compressed archive segments"""
+    return respond(handle_archive_memories(get_db(), request.get_json(silent=True)))
+
+def match_by_words(cursor, description):
+    """Top-3 memories by shared-word overlap (at least 2 common words)"""
+    description_words = recognition_tokens(description)
+    
+    # Score only memories that share a posting with the description
+    placeholders = ','.join('?' * len(description_words))
+    cursor.execute(f'''
+        SELECT m.id, m.name, m.image_path, m.recognition_data,
+               c.common * 1.0 / MAX(?, t.term_count) AS similarity
+        FROM (
+            SELECT memory_id, COUNT(*) AS common
+            FROM recognition_index
+            WHERE token IN ({placeholders})
+            GROUP BY memory_id
+            HAVING COUNT(*) >= 2
+        ) c
+        JOIN recognition_terms t ON t.memory_id = c.memory_id
+        JOIN memories m ON m.id = c.memory_id
+        ORDER BY similarity DESC, m.timestamp DESC, m.id DESC
+        LIMIT 3
+    ''', (len(description_words), *description_words))
+    return cursor.fetchall()
+
+def match_by_embedding(cursor, description):
+    """Top-3 memories by cosine similarity of recognition embeddings"""
+    query_vector = get_embedder().embed([description])[0]
+
+    def live(ids):
+        # Rows deleted (by any process) or rolled back don't come back from the table
+        found = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor.execute(f'SELECT id FROM memories WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+            found.update(row[0] for row in cursor.fetchall())
+        return found
+
+    candidates = get_vector_index().search(query_vector, 3, live=live, min_score=EMBEDDING_MIN_SIMILARITY)
+    if not candidates:
+        return []
+    cursor.execute(f'''
+        SELECT id, name, image_path, recognition_data FROM memories
+        WHERE id IN ({','.join('?' * len(candidates))})
+    ''', [memory_id for memory_id, _ in candidates])
+    rows = {row['id']: row for row in cursor.fetchall()}
+    matches = []
+    for memory_id, score in candidates:
+        if memory_id in rows:
+            row = rows[memory_id]
+            matches.append({
+                'id': row['id'],
+                'name': row['name'],
+                'image_path': row['image_path'],
+                'recognition_data': row['recognition_data'],
+                'similarity': score
+            })
+    return matches[:3]
+
+def handle_recognize_memory(conn, data):
+    """Find matching memory based on description (mode: 'words' or 'embedding')"""
     try:
-        data = request.json
         description = data.get('description', '')
+        mode = data.get('mode', RECOGNITION_MODE)
         
         if not description:
-            return jsonify({
+            return {
                 'success': False,
                 'message': 'Description is required'
-            }), 400
+            }, 400
+        if mode not in ('words', 'embedding'):
+            return {
+                'success': False,
+                'message': "mode must be 'words' or 'embedding'"
+            }, 400
+        if mode == 'embedding' and embeddings.np is None:
+            return {
+                'success': False,
+                'message': 'Embedding recognition needs NumPy installed'
+            }, 400
         
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # Search for similar descriptions in recognition_data
-        cursor.execute('''
-            SELECT id, type, content, image_path, name, timestamp, metadata, recognition_data
-            FROM memories
-            WHERE recognition_data IS NOT NULL
-            ORDER BY timestamp DESC
-        ''')
-        
-        rows = cursor.fetchall()
-        conn.close()
+        if mode == 'embedding':
+            rows = match_by_embedding(cursor, description)
+        else:
+            rows = match_by_words(cursor, description)
         
-        # Simple matching: find memories with similar keywords
         matches = []
-        description_lower = description.lower()
-        description_words = set(description_lower.split())
-        
         for row in rows:
-            recognition_data = json.loads(row['recognition_data']) if row['recognition_data'] else {}
-            stored_description = recognition_data.get('description', '').lower()
-            
-            # Calculate simple word overlap
-            stored_words = set(stored_description.split())
-            common_words = description_words.intersection(stored_words)
-            
-            if len(common_words) >= 2:  # At least 2 matching words
-                similarity = len(common_words) / max(len(description_words), len(stored_words))
-                matches.append({
-                    'id': row['id'],
-                    'name': row['name'],
-                    'similarity': similarity,
-                    'recognition_data': recognition_data,
-                    'image_path': row['image_path']
-                })
-        
-        # Sort by similarity
-        matches.sort(key=lambda x: x['similarity'], reverse=True)
+            matches.append({
+                'id': row['id'],
+                'name': row['name'],
+                'similarity': row['similarity'],
+                'recognition_data': row_serializer.raw_json(row['recognition_data'], b'{}'),
+                'image_path': row['image_path']
+            })
         
         if matches:
             best_match = matches[0]
-            return jsonify({
+            return {
                 'success': True,
                 'found': True,
                 'name': best_match['name'],
                 'similarity': best_match['similarity'],
                 'memory_id': best_match['id'],
-                'all_matches': matches[:3]  # Top 3 matches
-            }), 200
+                'all_matches': matches[:3],  # Top 3 matches
+                'mode': mode
+            }, 200
         else:
-            return jsonify({
+            return {
                 'success': True,
                 'found': False,
-                'message': 'No matching memory found'
-            }), 200
+                'message': 'No matching memory found',
+                'mode': mode
+            }, 200
         
     except Exception as e:
         print(f"❌ Error recognizing memory: {e}")
-        return jsonify({
+        return {
             'success': False,
             'message': f'Error recognizing memory: {str(e)}'
-        }), 500
+        }, 500
 
-@app.route('/api/voice/save', methods=['POST'])
-def save_voice_profile():
+@app.route('/api/memory/recognize', methods=['POST'])
+def recognize_memory():
+    """Find matching memory based on description (mode: 'words' or 'embedding')"""
+    return respond(handle_recognize_memory(get_db(), request.get_json(silent=True)))
+
+def handle_save_voice(conn, data):
     """Save voice profile with speech patterns"""
     try:
-        data = request.json
         person_name = data.get('name', '')
         speech_sample = data.get('speech_sample', '')
         
         if not person_name or not speech_sample:
-            return jsonify({
+            return {
                 'success': False,
                 'message': 'Name and speech sample are required'
-            }), 400
+            }, 400
         
         # Extract speech patterns from sample
         voice_data = {
@@ -522,130 +1801,263 @@ def save_voice_profile():
                 'sample_text': speech_sample,
                 'word_count': len(speech_sample.split()),
                 'common_words': list(set(speech_sample.lower().split()))[:20],
-                'language_style': 'hinglish' if any(word in speech_sample.lower() for word in ['hai', 'haan', 'nahi', 'kya']) else 'english'
+                'language_style': voice_profiles.language_style(speech_sample)
             },
             'recorded_at': datetime.now().isoformat()
         }
         
-        # Save to database
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO memories (type, content, name, voice_data)
-            VALUES (?, ?, ?, ?)
-        ''', ('text', f'Voice profile: {person_name}', person_name, json.dumps(voice_data)))
-        
-        memory_id = cursor.lastrowid
+        # Further samples of a known speaker accumulate into their one profile
+        profile = voice_profiles.find_profile(cursor, person_name)
+        if profile and profile['memory_id'] is not None:
+            memory_id = profile['memory_id']
+            voice_data['sample_count'] = voice_profiles.add_sample(cursor, person_name, speech_sample)
+            cursor.execute('UPDATE memories SET voice_data = ? WHERE id = ?',
+                           (json.dumps(voice_data), memory_id))
+            change_feed.log_change(cursor, 'update', [memory_id])
+            response_cache.bump_generation(cursor)
+        else:
+            memory = {'text': f'Voice profile: {person_name}', 'name': person_name,
+                      'metadata': {}, 'recognition_data': None, 'voice_data': voice_data}
+            memory_id = insert_memory(cursor, memory)
         conn.commit()
-        conn.close()
         
-        return jsonify({
+        return {
             'success': True,
             'message': f'Voice profile saved for {person_name}! 💚',
             'memory_id': memory_id,
             'name': person_name
-        }), 201
+        }, 201
         
     except Exception as e:
         print(f"❌ Error saving voice profile: {e}")
-        return jsonify({
+        return {
             'success': False,
             'message': f'Error saving voice profile: {str(e)}'
-        }), 500
+        }, 500
 
-@app.route('/api/voice/recognize', methods=['POST'])
-def recognize_voice():
+@app.route('/api/voice/save', methods=['POST'])
+def save_voice_profile():
+    """Save voice profile with speech patterns"""
+    return respond(handle_save_voice(get_db(), request.get_json(silent=True)))
+
+def handle_recognize_voice(conn, data):
     """Recognize speaker from speech sample"""
     try:
-        data = request.json
         speech_sample = data.get('speech_sample', '')
         
         if not speech_sample:
-            return jsonify({
+            return {
                 'success': False,
                 'message': 'Speech sample is required'
-            }), 400
+            }, 400
         
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # Get all voice profiles
-        cursor.execute('''
-            SELECT id, name, voice_data
-            FROM memories
-            WHERE voice_data IS NOT NULL
-        ''')
-        
-        rows = cursor.fetchall()
-        conn.close()
+        # Reloads the profile matrix only if a profile changed since last time
+        index = get_voice_index()
+        index.refresh(cursor)
         
-        if not rows:
-            return jsonify({
+        if not index.profiles:
+            return {
                 'success': True,
                 'found': False,
                 'message': 'No voice profiles found'
-            }), 200
+            }, 200
         
-        # Simple text matching
-        sample_words = set(speech_sample.lower().split())
-        matches = []
-        
-        for row in rows:
-            voice_data = json.loads(row['voice_data']) if row['voice_data'] else {}
-            stored_sample = voice_data.get('speech_patterns', {}).get('sample_text', '')
-            stored_words = set(stored_sample.lower().split())
-            
-            # Calculate word overlap
-            common_words = sample_words.intersection(stored_words)
-            if len(common_words) >= 2:
-                similarity = len(common_words) / max(len(sample_words), len(stored_words))
-                matches.append({
-                    'id': row['id'],
-                    'name': row['name'],
-                    'similarity': similarity
-                })
-        
-        # Sort by similarity
-        matches.sort(key=lambda x: x['similarity'], reverse=True)
+        # TF-IDF cosine against every profile at once
+        matches = index.search(speech_sample)
         
         if matches:
-            best_match = matches[0]
-            return jsonify({
+            profile_id, name, memory_id, sample_count, similarity = matches[0]
+            return {
                 'success': True,
                 'found': True,
-                'name': best_match['name'],
-                'similarity': best_match['similarity'],
-                'confidence': 'high' if best_match['similarity'] > 0.5 else 'low'
-            }), 200
+                'name': name,
+                'memory_id': memory_id,
+                'samples': sample_count,
+                'similarity': similarity,
+                'confidence': 'high' if similarity > 0.5 else 'low'
+            }, 200
         else:
-            return jsonify({
+            return {
                 'success': True,
                 'found': False,
                 'message': 'Speaker not recognized'
-            }), 200
+            }, 200
         
     except Exception as e:
         print(f"❌ Error recognizing voice: {e}")
-        return jsonify({
+        return {
             'success': False,
             'message': f'Error recognizing voice: {str(e)}'
-        }), 500
+        }, 500
+
+@app.route('/api/voice/recognize', methods=['POST'])
+def recognize_voice():
+    """Recognize speaker from speech sample"""
+    return respond(handle_recognize_voice(get_db(), request.get_json(silent=True)))
+
+def parse_chat_turn(data):
+    """(role, content, timestamp, metadata) from one JSON turn; raises ValueError"""
+    role = data.get('role')
+    content = data.get('content')
+    if role not in memory_engine.ROLES:
+        raise ValueError(f"role must be one of {', '.join(memory_engine.ROLES)}")
+    if not isinstance(content, str) or not content.strip():
+        raise ValueError('content is required')
+    metadata = data.get('metadata')
+    if metadata is not None and not isinstance(metadata, dict):
+        raise ValueError('metadata must be an object')
+    timestamp = data.get('timestamp')
+    if timestamp is not None:
+        try:
+            timestamp = memory_engine.parse_timestamp(timestamp)
+        except ValueError:
+            raise ValueError('timestamp must be an ISO 8601 date-time')
+    return role, content, timestamp, metadata
+
+def parse_session_id(data):
+    session_id = data.get('session_id') if data else None
+    if not isinstance(session_id, str) or not session_id or len(session_id) > 128:
+        raise ValueError('session_id is required (at most 128 characters)')
+    return session_id
+
+def handle_chat_append(conn, data):
+    """Append one turn, or a list of turns in one transaction, to a chat session"""
+    try:
+        session_id = parse_session_id(data)
+        turns = data.get('turns', [data])
+        if not isinstance(turns, list) or not turns or len(turns) > MAX_BATCH_SIZE:
+            raise ValueError(f'turns must be a list of 1 to {MAX_BATCH_SIZE} turns')
+        parsed = [parse_chat_turn(turn if isinstance(turn, dict) else {}) for turn in turns]
+        cursor = conn.cursor()
+        appended = []
+        for role, content, timestamp, metadata in parsed:
+            seq, stored_at = memory_engine.append_turn(cursor, session_id, role, content, timestamp, metadata)
+            appended.append({'seq': seq, 'timestamp': stored_at})
+        conn.commit()
+        return {'success': True, 'session_id': session_id, 'turns': appended}, 200
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}, 400
+    except Exception as e:
+        print(f"❌ Error appending chat turn: {e}")
+        return {'success': False, 'message': f'Error appending chat turn: {str(e)}'}, 500
+
+def handle_chat_history(conn, session_id, limit, cursor_token):
+    """A session's turns, oldest first, paged backwards with an opaque cursor"""
+    try:
+        parse_session_id({'session_id': session_id})
+        before = decode_cursor(cursor_token) if cursor_token else None
+        limit = max(1, min(limit or memory_engine.RECENT_TURNS, memory_engine.MAX_TURNS))
+        turns = memory_engine.history(conn.cursor(), session_id, limit, before)
+        # The oldest turn returned is where the previous page starts
+        next_cursor = encode_cursor(turns[0]['timestamp'], turns[0]['seq']) if len(turns) == limit else None
+        return {'success': True, 'session_id': session_id, 'turns': turns, 'next_cursor': next_cursor}, 200
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}, 400
+    except Exception as e:
+        print(f"❌ Error reading chat history: {e}")
+        return {'success': False, 'message': str(e)}, 500
+
+def handle_chat_recall(conn, data):
+    """Last N turns plus the older turns and summaries most relevant to the query"""
+    try:
+        session_id = parse_session_id(data)
+        recent = parse_int(data.get('recent'), memory_engine.RECENT_TURNS)
+        relevant = parse_int(data.get('relevant'), memory_engine.RELEVANT_TURNS)
+        context = memory_engine.recall(conn.cursor(), session_id, str(data.get('query') or ''),
+                                       max(0, min(recent, memory_engine.MAX_TURNS)),
+                                       max(0, min(relevant, memory_engine.MAX_TURNS)))
+        return dict(context, success=True, session_id=session_id), 200
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}, 400
+    except Exception as e:
+        print(f"❌ Error recalling chat context: {e}")
+        return {'success': False, 'message': str(e)}, 500
+
+def handle_chat_compact(conn, data):
+    """Summarise and drop chat partitions older than keep_months"""
+    try:
+        keep_months = parse_int((data or {}).get('keep_months'), memory_engine.COMPACT_AFTER_MONTHS)
+        if keep_months < 1:
+            raise ValueError('keep_months must be at least 1')
+        stats = memory_engine.compact(conn.cursor(), keep_months)
+        conn.commit()
+        return {'success': True, 'compacted': stats}, 200
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}, 400
+    except Exception as e:
+        print(f"❌ Error compacting chat history: {e}")
+        return {'success': False, 'message': str(e)}, 500
+
+def handle_chat_sessions(conn, limit):
+    """Most recently active chat sessions"""
+    try:
+        limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+        return {'success': True, 'sessions': memory_engine.list_sessions(conn.cursor(), limit)}, 200
+    except Exception as e:
+        print(f"❌ Error listing chat sessions: {e}")
+        return {'success': False, 'message': str(e)}, 500
+
+@app.route('/api/chat/append', methods=['POST'])
+def chat_append():
+    """Append one turn (or a list of turns) to a chat session"""
+    return respond(handle_chat_append(get_db(), request.get_json(silent=True)))
+
+@app.route('/api/chat/history', methods=['GET'])
+def chat_history():
+    """Read a session's turns, newest page first, with limit/cursor"""
+    return respond(handle_chat_history(get_db(), request.args.get('session_id'),
+                                       parse_int(request.args.get('limit')), request.args.get('cursor')))
+
+@app.route('/api/chat/recall', methods=['POST'])
+def chat_recall():
+    """Recall the last N turns plus relevant older turns for a query"""
+    return respond(handle_chat_recall(get_db(), request.get_json(silent=True)))
+
+@app.route('/api/chat/compact', methods=['POST'])
+def chat_compact():
+    """Summarise and drop old chat partitions"""
+    return respond(handle_chat_compact(get_db(), request.get_json(silent=True)))
+
+@app.route('/api/chat/sessions', methods=['GET'])
+def chat_sessions():
+    """List chat sessions, most recently active first"""
+    return respond(handle_chat_sessions(get_db(), parse_int(request.args.get('limit'))))
+
+def health_payload():
+    """Service status plus pool, cache, thumbnail, writer, shard and archive counters"""
+    return {
+        'status': 'healthy',
+        'service': 'Dr. Chinki Memory Server',
+        'version': '2.0.0',  # Updated for recognition feature
+        'db_pool': get_pool().stats(),
+        'media_cache': MEDIA_CACHE.stats(),
+        'thumbnails': THUMBNAILS.stats(),
+        'group_commit': dict(get_writer().stats(), enabled=GROUP_COMMIT),
+        'response_cache': RESPONSE_CACHE.stats(),
+        'tenants': dict(get_router().stats(), enabled=TENANTS_ENABLED),
+        'archive': get_archive().stats(),
+        'changes': get_change_feed().stats()
+    }
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'service': 'Dr. Chinki Memory Server',
-        'version': '2.0.0'  # Updated for recognition feature
-    }), 200
+    return jsonify(health_payload()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: route latency and phase histograms, SQLite counters, health stats"""
+    return Response(request_metrics.render(health_payload()), content_type=request_metrics.CONTENT_TYPE)
 
 if __name__ == '__main__':
     print("🧠 Dr. Chinki Memory Server Starting...")
     print("=" * 50)
     init_db()
+    THUMBNAILS.start()
     print(f"📁 Image directory: {os.path.abspath(IMAGE_DIR)}")
     print(f"💾 Database: {os.path.abspath(DB_PATH)}")
     print("=" * 50)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Memory Transfer
+Streaming NDJSON export of the memories database and a resumable bulk importer
+
+An export is one JSON object per line: a header, one line per memory, and an
+end line with the count. Media is left out (--media none), referenced by
+SHA-256 (hash, the default) or inlined as base64 (inline). Files saved before
+the blob store have no hash and are always inlined. Archived memories (see
+memory_archive.py) follow the hot ones and import back as ordinary memories;
+media that only the archive still holds needs --media inline to travel.
+
+Run from the directory memory_server.py runs in:
+    python3 memory_transfer.py export -o backup.ndjson [--media inline]
+    python3 memory_transfer.py import backup.ndjson [--media-root /old/server]
+
+Both take --user <id> to export from or import into one user's shard, e.g.
+to move a single-user database into a multi-tenant deployment.
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import uuid
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+import row_serializer
+
+FORMAT = 'dr-chinki-memories'
+FORMAT_VERSION = 1
+MEDIA_MODES = ('none', 'hash', 'inline')
+EXPORT_FIELDS = ('kind', 'id', 'type', 'content', 'name', 'timestamp',
+                 'metadata', 'recognition_data', 'voice_data')
+INLINE_CHUNK = 48 * 1024     # bytes read per base64 piece (multiple of 3, so pieces concatenate)
+IMPORT_BATCH = 200           # memories per import transaction
+
+
+def create_schema(cursor):
+    """Last committed line per export, so an interrupted import picks up where it stopped"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_progress (
+            export_id TEXT PRIMARY KEY,
+            line_no INTEGER NOT NULL,
+            imported INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+
+
+def _media_file(store, legacy_dir, stored_path, sha256):
+    """On-disk file behind a memory's image/audio column"""
+    if sha256:
+        return store.path_for(sha256)
+    return os.path.join(legacy_dir, stored_path) if legacy_dir else stored_path
+
+
+def _iter_media(path, sha256, inline, data=None):
+    """
+    JSON pieces of one media reference; inline data is base64-encoded a chunk
+    at a time, from the file at `path` or from `data` (an archived blob)
+    """
+    if data is not None:
+        size = len(data)
+    else:
+        size = os.path.getsize(path) if os.path.exists(path) else None
+    yield b'{"sha256":' + row_serializer.dumps(sha256) + b',"size":' + row_serializer.dumps(size)
+    if inline:
+        yield b',"data":"'
+        if data is not None:
+            for offset in range(0, len(data), INLINE_CHUNK):
+                yield base64.b64encode(data[offset:offset + INLINE_CHUNK])
+        else:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(INLINE_CHUNK), b''):
+                    yield base64.b64encode(chunk)
+        yield b'"'
+    yield b'}'
+
+
+def _iter_memory(row, cursor, image_store, audio_store, audio_dir, media, archive):
+    """One memory line; media missing from the blob store is read from the archive when there is one"""
+    line = row_serializer.encode_row(row, EXPORT_FIELDS)[:-1]
+    for kind, store, legacy_dir in (('image', image_store, None), ('audio', audio_store, audio_dir)):
+        stored_path, sha256 = row[f'{kind}_path'], row[f'{kind}_hash']
+        if media == 'none' or not stored_path:
+            continue
+        path = _media_file(store, legacy_dir, stored_path, sha256)
+        data = None
+        if archive is not None and sha256 and not os.path.exists(path):
+            data = archive.read_media(cursor, sha256)
+        inline = media == 'inline' or not sha256
+        if inline and data is None and not os.path.exists(path):
+            continue
+        yield line + f',"{kind}":'.encode()
+        yield from _iter_media(path, sha256, inline, data)
+        line = b''
+    yield line + b'}\n'
+
+
+def iter_export(conn, image_store, audio_store, audio_dir, media='hash', archive=None):
+    """
+    NDJSON export as a stream of byte chunks. Rows come off one cursor in
+    batches, inside a single read transaction, so the export is a consistent
+    snapshot and memory stays flat however large the database or its media.
+    Archived memories follow the hot ones when `archive` is given.
+    """
+    yield row_serializer.dumps({
+        'kind': 'header',
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'export_id': uuid.uuid4().hex,
+        'exported_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'media': media,
+    }) + b'\n'
+    cursor = conn.cursor()
+    lookups = conn.cursor()  # archived media lookups, without disturbing the row cursor
+    cursor.execute('BEGIN')
+    try:
+        cursor.execute(f'''
+            SELECT 'memory' AS kind, {', '.join(EXPORT_FIELDS[1:])},
+                   image_path, image_hash, audio_path, audio_hash
+            FROM memories ORDER BY id
+        ''')
+        count = 0
+        while True:
+            rows = cursor.fetchmany(row_serializer.STREAM_BATCH_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                yield from _iter_memory(row, lookups, image_store, audio_store, audio_dir, media, archive)
+                count += 1
+        if archive is not None:
+            for record in archive.iter_records(cursor):
+                yield from _iter_memory(dict(record, kind='memory'), lookups, image_store, audio_store,
+                                        audio_dir, media, archive)
+                count += 1
+        yield row_serializer.dumps({'kind': 'end', 'memories': count}) + b'\n'
+    finally:
+        conn.rollback()
+
+
+def _stage_media(ms, kind, reference, media_root):
+    """
+    StagedBlob for an imported image/audio, or None with a reason. Inline data
+    is decoded and checked against its hash; a hash reference is satisfied by
+    a blob this store already has, or by the source store under media_root.
+    """
+    store = ms.store_for(kind)
+    sha256 = reference.get('sha256')
+    if reference.get('data'):
+        staged = store.stage_base64(reference['data'])
+        if sha256 and staged.sha256 != sha256:
+            staged.discard()
+            return None, 'hash mismatch'
+        return staged, None
+    if not sha256:
+        return None, 'no data'
+    if store.path_for(sha256).exists():
+        # Already stored here: commit() only takes a reference
+        return ms.media_store.StagedBlob(None, sha256, reference.get('size') or 0), None
+    if media_root:
+        source = os.path.join(media_root, store.root.name, os.path.relpath(store.path_for(sha256), store.root))
+        if os.path.exists(source):
+            return store.stage_file(source), None
+    return None, 'missing'
+
+
+def import_ndjson(path, media_root=None, batch_size=IMPORT_BATCH):
+    """
+    Import an export in batched transactions. Each batch commits together
+    with the export's progress row, so a crash or bad line loses at most one
+    uncommitted batch and re-running the import resumes after the last
+    committed line instead of duplicating memories.
+    """
+    import memory_server as ms  # memory_server imports this module for its export route
+
+    ms.init_db()
+    stats = {'imported': 0, 'skipped_lines': 0, 'media_missing': 0, 'complete': False}
+    with ms.get_pool().connection() as conn, open(path, encoding='utf-8') as f:
+        cursor = conn.cursor()
+        create_schema(cursor)
+        conn.commit()
+
+        header = json.loads(f.readline() or '{}')
+        if header.get('kind') != 'header' or header.get('format') != FORMAT:
+            raise ValueError(f'{path} is not a {FORMAT} export')
+        if header.get('version', 0) > FORMAT_VERSION:
+            raise ValueError(f"Export version {header['version']} is newer than this importer")
+        export_id = header['export_id']
+        cursor.execute('SELECT line_no FROM import_progress WHERE export_id = ?', (export_id,))
+        row = cursor.fetchone()
+        resume_after = row[0] if row else 1
+        if row:
+            print(f"↩️ Resuming import of {export_id} after line {resume_after}")
+
+        batch, staged = [], []
+
+        def flush(line_no):
+            if not batch:
+                return
+            try:
+                with ms.deferred_vectors() as append_committed_vectors:
+                    for memory, image_blob, audio_blob in batch:
+                        ms.insert_memory(cursor, memory, image_blob, audio_blob)
+                    cursor.execute('''
+                        INSERT INTO import_progress (export_id, line_no, imported) VALUES (?, ?, ?)
+                        ON CONFLICT(export_id) DO UPDATE SET
+                            line_no = excluded.line_no,
+                            imported = imported + excluded.imported,
+                            updated_at = CURRENT_TIMESTAMP
+                    ''', (export_id, line_no, len(batch)))
+                    conn.commit()
+                    append_committed_vectors()
+                stats['imported'] += len(batch)
+                print(f"📥 {stats['imported']} memories imported (line {line_no})")
+            finally:
+                for blob in staged:
+                    blob.discard()
+                batch.clear()
+                staged.clear()
+
+        last_memory_line = resume_after
+        for line_no, line in enumerate(f, start=2):
+            if line_no <= resume_after:
+                stats['skipped_lines'] += 1
+                continue
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f'Line {line_no}: {e}') from None
+            if record.get('kind') == 'end':
+                stats['complete'] = True
+                continue
+            if record.get('kind') != 'memory':
+                raise ValueError(f"Line {line_no}: unknown record kind {record.get('kind')!r}")
+
+            blobs = {}
+            for kind in ('image', 'audio'):
+                if record.get(kind):
+                    blob, problem = _stage_media(ms, kind, record[kind], media_root)
+                    if blob is None:
+                        stats['media_missing'] += 1
+                        print(f"⚠️ Line {line_no}: {kind} not imported ({problem})")
+                    else:
+                        staged.append(blob)
+                    blobs[kind] = blob
+            batch.append(({
+                'type': record.get('type'),
+                'timestamp': record.get('timestamp'),
+                'text': record.get('content') or '',
+                'name': record.get('name'),
+                'metadata': record.get('metadata') or {},
+                'recognition_data': record.get('recognition_data'),
+                'voice_data': record.get('voice_data'),
+            }, blobs.get('image'), blobs.get('audio')))
+            last_memory_line = line_no
+            if len(batch) >= batch_size:
+                flush(line_no)
+        # Progress stops at the last memory line, so a re-run still sees the end record
+        flush(last_memory_line)
+    if not stats['complete']:
+        print("⚠️ No end record: the export file looks truncated")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export or import the memories database as NDJSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='stream every memory to NDJSON')
+    export.add_argument('-o', '--output', help='file to write (default: stdout)')
+    export.add_argument('--media', choices=MEDIA_MODES, default='hash',
+                        help='leave media out, reference it by SHA-256, or inline it as base64')
+    restore = commands.add_parser('import', help='import an NDJSON export, resuming if interrupted')
+    restore.add_argument('path')
+    restore.add_argument('--media-root', help='directory of the source server, for hash-referenced media')
+    restore.add_argument('--batch', type=int, default=IMPORT_BATCH, help='memories per transaction')
+    for command in (export, restore):
+        command.add_argument('--user', help="a user's shard instead of the default database")
+    args = parser.parse_args()
+
+    import memory_server as ms
+
+    with ms.get_router().use(args.user) if args.user else nullcontext():
+        if args.command == 'export':
+            ms.init_db()
+            out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+            try:
+                with ms.get_pool().connection() as conn:
+                    for chunk in iter_export(conn, ms.store_for('image'), ms.store_for('audio'),
+                                             ms.media_dir('audio'), args.media, ms.get_archive()):
+                        out.write(chunk)
+            finally:
+                if args.output:
+                    out.close()
+        else:
+            stats = import_ndjson(args.path, args.media_root, max(1, args.batch))
+            print(f"✅ Imported {stats['imported']} memories "
+                  f"({stats['skipped_lines']} lines already imported, {stats['media_missing']} media missing)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Media Store Migration
+Moves memory images and audio saved as memory_<id>_<time>.jpg / audio_<id>_<time>.webm
+into the content-addressed blob store, deduplicating identical files.
+
+Run from the directory memory_server.py runs in:
+    python3 migrate_media_store.py [--dry-run] [--delete-orphans]
+"""
+
+import argparse
+import os
+
+import memory_server as ms
+
+
+def legacy_rows(conn):
+    """Memories whose image or audio has not been moved into the blob store yet"""
+    return conn.execute('''
+        SELECT id, image_path, image_hash, audio_path, audio_hash FROM memories
+        WHERE (image_path IS NOT NULL AND image_hash IS NULL)
+           OR (audio_path IS NOT NULL AND audio_hash IS NULL)
+    ''').fetchall()
+
+
+def migrate_file(conn, memory_id, kind, legacy_path, dry_run):
+    """Stage one legacy file, point its memory at the blob and remove the original"""
+    store = ms.IMAGE_STORE if kind == 'image' else ms.AUDIO_STORE
+    if not os.path.exists(legacy_path):
+        print(f"⚠️ Memory {memory_id}: {kind} file missing: {legacy_path}")
+        return False
+    if dry_run:
+        print(f"📦 Memory {memory_id}: would move {legacy_path}")
+        return True
+
+    staged = store.stage_file(legacy_path)
+    try:
+        cursor = conn.cursor()
+        path = store.commit(cursor, staged)
+        stored_path = str(path) if kind == 'image' else path.name
+        cursor.execute(f'UPDATE memories SET {kind}_path = ?, {kind}_hash = ? WHERE id = ?',
+                       (stored_path, staged.sha256, memory_id))
+        ms.response_cache.bump_generation(cursor)
+        conn.commit()
+    finally:
+        staged.discard()
+    if os.path.abspath(legacy_path) != os.path.abspath(path):
+        os.remove(legacy_path)
+    return True
+
+
+def find_orphans(conn):
+    """Top-level legacy files in the media directories that no memory references"""
+    referenced = set()
+    for image_path, audio_path in conn.execute('SELECT image_path, audio_path FROM memories'):
+        if image_path:
+            referenced.add(os.path.abspath(image_path))
+        if audio_path:
+            referenced.add(os.path.abspath(os.path.join(ms.AUDIO_DIR, audio_path)))
+    orphans = []
+    for directory in (ms.IMAGE_DIR, ms.AUDIO_DIR):
+        for entry in os.scandir(directory):
+            if entry.is_file() and os.path.abspath(entry.path) not in referenced:
+                orphans.append(entry.path)
+    return orphans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move memory media into the content-addressed blob store')
+    parser.add_argument('--dry-run', action='store_true', help='report what would move without changing anything')
+    parser.add_argument('--delete-orphans', action='store_true', help='remove legacy files no memory references')
+    args = parser.parse_args()
+
+    ms.init_db()
+    moved = missing = 0
+    with ms.get_pool().connection() as conn:
+        for row in legacy_rows(conn):
+            if row['image_path'] and not row['image_hash']:
+                if migrate_file(conn, row['id'], 'image', row['image_path'], args.dry_run):
+                    moved += 1
+                else:
+                    missing += 1
+            if row['audio_path'] and not row['audio_hash']:
+                if migrate_file(conn, row['id'], 'audio', os.path.join(ms.AUDIO_DIR, row['audio_path']), args.dry_run):
+                    moved += 1
+                else:
+                    missing += 1
+
+        orphans = find_orphans(conn)
+        for orphan in orphans:
+            if args.delete_orphans and not args.dry_run:
+                os.remove(orphan)
+                print(f"🗑️ Removed orphan {orphan}")
+            else:
+                print(f"⚠️ Orphan file (no memory references it): {orphan}")
+
+    action = 'Would move' if args.dry_run else 'Moved'
+    print(f"✅ {action} {moved} files into the blob store, {missing} missing, {len(orphans)} orphans")
+
+
+if __name__ == '__main__':
+    main()
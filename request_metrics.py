@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Request Metrics
+Per-route latency histograms with the time split into phases, SQLite query
+counters with a slow-query log, Prometheus text for /metrics, and an opt-in
+sampling profiler for single requests
+
+Phases are exclusive: entering one pauses the phase around it, so a request's
+db + decode + serialize + file + other always adds up to its wall time.
+"""
+
+import bisect
+import contextvars
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+PHASES = ('db', 'decode', 'serialize', 'file', 'other')
+SLOW_QUERY_SECONDS = 0.1
+SLOW_QUERY_LOG_CHARS = 200
+BACKGROUND_ROUTE = 'background'  # queries made outside a request (writer and thumbnail threads)
+
+# Sampling profiler, switched on per request with the header when the server allows it
+PROFILE_HEADER = 'X-Profile'
+PROFILE_INTERVAL = 0.005      # a busy thread only yields the GIL every 5 ms anyway
+PROFILE_DIR = 'profiles'
+PROFILE_MAX_DEPTH = 64
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_current = contextvars.ContextVar('request_timer', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label tuple, in the Prometheus layout"""
+
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for label_values, counts, total in series:
+            labels = _labels(self.labels, label_values)
+            running = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                running += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), label_values + (le,))} {running}')
+            lines.append(f'{self.name}_sum{labels} {total:.6f}')
+            lines.append(f'{self.name}_count{labels} {running}')
+        return lines
+
+
+class CounterFamily:
+    """Monotonic counters per label tuple"""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f'{self.name}{_labels(self.labels, labels)} {value}' for labels, value in values)
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+REQUESTS = CounterFamily('drchinki_requests_total', 'HTTP requests by route, method and status',
+                         ('route', 'method', 'status'))
+REQUEST_SECONDS = Histogram('drchinki_request_duration_seconds', 'Request wall time by route',
+                            ('route', 'method'))
+PHASE_SECONDS = Histogram('drchinki_request_phase_seconds', 'Request time spent in each phase by route',
+                          ('route', 'phase'))
+QUERIES = CounterFamily('drchinki_sqlite_queries_total', 'SQLite statements executed by route', ('route',))
+SLOW_QUERIES = CounterFamily('drchinki_sqlite_slow_queries_total',
+                             f'SQLite statements slower than {SLOW_QUERY_SECONDS}s by route', ('route',))
+QUERY_SECONDS = Histogram('drchinki_sqlite_query_seconds', 'SQLite statement execution time', (),
+                          QUERY_BUCKETS)
+FAMILIES = [REQUESTS, REQUEST_SECONDS, PHASE_SECONDS, QUERIES, SLOW_QUERIES, QUERY_SECONDS]
+
+
+def register(family):
+    """Add another module's histogram or counter family to /metrics; returns it"""
+    FAMILIES.append(family)
+    return family
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+class RequestTimer:
+    """Phase clock for one request, reachable from any thread running in its context"""
+
+    __slots__ = ('route', 'method', 'path', 'start', 'phases', 'current', 'mark',
+                 'queries', 'slow_queries', 'profiler', 'token')
+
+    def __init__(self, route, method, path):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.start = self.mark = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.current = 'other'
+        self.queries = 0
+        self.slow_queries = 0
+        self.profiler = None
+        self.token = None
+
+    def switch(self, phase):
+        """Charge the time since the last switch to the running phase and start `phase`"""
+        now = time.perf_counter()
+        self.phases[self.current] += now - self.mark
+        previous, self.current, self.mark = self.current, phase, now
+        return previous
+
+
+def begin(route, method, path='', profile=False):
+    """Start timing the current request; route may be filled in later (ASGI routes after middleware)"""
+    global _in_flight
+    timer = RequestTimer(route, method, path)
+    timer.token = _current.set(timer)
+    if profile:
+        timer.profiler = SamplingProfiler()
+        timer.profiler.add_thread(threading.get_ident())
+        timer.profiler.start()
+    with _in_flight_lock:
+        _in_flight += 1
+    return timer
+
+
+def stop_profile(timer):
+    """Stop a request's profiler and save its samples; (path, samples) or None"""
+    if timer is None or timer.profiler is None:
+        return None
+    profiler, timer.profiler = timer.profiler, None
+    stacks = profiler.stop()
+    return save_profile(stacks, timer.route or timer.path), sum(stacks.values())
+
+
+def finish(timer, status):
+    """Record a finished request into the route histograms and counters"""
+    global _in_flight
+    if timer is None:
+        return
+    stop_profile(timer)
+    timer.switch(timer.current)
+    elapsed = time.perf_counter() - timer.start
+    route = timer.route or 'unmatched'
+    REQUESTS.inc((route, timer.method, str(status)))
+    REQUEST_SECONDS.observe((route, timer.method), elapsed)
+    for phase, seconds in timer.phases.items():
+        if seconds:
+            PHASE_SECONDS.observe((route, phase), seconds)
+    if timer.queries:
+        QUERIES.inc((route,), timer.queries)
+    if timer.slow_queries:
+        SLOW_QUERIES.inc((route,), timer.slow_queries)
+    with _in_flight_lock:
+        _in_flight -= 1
+    try:
+        _current.reset(timer.token)
+    except ValueError:
+        # Finished from a different context than it began in (ASGI teardown)
+        _current.set(None)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Charge the enclosed time to `name` instead of the surrounding phase"""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    previous = timer.switch(name)
+    try:
+        yield
+    finally:
+        timer.switch(previous)
+
+
+@contextmanager
+def attach_thread():
+    """Let a running profiler sample this worker thread while it serves the request"""
+    timer = _current.get()
+    profiler = timer.profiler if timer is not None else None
+    if profiler is None:
+        yield
+        return
+    ident = threading.get_ident()
+    profiler.add_thread(ident)
+    try:
+        yield
+    finally:
+        profiler.remove_thread(ident)
+
+
+def record_query(sql, elapsed, timer):
+    QUERY_SECONDS.observe((), elapsed)
+    slow = elapsed >= SLOW_QUERY_SECONDS
+    if timer is None:
+        # Request queries are added under the final route label in finish()
+        QUERIES.inc((BACKGROUND_ROUTE,))
+        if slow:
+            SLOW_QUERIES.inc((BACKGROUND_ROUTE,))
+    else:
+        timer.queries += 1
+        timer.slow_queries += slow
+    if slow:
+        where = (timer.route or timer.path) if timer is not None else BACKGROUND_ROUTE
+        statement = ' '.join(sql.split())[:SLOW_QUERY_LOG_CHARS]
+        print(f"🐢 Slow query ({elapsed * 1000:.0f} ms, {where}): {statement}")
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that counts and times statements and charges them to the request's db phase"""
+
+    def _timed(self, method, sql, *args):
+        timer = _current.get()
+        previous = timer.switch('db') if timer is not None else None
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            record_query(sql, time.perf_counter() - start, timer)
+            if timer is not None:
+                timer.switch(previous)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(super().executescript, sql_script)
+
+    def _fetch(self, method, *args):
+        # Rows are stepped lazily, so fetching is db time too (but not a new query)
+        timer = _current.get()
+        if timer is None:
+            return method(*args)
+        previous = timer.switch('db')
+        try:
+            return method(*args)
+        finally:
+            timer.switch(previous)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection factory whose cursors, including conn.execute's, are TimedCursors"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # The C implementations of these shortcuts don't go through cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the request's threads every PROFILE_INTERVAL seconds
+    from a daemon thread and counts them as folded stacks (root;...;leaf).
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._threads = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_thread(self, ident):
+        self._threads.add(ident)
+
+    def remove_thread(self, ident):
+        self._threads.discard(ident)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in tuple(self._threads):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.stacks[self.fold(frame)] += 1
+
+    @staticmethod
+    def fold(frame):
+        names = []
+        while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+            code = frame.f_code
+            names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+
+def save_profile(stacks, label):
+    """Write folded stacks (flamegraph.pl / speedscope input) and return the file path"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_') or 'request'
+    path = os.path.join(PROFILE_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{slug}-{os.getpid()}.folded')
+    with open(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
+
+
+def wants_profile(header_value, enabled):
+    """Whether a request asked for profiling and the server allows it"""
+    return enabled and (header_value or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _gauge_lines(stats):
+    """Numeric /health counters as untyped samples: {'db_pool': {'idle': 3}} -> drchinki_db_pool_idle 3"""
+    lines = []
+    for section, values in stats.items():
+        if not isinstance(values, dict):
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                name = f'drchinki_{section}_{key}'
+                lines.append(f'# TYPE {name} untyped')
+                lines.append(f'{name} {value}')
+    return lines
+
+
+def render(stats=None):
+    """Prometheus text exposition of every family, plus numeric service stats"""
+    lines = ['# HELP drchinki_requests_in_flight Requests currently being served',
+             '# TYPE drchinki_requests_in_flight gauge',
+             f'drchinki_requests_in_flight {_in_flight}']
+    for family in FAMILIES:
+        lines.extend(family.render())
+    if stats:
+        lines.extend(_gauge_lines(stats))
+    return '\n'.join(lines) + '\n'
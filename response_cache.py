@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Response Cache
+In-process LRU of serialised read responses, invalidated by a data generation counter
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def create_schema(cursor):
+    """Single-row counter bumped in the same transaction as every write that changes a read"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO data_generation (id, generation) VALUES (1, 0)')
+
+
+def bump_generation(cursor):
+    """Invalidate every cached response once the current transaction commits"""
+    cursor.execute('UPDATE data_generation SET generation = generation + 1 WHERE id = 1')
+
+
+def read_generation(conn):
+    # Stored in SQLite rather than in memory so every server worker process sees writes
+    return conn.execute('SELECT generation FROM data_generation WHERE id = 1').fetchone()[0]
+
+
+def body_etag(body):
+    """Strong validator derived from the response bytes, so unchanged data stays a 304 across generations"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU of (generation, body, status, etag) keyed by route and parameters,
+    bounded by entry count and total bytes. An entry from an older
+    generation is treated as a miss and replaced.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def get(self, key, generation):
+        """(body, status, etag) if cached for this generation, else None"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[1:]
+
+    def put(self, key, generation, body, status, etag):
+        if not self.enabled or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            self._items[key] = (generation, body, status, etag)
+            self._bytes += len(body)
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted[1])
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Cache counters for /health"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._items),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0,
+            }
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Row Serializer
+Memory rows to JSON bytes with stored JSON columns passed through undecoded
+"""
+
+import json
+import os
+import re
+
+try:
+    import orjson
+except ImportError:  # the standard library encoder is used without orjson
+    orjson = None
+
+# Columns stored as JSON text, with the value sent when the column is empty
+JSON_COLUMN_DEFAULTS = {
+    'metadata': b'{}',
+    'recognition_data': b'null',
+    'voice_data': b'null',
+}
+STREAM_BATCH_ROWS = 500
+
+
+class RawJSON:
+    """Already-encoded JSON spliced verbatim into the output by encode()"""
+
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+
+def raw_json(text, default=b'null'):
+    """Stored JSON text as a RawJSON value; empty or NULL columns become `default`"""
+    return RawJSON(text.encode('utf-8') if text else default)
+
+
+if orjson is not None:
+    def dumps(value, default=None):
+        return orjson.dumps(value, default=default)
+else:
+    def dumps(value, default=None):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=default).encode('utf-8')
+
+
+def encode(payload):
+    """
+    Compact UTF-8 JSON for a payload that may hold RawJSON values anywhere.
+    Each RawJSON is encoded as a unique placeholder string and swapped for its
+    bytes afterwards, so the rest of the payload stays on the fast encoder.
+    """
+    spliced = []
+
+    def placeholder(value):
+        if not isinstance(value, RawJSON):
+            raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+        spliced.append(value.raw)
+        return f'\x00{token}:{len(spliced) - 1}\x00'
+
+    token = os.urandom(8).hex()
+    body = dumps(payload, default=placeholder)
+    if not spliced:
+        return body
+    pattern = re.compile(rb'"\\u0000' + token.encode() + rb':(\d+)\\u0000"')
+    return pattern.sub(lambda m: spliced[int(m.group(1))], body)
+
+
+def encode_row(row, fields):
+    """One row as a JSON object; JSON columns are copied from the stored text, not decoded"""
+    plain = {}
+    raw = []
+    for field in fields:
+        value = row[field]
+        if field in JSON_COLUMN_DEFAULTS:
+            raw.append(b'"' + field.encode() + b'":' + (value.encode('utf-8') if value else JSON_COLUMN_DEFAULTS[field]))
+        else:
+            plain[field] = value
+    body = dumps(plain)
+    if not raw:
+        return body
+    separator = b',' if plain else b''
+    return body[:-1] + separator + b','.join(raw) + b'}'
+
+
+def encode_rows(rows, fields):
+    """A JSON array of rows, ready to embed in a payload"""
+    return RawJSON(b'[' + b','.join([encode_row(row, fields) for row in rows]) + b']')
+
+
+def iter_envelope(head, key, cursor, fields, tail=None):
+    """
+    Stream {**head, key: [rows...], **tail, "count": n} from a cursor that has
+    already executed its query, fetching STREAM_BATCH_ROWS rows at a time so
+    memory stays flat however many rows there are.
+    """
+    yield encode(head)[:-1] + (b',' if head else b'') + dumps(key) + b':['
+    count = 0
+    while True:
+        rows = cursor.fetchmany(STREAM_BATCH_ROWS)
+        if not rows:
+            break
+        chunk = b','.join([encode_row(row, fields) for row in rows])
+        yield (b',' if count else b'') + chunk
+        count += len(rows)
+    yield b'],' + encode(dict(tail or {}, count=count))[1:]
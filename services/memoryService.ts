@@ -48,17 +48,47 @@ export interface SaveMemoryResponse {
     name?: string;
 }
 
+export interface NewMemory {
+    text?: string;
+    image?: string;
+    audio?: string;
+    name?: string;
+    metadata?: Record<string, any>;
+    recognition_data?: any;
+    voice_data?: any;
+}
+
+export interface SaveMemoriesBatchResponse {
+    success: boolean;
+    message: string;
+    count?: number;
+    memory_ids?: number[];
+}
+
 export interface ListMemoriesResponse {
     success: boolean;
     count: number;
     memories: Memory[];
+    next_cursor?: string | null;
+}
+
+export interface ListMemoriesOptions {
+    limit?: number;
+    cursor?: string | null;
+    fields?: (keyof Memory)[];
+    includeArchived?: boolean;
+}
+
+export interface SearchResult extends Memory {
+    snippet?: string | null;
+    score?: number | null;
 }
 
 export interface SearchMemoriesResponse {
     success: boolean;
     count: number;
     query: string;
-    memories: Memory[];
+    memories: SearchResult[];
 }
 
 /**
@@ -100,11 +130,72 @@ export async function saveMemory(
 }
 
 /**
- * Retrieve all memories from the database
+ * Save many memories in one request and one database transaction
+ * (the server accepts up to 500 per batch)
  */
-export async function getMemories(): Promise<ListMemoriesResponse> {
+export async function saveMemoriesBatch(memories: NewMemory[]): Promise<SaveMemoriesBatchResponse> {
     try {
-        const response = await fetch(`${API_BASE_URL}/list`);
+        const response = await fetch(`${API_BASE_URL}/save_batch`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ memories }),
+        });
+
+        const data = await response.json();
+        return data;
+    } catch (error) {
+        console.error('Error saving memories:', error);
+        return {
+            success: false,
+            message: `Failed to save memories: ${error}`,
+        };
+    }
+}
+
+/**
+ * Stream an image or audio Blob to an existing memory as a raw request body.
+ * Avoids base64-encoding large LiveTutor recordings into a JSON payload.
+ */
+export async function uploadMemoryMedia(
+    memoryId: number,
+    kind: 'image' | 'audio',
+    blob: Blob
+): Promise<{ success: boolean; sha256?: string; size?: number; message?: string }> {
+    try {
+        const response = await fetch(`${API_BASE_URL}/${memoryId}/${kind}`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': blob.type || 'application/octet-stream',
+            },
+            body: blob,
+        });
+        const data = await response.json();
+        return data;
+    } catch (error) {
+        console.error(`Error uploading ${kind}:`, error);
+        return {
+            success: false,
+            message: `Failed to upload ${kind}: ${error}`,
+        };
+    }
+}
+
+/**
+ * Retrieve memories from the database, newest first.
+ * Pass a limit (and the previous page's next_cursor) to page through large stores,
+ * and fields to skip decoding columns the caller does not need.
+ */
+export async function getMemories(options: ListMemoriesOptions = {}): Promise<ListMemoriesResponse> {
+    try {
+        const params = new URLSearchParams();
+        if (options.limit) params.set('limit', String(options.limit));
+        if (options.cursor) params.set('cursor', options.cursor);
+        if (options.fields?.length) params.set('fields', options.fields.join(','));
+        if (options.includeArchived) params.set('include_archived', '1');
+        const query = params.toString();
+        const response = await fetch(`${API_BASE_URL}/list${query ? `?${query}` : ''}`);
         const data = await response.json();
         return data;
     } catch (error) {
@@ -120,9 +211,10 @@ export async function getMemories(): Promise<ListMemoriesResponse> {
 /**
  * Search memories by text query
  */
-export async function searchMemories(query: string): Promise<SearchMemoriesResponse> {
+export async function searchMemories(query: string, limit?: number): Promise<SearchMemoriesResponse> {
     try {
-        const response = await fetch(`${API_BASE_URL}/search?query=${encodeURIComponent(query)}`);
+        const limitParam = limit ? `&limit=${limit}` : '';
+        const response = await fetch(`${API_BASE_URL}/search?query=${encodeURIComponent(query)}${limitParam}`);
         const data = await response.json();
         return data;
     } catch (error) {
@@ -155,24 +247,59 @@ export async function deleteMemory(memoryId: number): Promise<{ success: boolean
     }
 }
 
+export type MemoryChangeOp = 'insert' | 'update' | 'delete' | 'archive';
+
+export interface MemoryChange {
+    seq: number;
+    op: MemoryChangeOp;
+    memory_id: number;
+    at: string;
+    memory: Memory | null;
+}
+
+/**
+ * Follow memory inserts, updates, deletes and archiving as server-sent events.
+ * The browser reconnects on its own and resumes after the last change it saw;
+ * onReset fires when the server can no longer replay the gap, so the caller
+ * should reload its list. Returns a function that closes the stream.
+ */
+export function subscribeToMemoryChanges(
+    onChange: (change: MemoryChange) => void,
+    onReset?: () => void
+): () => void {
+    const source = new EventSource(`${API_BASE_URL}/changes`);
+    source.onmessage = (event) => {
+        try {
+            onChange(JSON.parse(event.data));
+        } catch (error) {
+            console.error('Error reading memory change:', error);
+        }
+    };
+    source.addEventListener('reset', () => onReset?.());
+    return () => source.close();
+}
+
 /**
- * Get image URL for a memory
+ * Get image URL for a memory.
+ * Pass a size (128 or 512) to get a WebP thumbnail for tiles and previews.
  */
-export function getImageUrl(imagePath: string): string {
+export function getImageUrl(imagePath: string, size?: 128 | 512): string {
     if (!imagePath) return '';
     const filename = imagePath.split('/').pop();
-    return `http://localhost:5000/api/memory/image/${filename}`;
+    const sizeParam = size ? `?size=${size}` : '';
+    return `http://localhost:5000/api/memory/image/${filename}${sizeParam}`;
 }
 
 /**
  * Recognize a person/object from description
  */
-export async function recognizeFromDescription(description: string): Promise<{
+export async function recognizeFromDescription(description: string, mode?: 'words' | 'embedding'): Promise<{
     success: boolean;
     found: boolean;
     name?: string;
     similarity?: number;
     message?: string;
+    mode?: 'words' | 'embedding';
 }> {
     try {
         const response = await fetch(`${API_BASE_URL}/recognize`, {
@@ -180,7 +307,7 @@ export async function recognizeFromDescription(description: string): Promise<{
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ description }),
+            body: JSON.stringify({ description, mode }),
         });
         const data = await response.json();
         return data;
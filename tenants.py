@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Tenants
+Per-user shards: each user gets their own SQLite file and media directories,
+opened on first use and closed again when they fall out of an LRU of open shards
+
+Shards live at <root>/<bucket>/<user_id>/ where the bucket is a hash of the
+user id, so no directory ever holds more than a slice of the users. Requests
+without a user id keep using the server's default database.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from media_store import MediaStore
+from memory_db import ConnectionPool
+
+try:
+    import resource
+except ImportError:  # not on Windows: the open-shard limit stays at its floor
+    resource = None
+
+USER_HEADER = 'X-User-Id'
+USER_PARAM = 'user'            # for <img>/<audio> URLs, which can't send headers
+USER_ID = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.@-]{0,63}$')
+BUCKET_CHARS = 2               # 256 hash buckets
+SHARD_POOL_SIZE = 1            # idle connections kept per shard (3 file descriptors each with WAL)
+RESERVED_FDS = 256             # descriptors left for sockets, media files and the default database
+SHARD_MAX_CONCURRENT = 4       # DB jobs one user may run at once on the ASGI executor
+
+
+
+def default_max_open(floor=128, ceiling=1024):
+    """
+    How many shards to keep open: as many as the file descriptor limit allows.
+    Reopening an evicted shard costs a new connection (and its schema parse)
+    plus a WAL checkpoint when the old one closed, so the LRU should cover
+    the active users.
+    """
+    if resource is None:
+        return floor
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit == resource.RLIM_INFINITY:
+        return ceiling
+    return max(floor, min(ceiling, (soft_limit - RESERVED_FDS) // (3 * SHARD_POOL_SIZE)))
+
+
+MAX_OPEN_SHARDS = default_max_open()
+
+_current = contextvars.ContextVar('tenant_shard', default=None)
+
+
+class InvalidUserId(ValueError):
+    pass
+
+
+def parse_user_id(header_value, param_value=None):
+    """The request's user id (header first, then query parameter), None if absent"""
+    user_id = (header_value or param_value or '').strip()
+    if not user_id:
+        return None
+    if not USER_ID.match(user_id):
+        raise InvalidUserId('User id must be 1-64 letters, digits, or _ . @ - characters')
+    return user_id
+
+
+class Shard:
+    """One user's database file, media stores and lazily built in-memory indexes"""
+
+    def __init__(self, user_id, directory, factory):
+        self.user_id = user_id
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(self.directory / 'memories.db')
+        self.image_dir = self.directory / 'memory_images'
+        self.audio_dir = self.directory / 'memory_audios'
+        self.image_store = MediaStore(self.image_dir, '.jpg', 'image')
+        self.audio_store = MediaStore(self.audio_dir, '.webm', 'audio')
+        self.pool = ConnectionPool(self.db_path, max_size=SHARD_POOL_SIZE, factory=factory)
+        # Filled in by memory_server on first use
+        self.vector_index = None
+        self.voice_index = None
+        self.writer = None
+        self.archive = None
+        self.change_feed = None
+        self.lock = threading.Lock()
+        self.borrowers = 0
+        self.ready = threading.Event()
+        self.error = None
+        self._slots = None
+
+    @property
+    def slots(self):
+        """Per-user cap on concurrent DB jobs; created on the event loop that first asks"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(SHARD_MAX_CONCURRENT)
+        return self._slots
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.archive is not None:
+            self.archive.close()
+        if self.change_feed is not None:
+            self.change_feed.close()
+        self.pool.retire()
+
+
+class ShardRouter:
+    """
+    Maps user ids to shards. Shards open lazily (schema created by the
+    `initialize` callback) and at most `max_open` stay open: the least
+    recently used shard nobody is borrowing is closed to make room.
+    `on_open(shard)` runs each time a shard is opened, including reopens after
+    eviction, and `on_close(shard)` each time one is closed.
+    """
+
+    def __init__(self, root, initialize, factory=sqlite3.Connection, max_open=MAX_OPEN_SHARDS,
+                 on_open=None, on_close=None):
+        self.root = Path(root)
+        self.initialize = initialize
+        self.on_open = on_open
+        self.on_close = on_close
+        self.factory = factory
+        self.max_open = max_open
+        self._open = OrderedDict()
+        # Shards whose schema this process has already set up: reopening one
+        # after eviction only needs new connections
+        self._initialized = set()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.evicted = 0
+        self.hits = 0
+
+    def shard_dir(self, user_id):
+        if not USER_ID.match(user_id):
+            raise InvalidUserId(f'Invalid user id: {user_id!r}')
+        bucket = hashlib.sha256(user_id.encode()).hexdigest()[:BUCKET_CHARS]
+        return self.root / bucket / user_id
+
+    def acquire(self, user_id):
+        """Borrow a user's shard, opening it on first use; pair with release()"""
+        creator = reopened = False
+        with self._lock:
+            shard = self._open.get(user_id)
+            if shard is not None:
+                self._open.move_to_end(user_id)
+                self.hits += 1
+            else:
+                shard = Shard(user_id, self.shard_dir(user_id), self.factory)
+                self._open[user_id] = shard
+                self.opened += 1
+                if user_id in self._initialized:
+                    shard.ready.set()
+                    reopened = True
+                else:
+                    creator = True
+            shard.borrowers += 1
+            evicted = self._evict()
+        self._close(evicted)
+        if reopened:
+            self._opened(shard)
+        if shard.ready.is_set():
+            return shard
+        if creator:
+            # Schema creation runs outside the router lock; other borrowers wait on ready
+            try:
+                token = _current.set(shard)
+                try:
+                    self.initialize(shard)
+                finally:
+                    _current.reset(token)
+                with self._lock:
+                    self._initialized.add(user_id)
+                self._opened(shard)
+            except Exception as e:
+                shard.error = e
+                with self._lock:
+                    if self._open.get(user_id) is shard:
+                        del self._open[user_id]
+            finally:
+                shard.ready.set()
+        else:
+            shard.ready.wait()
+        if shard.error is not None:
+            self.release(shard)
+            raise shard.error
+        return shard
+
+    def _evict(self):
+        """Drop least recently used idle shards beyond max_open (called under the lock)"""
+        evicted = []
+        if len(self._open) <= self.max_open:
+            return evicted
+        for user_id, shard in list(self._open.items()):
+            if len(self._open) - len(evicted) <= self.max_open:
+                break
+            if shard.borrowers == 0 and shard.ready.is_set():
+                evicted.append(shard)
+        for shard in evicted:
+            del self._open[shard.user_id]
+        self.evicted += len(evicted)
+        return evicted
+
+    def _opened(self, shard):
+        if self.on_open is not None:
+            self.on_open(shard)
+
+    def _close(self, shards):
+        for shard in shards:
+            shard.close()
+            if self.on_close is not None:
+                self.on_close(shard)
+
+    def release(self, shard):
+        with self._lock:
+            shard.borrowers -= 1
+            evicted = self._evict()
+        self._close(evicted)
+
+    @contextmanager
+    def use(self, user_id):
+        """Borrow a shard and make it the current one for the with-block"""
+        shard = self.acquire(user_id)
+        token = _current.set(shard)
+        try:
+            yield shard
+        finally:
+            _current.reset(token)
+            self.release(shard)
+
+    @contextmanager
+    def connection(self, user_id):
+        """A pooled connection to a user's shard (opened if it was evicted)"""
+        shard = self.acquire(user_id)
+        try:
+            with shard.pool.connection() as conn:
+                yield conn
+        finally:
+            self.release(shard)
+
+    def close_all(self):
+        with self._lock:
+            shards, self._open = list(self._open.values()), OrderedDict()
+        self._close(shards)
+
+    def stats(self):
+        """Router counters for /health"""
+        with self._lock:
+            return {
+                'root': str(self.root),
+                'open': len(self._open),
+                'max_open': self.max_open,
+                'borrowed': sum(1 for shard in self._open.values() if shard.borrowers),
+                'opened': self.opened,
+                'evicted': self.evicted,
+                'hits': self.hits,
+            }
+
+
+def activate(shard):
+    """Make `shard` current for this context; returns a token for deactivate()"""
+    return _current.set(shard)
+
+
+def deactivate(token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Reset from a different context than it was set in (ASGI teardown)
+        _current.set(None)
+
+
+def current():
+    """The shard serving this request, or None for the default database"""
+    return _current.get()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Thumbnails
+Background pipeline that renders downscaled WebP thumbnails of memory images
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # thumbnails are skipped without Pillow
+    Image = None
+
+THUMBNAIL_SIZES = (128, 512)
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_MAX_IN_FLIGHT = 32   # bound on jobs handed to the process pool at once
+THUMBNAIL_POLL_SECONDS = 5.0   # how often pending jobs are re-checked without a kick
+
+
+def thumbnail_path(root, sha256, size):
+    """Where the <size>px thumbnail of a blob lives"""
+    return Path(root) / 'thumbs' / str(size) / sha256[:2] / sha256[2:4] / f'{sha256}.webp'
+
+
+def render_thumbnails(source, targets):
+    """Downscale one image to every (size, dest) target; runs in a worker process"""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        for size, dest in targets:
+            thumb = image.copy()
+            thumb.thumbnail((size, size))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp_path = f'{dest}.part'
+            thumb.save(tmp_path, 'WEBP', quality=80, method=4)
+            os.replace(tmp_path, dest)
+    return len(targets)
+
+
+def create_schema(cursor):
+    """Job table: one row per image blob, status pending/running/done/failed/skipped"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS thumbnail_jobs (
+            sha256 TEXT PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_thumbnail_jobs_status ON thumbnail_jobs(status, created_at)
+    ''')
+    # Jobs that were running when the server stopped get another go
+    cursor.execute("UPDATE thumbnail_jobs SET status = 'pending' WHERE status = 'running'")
+
+
+def queue_job(cursor, sha256):
+    """Record a pending job for a new image blob (no-op if one exists)"""
+    cursor.execute("INSERT OR IGNORE INTO thumbnail_jobs (sha256) VALUES (?)", (sha256,))
+
+
+def delete_job(cursor, sha256):
+    """Forget a released blob's job (its thumbnails go with the file, see remove_thumbnails)"""
+    cursor.execute('DELETE FROM thumbnail_jobs WHERE sha256 = ?', (sha256,))
+
+
+def remove_thumbnails(root, sha256):
+    """Remove a blob's thumbnails once its file has been unlinked"""
+    for size in THUMBNAIL_SIZES:
+        try:
+            os.remove(thumbnail_path(root, sha256, size))
+        except OSError:
+            pass
+
+
+class ThumbnailWorker:
+    """
+    Dispatcher thread that claims pending jobs from thumbnail_jobs and renders
+    them on a process pool, so request threads never wait on image work.
+    The table is the queue: jobs survive restarts and at most
+    THUMBNAIL_MAX_IN_FLIGHT are handed to the pool at a time.
+
+    Besides the default database (polled every THUMBNAIL_POLL_SECONDS), extra
+    sources such as per-user shards are added with add_source() and only
+    checked after a kick() for them, until their queue is drained.
+    """
+
+    def __init__(self, root, connection_factory):
+        self.root = Path(root)
+        self.connection_factory = connection_factory
+        self._sources = {None: (self.root, connection_factory)}
+        self._dirty = set()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._thread = None
+        self._executor = None
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='thumbnail-dispatcher', daemon=True)
+            self._thread.start()
+
+    def add_source(self, key, root, connection_factory):
+        """Another image root and database whose jobs this worker renders"""
+        with self._lock:
+            self._sources[key] = (Path(root), connection_factory)
+
+    def remove_source(self, key):
+        """Forget a source (renders already on the pool still record their status)"""
+        with self._lock:
+            if key is not None:
+                self._sources.pop(key, None)
+                self._dirty.discard(key)
+
+    def kick(self, source=None):
+        """Tell the dispatcher new jobs are waiting (in the default database, or a source)"""
+        self.start()
+        if source is not None:
+            with self._lock:
+                self._dirty.add(source)
+        self._wake.set()
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _set_status(self, connection_factory, sha256, status, error=None):
+        with connection_factory() as conn:
+            conn.execute('''
+                UPDATE thumbnail_jobs SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE sha256 = ?
+            ''', (status, error, sha256))
+            conn.commit()
+
+    def _claim(self, connection_factory, limit):
+        """Mark up to `limit` pending jobs as running and return them with their source paths"""
+        with connection_factory() as conn:
+            rows = conn.execute('''
+                SELECT j.sha256, b.path FROM thumbnail_jobs j
+                LEFT JOIN media_blobs b ON b.sha256 = j.sha256 AND b.kind = 'image'
+                WHERE j.status = 'pending'
+                ORDER BY j.created_at
+                LIMIT ?
+            ''', (limit,)).fetchall()
+            conn.executemany('''
+                UPDATE thumbnail_jobs SET status = 'running', updated_at = CURRENT_TIMESTAMP
+                WHERE sha256 = ? AND status = 'pending'
+            ''', [(row[0],) for row in rows])
+            conn.commit()
+        return [(row[0], row[1]) for row in rows]
+
+    def _run(self):
+        while True:
+            self._wake.wait(THUMBNAIL_POLL_SECONDS)
+            self._wake.clear()
+            try:
+                self._dispatch()
+            except Exception as e:
+                print(f"❌ Thumbnail dispatcher error: {e}")
+
+    def _dispatch(self):
+        with self._lock:
+            keys = [None] + list(self._dirty)
+        for key in keys:
+            with self._lock:
+                free = THUMBNAIL_MAX_IN_FLIGHT - self._in_flight
+                if key not in self._sources:
+                    continue  # removed since it was kicked
+                root, connection_factory = self._sources[key]
+                # Cleared before claiming, so a kick that lands meanwhile is kept
+                self._dirty.discard(key)
+            if free <= 0:
+                if key is not None:
+                    with self._lock:
+                        self._dirty.add(key)
+                return
+            claimed = self._claim(connection_factory, free)
+            if key is not None and len(claimed) == free:
+                with self._lock:
+                    self._dirty.add(key)
+            self._render(root, connection_factory, claimed)
+
+    def _render(self, root, connection_factory, claimed):
+        for sha256, source in claimed:
+            if not self.enabled:
+                self._set_status(connection_factory, sha256, 'skipped', 'Pillow is not installed')
+                continue
+            if not source or not os.path.exists(source):
+                self._set_status(connection_factory, sha256, 'failed', 'Source blob missing')
+                continue
+            targets = [(size, str(thumbnail_path(root, sha256, size))) for size in THUMBNAIL_SIZES]
+            with self._lock:
+                self._in_flight += 1
+            future = self._pool().submit(render_thumbnails, source, targets)
+            future.add_done_callback(
+                lambda f, sha256=sha256: self._finished(connection_factory, sha256, f))
+
+    def _finished(self, connection_factory, sha256, future):
+        error = future.exception()
+        with self._lock:
+            self._in_flight -= 1
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        try:
+            self._set_status(connection_factory, sha256, 'failed' if error else 'done', str(error) if error else None)
+        except Exception as e:
+            print(f"❌ Error recording thumbnail status: {e}")
+        self._wake.set()
+
+    def stats(self):
+        """Worker counters for /health"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'running': self._thread is not None,
+                'in_flight': self._in_flight,
+                'sources': len(self._sources),
+                'completed': self.completed,
+                'failed': self.failed,
+            }
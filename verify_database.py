@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Database Verification
+Checks the memories database against the media blob store: SQLite integrity,
+JSON columns, blob reference counts, and that every blob file exists with
+the size and SHA-256 recorded for it (hashed in parallel). Also lists files
+in the store that no blob row owns (left by a save that was rolled back, or a
+crash before released blobs were unlinked) and can delete them.
+
+Run from the directory memory_server.py runs in:
+    python3 verify_database.py [--db memories.db | --user <id>] [--quick] [--workers 8] [--fix-refcounts]
+                               [--delete-orphans]
+
+Exits with status 1 when any problem is found.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import memory_server as ms
+from media_store import BLOB_NAME, file_sha256
+
+HASH_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+MAX_REPORTED = 20  # problems printed per check; the rest are only counted
+
+
+class Report:
+    def __init__(self):
+        self.problems = {}
+
+    def add(self, check, message):
+        found = self.problems.setdefault(check, [])
+        if len(found) < MAX_REPORTED:
+            print(f"  ❌ {message}")
+        found.append(message)
+
+    def total(self):
+        return sum(len(found) for found in self.problems.values())
+
+
+def check_sqlite(conn, report, full):
+    print("🔎 SQLite integrity")
+    pragma = 'integrity_check' if full else 'quick_check'
+    for (result,) in conn.execute(f'PRAGMA {pragma}'):
+        if result != 'ok':
+            report.add('sqlite', result)
+
+
+def check_json_columns(conn, report):
+    print("🔎 JSON columns")
+    cursor = conn.execute('SELECT id, metadata, recognition_data, voice_data FROM memories')
+    while rows := cursor.fetchmany(1000):
+        for row in rows:
+            for column in ('metadata', 'recognition_data', 'voice_data'):
+                if row[column]:
+                    try:
+                        json.loads(row[column])
+                    except ValueError as e:
+                        report.add('json', f"Memory {row['id']}: {column} is not valid JSON ({e})")
+
+
+def check_references(conn, report, fix):
+    """Every hash a memory points at has a blob row whose ref_count matches the real count"""
+    print("🔎 Blob references")
+    expected = {(sha256, kind): count for sha256, kind, count in conn.execute('''
+        SELECT sha256, kind, COUNT(*) FROM (
+            SELECT image_hash AS sha256, 'image' AS kind FROM memories WHERE image_hash IS NOT NULL
+            UNION ALL
+            SELECT audio_hash, 'audio' FROM memories WHERE audio_hash IS NOT NULL
+        ) GROUP BY sha256, kind
+    ''')}
+    recorded = {(sha256, kind): ref_count
+                for sha256, kind, ref_count in conn.execute('SELECT sha256, kind, ref_count FROM media_blobs')}
+    fixes = []
+    for (sha256, kind), count in expected.items():
+        blob = f"{kind.title()} blob {sha256[:12]}…"
+        if (sha256, kind) not in recorded:
+            report.add('references', f"{blob} is used by {count} memories but has no media_blobs row")
+        elif recorded[sha256, kind] != count:
+            report.add('references', f"{blob} ref_count {recorded[sha256, kind]}, actually used {count} times")
+            fixes.append((count, sha256, kind))
+    for (sha256, kind), ref_count in recorded.items():
+        if (sha256, kind) not in expected:
+            report.add('references',
+                       f"{kind.title()} blob {sha256[:12]}… has ref_count {ref_count} but no memory uses it")
+            fixes.append((0, sha256, kind))
+    if fix and fixes:
+        # Unused blobs are left at 0 rather than deleted, so the files can be inspected first
+        conn.executemany('UPDATE media_blobs SET ref_count = ? WHERE sha256 = ? AND kind = ?', fixes)
+        conn.commit()
+        print(f"  🔧 Fixed {len(fixes)} reference counts")
+
+    # Stored paths must be where the blob store puts that hash
+    cursor = conn.execute('SELECT id, image_path, image_hash, audio_path, audio_hash FROM memories')
+    while rows := cursor.fetchmany(1000):
+        for row in rows:
+            if row['image_hash'] and row['image_path'] != str(ms.store_for('image').path_for(row['image_hash'])):
+                report.add('references', f"Memory {row['id']}: image_path does not match image_hash")
+            if row['audio_hash'] and row['audio_path'] != ms.store_for('audio').path_for(row['audio_hash']).name:
+                report.add('references', f"Memory {row['id']}: audio_path does not match audio_hash")
+            # Files saved before the blob store have no hash, only a path
+            if row['image_path'] and not row['image_hash'] and not os.path.exists(row['image_path']):
+                report.add('files', f"Memory {row['id']}: legacy image missing: {row['image_path']}")
+            if row['audio_path'] and not row['audio_hash'] and \
+                    not os.path.exists(os.path.join(ms.media_dir('audio'), row['audio_path'])):
+                report.add('files', f"Memory {row['id']}: legacy audio missing: {row['audio_path']}")
+
+
+def verify_blob(blob, quick):
+    """(sha256, problem or None) for one media_blobs row; runs on the hashing pool"""
+    sha256, path, size = blob
+    try:
+        actual_size = os.path.getsize(path)
+    except OSError:
+        return sha256, f"Blob {sha256[:12]}… file missing: {path}"
+    if actual_size != size:
+        return sha256, f"Blob {sha256[:12]}… is {actual_size} bytes, expected {size}"
+    if not quick and file_sha256(path) != sha256:
+        return sha256, f"Blob {sha256[:12]}… content does not match its hash: {path}"
+    return sha256, None
+
+
+def check_blob_files(conn, report, quick, workers):
+    """Hash blob files on a thread pool; hashlib and file reads release the GIL"""
+    print(f"🔎 Blob files ({'size only' if quick else f'SHA-256 on {workers} threads'})")
+    cursor = conn.execute('SELECT sha256, path, size FROM media_blobs')
+    checked = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Bounded windows keep memory flat on large stores
+        while window := cursor.fetchmany(workers * 32):
+            for _, problem in pool.map(lambda blob: verify_blob(blob, quick), window):
+                if problem:
+                    report.add('files', problem)
+            checked += len(window)
+    print(f"  {checked} blobs checked")
+
+
+def check_orphans(conn, report, delete):
+    """Files under the store roots that no media_blobs row owns"""
+    print("🔎 Orphaned files")
+    if delete:
+        # Held while listing and deleting: a save moves its file into place
+        # inside its write transaction, so none can be half done meanwhile
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        known = {os.path.abspath(path) for (path,) in conn.execute('SELECT path FROM media_blobs')}
+        deleted = 0
+        for store in (ms.store_for('image'), ms.store_for('audio')):
+            for shard in sorted(store.root.glob('[0-9a-f][0-9a-f]')):
+                for path in itertools.chain.from_iterable(sub.iterdir() for sub in shard.iterdir() if sub.is_dir()):
+                    if not BLOB_NAME.match(path.name) or os.path.abspath(path) in known:
+                        continue
+                    if delete:
+                        os.remove(path)
+                        deleted += 1
+                    else:
+                        report.add('orphans', f"Unreferenced blob file: {path}")
+            leftovers = list(store.staging_dir.glob('*.part'))
+            if leftovers:
+                report.add('orphans', f"{len(leftovers)} interrupted uploads left in {store.staging_dir}")
+    finally:
+        if delete:
+            conn.rollback()
+    if deleted:
+        print(f"  🗑️ Removed {deleted} unreferenced blob files")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify the memories database against its media files')
+    parser.add_argument('--db', default=ms.DB_PATH, help='database file (default: %(default)s)')
+    parser.add_argument('--user', help="check one user's shard instead of --db")
+    parser.add_argument('--quick', action='store_true', help='check file sizes only, skip hashing')
+    parser.add_argument('--full', action='store_true', help='run PRAGMA integrity_check instead of quick_check')
+    parser.add_argument('--workers', type=int, default=HASH_WORKERS, help='parallel hashing threads')
+    parser.add_argument('--fix-refcounts', action='store_true', help='rewrite blob ref_counts from actual use')
+    parser.add_argument('--delete-orphans', action='store_true', help='remove blob files no media_blobs row owns')
+    args = parser.parse_args()
+
+    if args.user:
+        shard_db = ms.get_router().shard_dir(args.user) / 'memories.db'
+        if not shard_db.exists():
+            print(f"❌ No shard for user {args.user}: {shard_db}")
+            return 1
+    elif not os.path.exists(args.db):
+        print(f"❌ Database not found: {args.db}")
+        return 1
+    else:
+        ms.DB_PATH = args.db
+    report = Report()
+    with ms.get_router().use(args.user) if args.user else nullcontext(), ms.get_pool().connection() as conn:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'media_blobs'").fetchone():
+            print("❌ No media_blobs table: start memory_server.py once to migrate the schema")
+            return 1
+        check_sqlite(conn, report, args.full)
+        if report.problems:
+            print("❌ SQLite reports corruption; skipping the remaining checks")
+            return 1
+        check_json_columns(conn, report)
+        check_references(conn, report, args.fix_refcounts)
+        check_blob_files(conn, report, args.quick, max(1, args.workers))
+        check_orphans(conn, report, args.delete_orphans)
+
+    if report.total():
+        summary = ', '.join(f'{check}: {len(found)}' for check, found in report.problems.items())
+        print(f"❌ {report.total()} problems found ({summary})")
+        return 1
+    print("✅ Database and media store are consistent")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Dr. Chinki Voice Profiles
+Per-speaker token models and an in-memory TF-IDF matrix for voice recognition
+"""
+
+import json
+import math
+import re
+import threading
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # scoring falls back to plain Python without NumPy
+    np = None
+
+MIN_COMMON_WORDS = 2
+HINGLISH_MARKERS = ('hai', 'haan', 'nahi', 'kya')
+
+
+def voice_tokens(text):
+    """Lower-cased word tokens of a speech sample, punctuation stripped"""
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def language_style(text):
+    words = set(voice_tokens(text))
+    return 'hinglish' if any(word in words for word in HINGLISH_MARKERS) else 'english'
+
+
+def create_schema(cursor):
+    """Speaker profiles, the samples they are built from, token document frequencies and a change counter"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS voice_profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            memory_id INTEGER,
+            sample_count INTEGER NOT NULL DEFAULT 0,
+            token_counts TEXT NOT NULL DEFAULT '{}',
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_voice_profiles_memory ON voice_profiles(memory_id)
+    ''')
+    # Each sample's tokens and the memory it came with, so deleting or
+    # archiving that memory takes exactly its words back out of the profile
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS voice_samples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            profile_id INTEGER NOT NULL,
+            memory_id INTEGER,
+            token_counts TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_voice_samples_memory ON voice_samples(memory_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_voice_samples_profile ON voice_samples(profile_id)')
+    # Profiles from before per-sample tracking become one sample owned by their memory
+    cursor.execute('''
+        INSERT INTO voice_samples (profile_id, memory_id, token_counts)
+        SELECT id, memory_id, token_counts FROM voice_profiles
+        WHERE id NOT IN (SELECT profile_id FROM voice_samples)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS voice_df (
+            token TEXT PRIMARY KEY,
+            df INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS voice_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO voice_generation (id, generation) VALUES (1, 0)')
+
+
+def _bump_generation(cursor):
+    cursor.execute('UPDATE voice_generation SET generation = generation + 1 WHERE id = 1')
+
+
+def find_profile(cursor, name):
+    """(profile_id, memory_id, sample_count) for a speaker, matched case-insensitively"""
+    cursor.execute('SELECT id, memory_id, sample_count FROM voice_profiles WHERE name = ?', (name,))
+    return cursor.fetchone()
+
+
+def add_sample(cursor, name, text, memory_id=None):
+    """
+    Fold one speech sample into the speaker's profile, creating it on first
+    use, and record it against `memory_id`. Document frequencies only change
+    for tokens the profile has never used before, so IDF stays exact without
+    rescanning other profiles. Returns the profile's sample count.
+    """
+    tokens = Counter(voice_tokens(text))
+    if not tokens:
+        return 0
+    cursor.execute('SELECT id, sample_count, token_counts FROM voice_profiles WHERE name = ?', (name,))
+    row = cursor.fetchone()
+    if row:
+        counts = json.loads(row[2])
+        new_tokens = [token for token in tokens if token not in counts]
+        for token, count in tokens.items():
+            counts[token] = counts.get(token, 0) + count
+        sample_count = row[1] + 1
+        cursor.execute('''
+            UPDATE voice_profiles SET sample_count = ?, token_counts = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (sample_count, json.dumps(counts), row[0]))
+        profile_id = row[0]
+    else:
+        new_tokens = list(tokens)
+        sample_count = 1
+        cursor.execute('''
+            INSERT INTO voice_profiles (name, memory_id, sample_count, token_counts)
+            VALUES (?, ?, 1, ?)
+        ''', (name, memory_id, json.dumps(dict(tokens))))
+        profile_id = cursor.lastrowid
+    cursor.execute('INSERT INTO voice_samples (profile_id, memory_id, token_counts) VALUES (?, ?, ?)',
+                   (profile_id, memory_id, json.dumps(dict(tokens))))
+    cursor.executemany('''
+        INSERT INTO voice_df (token, df) VALUES (?, 1)
+        ON CONFLICT(token) DO UPDATE SET df = df + 1
+    ''', [(token,) for token in new_tokens])
+    _bump_generation(cursor)
+    return sample_count
+
+
+def delete_for_memory(cursor, memory_id):
+    """
+    Take the samples a deleted (or archived) memory brought out of their
+    profiles. Tokens no remaining sample uses leave the profile and its
+    document frequencies; a profile left with no samples is dropped, and one
+    whose owning memory went is handed to the memory of a remaining sample.
+    """
+    cursor.execute('SELECT id, profile_id, token_counts FROM voice_samples WHERE memory_id = ?', (memory_id,))
+    samples = cursor.fetchall()
+    if not samples:
+        return
+    removed, removed_samples = {}, Counter()
+    for _, profile_id, token_counts in samples:
+        removed.setdefault(profile_id, Counter()).update(json.loads(token_counts))
+        removed_samples[profile_id] += 1
+    cursor.execute('DELETE FROM voice_samples WHERE memory_id = ?', (memory_id,))
+    for profile_id, counts in removed.items():
+        cursor.execute('SELECT memory_id, sample_count, token_counts FROM voice_profiles WHERE id = ?', (profile_id,))
+        row = cursor.fetchone()
+        if row is None:
+            continue
+        profile = json.loads(row[2])
+        sample_count = row[1] - removed_samples[profile_id]
+        gone = []
+        for token, count in counts.items():
+            if token in profile:
+                profile[token] -= count
+                if profile[token] <= 0:
+                    del profile[token]
+                    gone.append((token,))
+        cursor.executemany('UPDATE voice_df SET df = df - 1 WHERE token = ?', gone)
+        cursor.execute('SELECT memory_id FROM voice_samples WHERE profile_id = ? ORDER BY id LIMIT 1', (profile_id,))
+        heir = cursor.fetchone()
+        if heir is None or sample_count <= 0 or not profile:
+            cursor.executemany('UPDATE voice_df SET df = df - 1 WHERE token = ?', [(token,) for token in profile])
+            cursor.execute('DELETE FROM voice_samples WHERE profile_id = ?', (profile_id,))
+            cursor.execute('DELETE FROM voice_profiles WHERE id = ?', (profile_id,))
+            continue
+        owner = heir[0] if row[0] == memory_id else row[0]
+        cursor.execute('''
+            UPDATE voice_profiles SET memory_id = ?, sample_count = ?, token_counts = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (owner, sample_count, json.dumps(profile), profile_id))
+    cursor.execute('DELETE FROM voice_df WHERE df <= 0')
+    _bump_generation(cursor)
+
+
+def _tf(count):
+    """Sublinear term frequency so one chatty sample can't dominate a profile"""
+    return 1.0 + math.log(count)
+
+
+class VoiceIndex:
+    """
+    Profiles x vocabulary matrix of L2-normalised TF-IDF rows, loaded once
+    and rebuilt only when voice_generation moves. The matrix is stored by
+    column (CSC: column_ptr / rows / values arrays), so memory grows with
+    the words profiles actually use, and a query scores every profile with
+    one weighted bincount over just its own columns.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.generation = -1
+        self.profiles = []      # (profile_id, name, memory_id, sample_count) per row
+        self.vocab = {}         # token -> column
+        self.idf = None
+        self.column_ptr = None
+        self.rows = None
+        self.values = None
+        self.matrix = None      # per-row dicts when NumPy is missing
+        self.total = 0
+
+    def refresh(self, cursor):
+        """Reload from the tables if any profile changed since the last load"""
+        cursor.execute('SELECT generation FROM voice_generation WHERE id = 1')
+        generation = cursor.fetchone()[0]
+        with self._lock:
+            if generation == self.generation:
+                return
+            cursor.execute('SELECT token, df FROM voice_df')
+            df = dict(cursor.fetchall())
+            cursor.execute('SELECT id, name, memory_id, sample_count, token_counts FROM voice_profiles ORDER BY id')
+            rows = cursor.fetchall()
+            self.total = len(rows)
+            self.vocab = {token: column for column, token in enumerate(df)}
+            idf = [math.log((1 + self.total) / (1 + df[token])) + 1.0 for token in df]
+            self.profiles = [tuple(row[:4]) for row in rows]
+            weighted = [{self.vocab[token]: _tf(count) * idf[self.vocab[token]]
+                         for token, count in json.loads(row[4]).items() if token in self.vocab}
+                        for row in rows]
+            if np is not None:
+                self.idf = np.asarray(idf, dtype=np.float32)
+                sizes = [len(row_weights) for row_weights in weighted]
+                entry_rows = np.repeat(np.arange(len(rows), dtype=np.int32), sizes)
+                columns = np.fromiter((c for w in weighted for c in w), dtype=np.int32, count=len(entry_rows))
+                values = np.fromiter((v for w in weighted for v in w.values()), dtype=np.float32,
+                                     count=len(entry_rows))
+                norms = np.sqrt(np.bincount(entry_rows, values * values, minlength=len(rows)))
+                norms[norms == 0] = 1.0
+                values /= norms[entry_rows].astype(np.float32)
+                order = np.argsort(columns, kind='stable')
+                self.rows, self.values = entry_rows[order], values[order]
+                self.column_ptr = np.zeros(len(df) + 1, dtype=np.int64)
+                np.cumsum(np.bincount(columns, minlength=len(df)), out=self.column_ptr[1:])
+            else:
+                self.idf = idf
+                self.matrix = []
+                for row_weights in weighted:
+                    norm = math.sqrt(sum(w * w for w in row_weights.values())) or 1.0
+                    self.matrix.append({column: w / norm for column, w in row_weights.items()})
+            self.generation = generation
+
+    def _query(self, text):
+        """Columns and normalised TF-IDF weights of a sample; unseen words still count toward its norm"""
+        counts = Counter(voice_tokens(text))
+        unseen_idf = math.log(1 + self.total) + 1.0
+        columns, weights, norm = [], [], 0.0
+        for token, count in counts.items():
+            column = self.vocab.get(token)
+            weight = _tf(count) * (float(self.idf[column]) if column is not None else unseen_idf)
+            norm += weight * weight
+            if column is not None:
+                columns.append(column)
+                weights.append(weight)
+        norm = math.sqrt(norm) or 1.0
+        return columns, [w / norm for w in weights]
+
+    def search(self, text, k=3):
+        """Top-k (profile_id, name, memory_id, sample_count, cosine) sharing at least MIN_COMMON_WORDS words"""
+        with self._lock:
+            columns, weights = self._query(text)
+            if len(columns) < MIN_COMMON_WORDS or not self.profiles:
+                return []
+            if np is not None:
+                spans = [(self.column_ptr[c], self.column_ptr[c + 1]) for c in columns]
+                rows = np.concatenate([self.rows[a:b] for a, b in spans])
+                entry_weights = np.concatenate([self.values[a:b] * w for (a, b), w in zip(spans, weights)])
+                scores = np.bincount(rows, entry_weights, minlength=len(self.profiles))
+                common = np.bincount(rows, minlength=len(self.profiles))
+                candidates = np.flatnonzero(common >= MIN_COMMON_WORDS)
+                top = candidates[np.argsort(-scores[candidates], kind='stable')[:k]]
+                return [(*self.profiles[i], float(scores[i])) for i in top]
+            scored = []
+            for i, row in enumerate(self.matrix):
+                shared = [(row[c], w) for c, w in zip(columns, weights) if c in row]
+                if len(shared) >= MIN_COMMON_WORDS:
+                    scored.append((sum(a * b for a, b in shared), i))
+            scored.sort(key=lambda item: -item[0])
+            return [(*self.profiles[i], score) for score, i in scored[:k]]